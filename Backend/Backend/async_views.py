@@ -0,0 +1,72 @@
+import inspect
+
+from asgiref.sync import sync_to_async
+from rest_framework import generics
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+
+class AsyncViewMixin:
+    """
+    Native async dispatch for DRF views with `async def` handlers.
+
+    Django serves the view as a coroutine when all its handlers are async
+    (`View.view_is_async`), so under ASGI the request never holds a thread
+    while it waits. The DRF hooks run around the handler as in
+    `APIView.dispatch`: `initial()` (authentication, permissions,
+    throttling) may query the database and runs through `sync_to_async`,
+    sync handlers such as `options()` are called directly.
+    """
+    async def dispatch(self, request, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            await sync_to_async(self.initial)(request, *args, **kwargs)
+
+            if request.method.lower() in self.http_method_names:
+                handler = getattr(self, request.method.lower(), self.http_method_not_allowed)
+            else:
+                handler = self.http_method_not_allowed
+
+            response = handler(request, *args, **kwargs)
+            if inspect.isawaitable(response):
+                response = await response
+
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
+
+
+class AsyncAPIView(AsyncViewMixin, APIView):
+    pass
+
+
+class AsyncListAPIView(AsyncViewMixin, generics.ListAPIView):
+    """
+    List view served with the async ORM.
+
+    Views implement `aget_queryset()`, which runs their access checks with
+    the async helpers, the page is read with `apaginate_queryset()`. The
+    sync `list()` of `ListAPIView` is still available, e.g. to subclasses
+    defining a sync `get()`.
+    """
+    async def aget_queryset(self):
+        return self.get_queryset()
+
+    async def alist(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(await self.aget_queryset())
+        if self.paginator is not None:
+            page = await self.paginator.apaginate_queryset(queryset, request, view=self)
+            # the rows are loaded, serializing them does not query
+            return self.get_paginated_response(self.get_serializer(page, many=True).data)
+        rows = [row async for row in queryset]
+        return Response(self.get_serializer(rows, many=True).data)
+
+    async def get(self, request, *args, **kwargs):
+        return await self.alist(request, *args, **kwargs)
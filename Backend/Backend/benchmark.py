@@ -0,0 +1,82 @@
+"""
+Helpers of the benchmark commands, which drive the ASGI app in process: no
+server or network is involved, the numbers are those of one worker
+"""
+import asyncio
+import time
+
+from Backend.renderers import dumps
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[round(q * (len(sorted_values) - 1))]
+
+
+def summarize(latencies, errors, elapsed):
+    """
+    Requests per second and latency percentiles (ms) of a list of latencies
+    """
+    latencies = sorted(latencies)
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'rps': len(latencies) / elapsed if elapsed else 0.0,
+        'p50': percentile(latencies, 0.5),
+        'p95': percentile(latencies, 0.95),
+        'p99': percentile(latencies, 0.99),
+    }
+
+
+async def asgi_request(app, method, path, headers=(), data=None, query_string=b''):
+    """
+    Send one request to the ASGI `app` and return the status of the response,
+    once its whole body was sent. `data` is sent as JSON.
+    """
+    headers = [(b'host', b'benchmark'), *headers]
+    body = b''
+    if data is not None:
+        body = dumps(data)
+        headers += [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode())]
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': method,
+        'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'query_string': query_string,
+        'root_path': '', 'headers': headers, 'server': ('benchmark', 80), 'client': ('127.0.0.1', 0),
+    }
+    messages = [{'type': 'http.request', 'body': body, 'more_body': False}]
+    disconnected = asyncio.Event()
+    status = None
+
+    async def receive():
+        if messages:
+            return messages.pop()
+        # the client stays connected until the response is sent
+        await disconnected.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(message):
+        nonlocal status
+        if message['type'] == 'http.response.start':
+            status = message['status']
+        elif not message.get('more_body', False):
+            disconnected.set()
+
+    await app(scope, receive, send)
+    return status
+
+
+async def run_load(send_next, concurrency, requests):
+    """
+    Make `requests` calls of `send_next()` from `concurrency` concurrent
+    clients, returns the elapsed seconds
+    """
+    remaining = iter(range(requests))
+
+    async def client():
+        for _ in remaining:
+            await send_next()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return time.perf_counter() - start
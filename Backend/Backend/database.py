@@ -0,0 +1,102 @@
+import random
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.utils.decorators import sync_and_async_middleware
+from rest_framework.permissions import SAFE_METHODS
+
+
+class RoutingState:
+    """
+    Where the queries of the current request may read from
+    """
+    def __init__(self, use_primary):
+        self.use_primary = use_primary
+        self.wrote = False
+
+
+# set for each request by `replica_routing_middleware`, None outside of requests
+routing_state = ContextVar('routing_state', default=None)
+
+
+def get_replicas():
+    return getattr(settings, 'DATABASE_REPLICAS', [])
+
+
+class ReplicaRouter:
+    """
+    Send the reads of safe requests to the replicas in `DATABASE_REPLICAS`,
+    everything else to the primary (`default`).
+
+    Reads stay on the primary:
+        - outside of requests (commands, shell) and in unsafe requests
+        - once the request has written, and for `REPLICA_STICKY_SECONDS`
+          after that in the next requests of the same client (read your
+          writes, see `replica_routing_middleware`)
+        - inside a transaction of the primary
+    """
+    def db_for_read(self, model, **hints):
+        replicas = get_replicas()
+        state = routing_state.get()
+        if not replicas or state is None or state.use_primary or state.wrote:
+            return DEFAULT_DB_ALIAS
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        state = routing_state.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # the replicas hold the same data as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in get_replicas()
+
+
+def _sticky_cookie():
+    return getattr(settings, 'REPLICA_STICKY_COOKIE', 'use_primary')
+
+
+def _start(request):
+    use_primary = request.method not in SAFE_METHODS or _sticky_cookie() in request.COOKIES
+    state = RoutingState(use_primary)
+    # not reset after the response, the body of streamed responses is read later
+    routing_state.set(state)
+    return state
+
+
+def _finish(state, response):
+    if state.wrote and get_replicas():
+        # the replicas may lag behind, the next reads of the client go to the primary
+        window = getattr(settings, 'REPLICA_STICKY_SECONDS', 5)
+        response.set_cookie(
+            _sticky_cookie(), str(int(time.time()) + window),
+            max_age=window, httponly=True, secure=True, samesite='Lax',
+        )
+    return response
+
+
+@sync_and_async_middleware
+def replica_routing_middleware(get_response):
+    """
+    Set the `RoutingState` of each request for `ReplicaRouter`, and the
+    sticky cookie keeping the reads of a client on the primary for
+    `REPLICA_STICKY_SECONDS` after it wrote
+    """
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            state = _start(request)
+            return _finish(state, await get_response(request))
+    else:
+        def middleware(request):
+            state = _start(request)
+            return _finish(state, get_response(request))
+    return middleware
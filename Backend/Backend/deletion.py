@@ -0,0 +1,67 @@
+"""
+Set based deletion of the rows cascading from an object.
+
+Django's deletion collector loads the rows of every cascaded model that has
+cascades or delete signals of its own, and deletes them 100 at a time, so
+deleting a group would cost queries in proportion to its courses, materials
+and labels. `delete_descendants` deletes each table with one DELETE filtered
+by a subquery on the parent rows instead, bottom up.
+"""
+from django.db import models, router, transaction
+from django.db.models.deletion import get_candidate_relations_to_delete
+from django.db.models.signals import post_delete, pre_delete
+from django.dispatch import Signal
+
+# sent with the `queryset` of the rows of `sender` about to be deleted by
+# `delete_descendants`, which sends no pre_delete/post_delete for them. A
+# model with pre_delete/post_delete receivers must have one for this signal
+# too, its rows can not be deleted in bulk otherwise.
+bulk_pre_delete = Signal()
+
+
+def _delete_related(queryset):
+    for relation in get_candidate_relations_to_delete(queryset.model._meta):
+        if relation.on_delete is models.DO_NOTHING:
+            continue
+        if relation.on_delete is not models.CASCADE:
+            raise ValueError(
+                f'{relation.related_model.__name__}.{relation.field.name} does not cascade, '
+                f'{queryset.model.__name__} rows can not be deleted in bulk.'
+            )
+        related = relation.related_model._base_manager.using(queryset.db)
+        _delete(related.filter(**{f'{relation.field.name}__in': queryset}))
+
+
+def _delete(queryset):
+    model = queryset.model
+    if (pre_delete.has_listeners(model) or post_delete.has_listeners(model)) and not bulk_pre_delete.has_listeners(model):
+        raise ValueError(
+            f'{model.__name__} has delete receivers but no bulk_pre_delete receiver, '
+            f'its rows can not be deleted in bulk.'
+        )
+    _delete_related(queryset)
+    bulk_pre_delete.send(sender=queryset.model, queryset=queryset)
+    queryset._raw_delete(queryset.db)
+
+
+def delete_descendants(instance, using):
+    """
+    Delete the rows cascading from `instance` with one query per table,
+    whatever their number. `instance` itself is left to the caller, to be
+    deleted with its signals. Every relation on the way must be CASCADE or
+    DO_NOTHING, and every model with delete receivers must also receive
+    `bulk_pre_delete`.
+    """
+    _delete_related(type(instance)._base_manager.using(using).filter(pk=instance.pk))
+
+
+class BulkCascadeMixin:
+    """
+    Models whose `delete()` removes the cascaded rows with `delete_descendants`
+    before deleting the object itself
+    """
+    def delete(self, using=None, keep_parents=False):
+        using = using or router.db_for_write(type(self), instance=self)
+        with transaction.atomic(using=using):
+            delete_descendants(self, using)
+            return super().delete(using=using, keep_parents=keep_parents)
@@ -0,0 +1,230 @@
+import json
+import platform
+import random
+import time
+import uuid
+
+import django
+from asgiref.sync import async_to_sync
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import OutstandingToken
+from rest_framework_simplejwt.tokens import AccessToken
+
+from Backend.asgi import application
+from Backend.benchmark import asgi_request, run_load, summarize
+from groups_courses.models import Course, Group, GroupMember
+from materials.models import Material, MaterialComment
+from users.models import User
+
+PASSWORD = 'benchmark-passphrase'
+SCENARIO_NAMES = ['browse', 'course', 'materials', 'comment', 'login']
+DEFAULT_MIX = 'browse=30,course=25,materials=30,comment=10,login=5'
+
+
+def _change(before, after):
+    return (after - before) / before * 100 if before else 0.0
+
+
+class Run:
+    """
+    The latencies (ms) and errors per endpoint of the sessions run
+    """
+    def __init__(self, scenarios, mix, clients, rng):
+        self.scenarios = scenarios
+        self.names = list(mix)
+        self.weights = list(mix.values())
+        self.clients = clients
+        self.rng = rng
+        self.reset()
+
+    def reset(self):
+        self.latencies = {}
+        self.errors = {}
+
+    def all_latencies(self):
+        return [latency for latencies in self.latencies.values() for latency in latencies]
+
+    def total_errors(self):
+        return sum(self.errors.values())
+
+    async def session(self):
+        name = self.rng.choices(self.names, self.weights)[0]
+        user, headers = self.rng.choice(self.clients)
+        for endpoint, method, path, data in self.scenarios[name]:
+            start = time.perf_counter()
+            status = await asgi_request(application, method, path, headers, data(user) if data else None)
+            self.latencies.setdefault(endpoint, []).append((time.perf_counter() - start) * 1000)
+            self.errors[endpoint] = self.errors.get(endpoint, 0) + (status is None or status >= 400)
+
+    async def load(self, sessions, concurrency):
+        return await run_load(self.session, concurrency, sessions)
+
+
+class Command(BaseCommand):
+    help = (
+        'Drive the ASGI app in process with a weighted mix of scripted user sessions (browse the group catalog, '
+        'open a course, list materials, post a comment, login), report the requests/s and p50/p95/p99 latency '
+        'of each endpoint, write them as JSON and compare them against a baseline'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--mix', default=DEFAULT_MIX, help='weighted sessions, e.g. browse=30,login=5')
+        parser.add_argument('--sessions', type=int, default=500, help='sessions run, each makes one or more requests')
+        parser.add_argument('--warmup', type=int, default=20, help='sessions run first and left out of the results')
+        parser.add_argument('--concurrency', type=int, default=10, help='concurrent clients')
+        parser.add_argument('--users', type=int, default=20, help='accounts the clients pick from')
+        parser.add_argument('--rows', type=int, default=50, help='groups, materials and comments of the fixture')
+        parser.add_argument('--seed', type=int, default=0, help='seed of the session and account choices')
+        parser.add_argument('--output', help='write the results to this JSON file')
+        parser.add_argument('--baseline', help='compare against the results in this JSON file')
+        parser.add_argument(
+            '--tolerance', type=float, default=10.0,
+            help='fail when requests/s drops or p95 grows by more than this percentage against the baseline',
+        )
+
+    def handle(self, *args, **options):
+        mix = self.parse_mix(options['mix'])
+        baseline = self.load_baseline(options['baseline']) if options['baseline'] else None
+        users, fixture = self.create_fixture(options['users'], options['rows'])
+        try:
+            scenarios = self.get_scenarios(**fixture)
+            clients = [(user, [(b'authorization', f'Bearer {AccessToken.for_user(user)}'.encode())]) for user in users]
+            run = Run(scenarios, mix, clients, random.Random(options['seed']))
+            async_to_sync(run.load)(options['warmup'], options['concurrency'])
+            run.reset()
+            elapsed = async_to_sync(run.load)(options['sessions'], options['concurrency'])
+        finally:
+            OutstandingToken.objects.filter(user__in=users).delete()
+            # the groups, courses, materials and comments go with their owners
+            User.objects.filter(pk__in=[user.pk for user in users]).delete()
+
+        results = {
+            'meta': {
+                'timestamp': timezone.now().isoformat(),
+                'mix': options['mix'],
+                'sessions': options['sessions'],
+                'concurrency': options['concurrency'],
+                'rows': options['rows'],
+                'seed': options['seed'],
+                'database': connection.vendor,
+                'django': django.get_version(),
+                'python': platform.python_version(),
+            },
+            'total': summarize(run.all_latencies(), run.total_errors(), elapsed),
+            'endpoints': {
+                name: summarize(latencies, run.errors[name], elapsed)
+                for name, latencies in sorted(run.latencies.items())
+            },
+        }
+        self.report(results)
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(results, output, indent=2)
+            self.stdout.write(f'results written to {options["output"]}')
+        if baseline is not None:
+            self.compare(results, baseline, options['tolerance'])
+
+    def parse_mix(self, value):
+        mix = {}
+        for item in value.split(','):
+            name, _, weight = item.partition('=')
+            if name not in SCENARIO_NAMES:
+                raise CommandError(f'unknown session {name!r}, choose from {", ".join(SCENARIO_NAMES)}')
+            try:
+                mix[name] = float(weight or 1)
+            except ValueError:
+                raise CommandError(f'invalid weight {weight!r} of {name}')
+        return mix
+
+    def load_baseline(self, path):
+        try:
+            with open(path) as baseline:
+                return json.load(baseline)
+        except (OSError, ValueError) as e:
+            raise CommandError(f'cannot read the baseline {path}: {e}')
+
+    def create_fixture(self, count, rows):
+        suffix = uuid.uuid4().hex[:8]
+        # hashed once, every account shares the password
+        password_hash = make_password(PASSWORD)
+        users = [
+            User.objects.create_user(
+                email=f'benchmark-{i}-{suffix}@example.com', username=f'benchmark-{i}-{suffix}',
+                password=None, password_hash=password_hash,
+            )
+            for i in range(count)
+        ]
+        owner = users[0]
+        group = Group.objects.create(name=f'Benchmark {suffix}', owner=owner, join_type='open')
+        Group.objects.bulk_create([Group(name=f'Benchmark {suffix} {i}', owner=owner) for i in range(rows)])
+        GroupMember.objects.bulk_create([GroupMember(group=group, user=user) for user in users[1:]])
+        course = Course.objects.create(name='Benchmark', group=group)
+        Material.objects.bulk_create([
+            Material(title=f'Lecture {i}', type='url', url=f'https://youtu.be/{i}', course=course, owner=owner)
+            for i in range(rows)
+        ])
+        material = Material.objects.filter(course=course).first()
+        MaterialComment.objects.bulk_create([
+            MaterialComment(material=material, User=owner, Content=f'Comment {i}') for i in range(rows)
+        ])
+        return users, {'group': group, 'course': course, 'material': material}
+
+    def get_scenarios(self, group, course, material):
+        """
+        The requests of each session, (endpoint, method, path, data(user) or None)
+        """
+        return {
+            'browse': [
+                ('group_list', 'GET', reverse('group_list'), None),
+            ],
+            'course': [
+                ('group_detail', 'GET', reverse('group_detail', args=[group.id]), None),
+                ('course_list', 'GET', reverse('course_list', args=[group.id]), None),
+            ],
+            'materials': [
+                ('list_materials', 'GET', reverse('list_materials', args=[course.id]), None),
+                ('list_material_comments', 'GET', reverse('list_material_comments', args=[material.id]), None),
+            ],
+            'comment': [
+                ('create_material_comment', 'POST', reverse('create_material_comment'),
+                 lambda user: {'material': str(material.id), 'Content': 'Benchmark comment'}),
+            ],
+            'login': [
+                ('login', 'POST', reverse('login'), lambda user: {'email': user.email, 'password': PASSWORD}),
+            ],
+        }
+
+    def report(self, results):
+        self.stdout.write(
+            f'{results["meta"]["sessions"]} sessions, {results["meta"]["concurrency"]} clients, latencies in ms'
+        )
+        self.stdout.write(
+            f'{"endpoint":<24} {"requests":>8} {"req/s":>9} {"p50":>8} {"p95":>8} {"p99":>8} {"errors":>7}'
+        )
+        for name, stats in [*results['endpoints'].items(), ('total', results['total'])]:
+            self.stdout.write(
+                f'{name:<24} {stats["requests"]:>8} {stats["rps"]:>9.1f} {stats["p50"]:>8.1f} '
+                f'{stats["p95"]:>8.1f} {stats["p99"]:>8.1f} {stats["errors"]:>7}'
+            )
+
+    def compare(self, results, baseline, tolerance):
+        self.stdout.write(f'against the baseline of {baseline["meta"]["timestamp"]}')
+        self.stdout.write(f'{"endpoint":<24} {"req/s":>9} {"p95":>9}')
+        regressions = []
+        for name, stats in [*results['endpoints'].items(), ('total', results['total'])]:
+            before = baseline['total'] if name == 'total' else baseline['endpoints'].get(name)
+            if before is None:
+                continue
+            rps = _change(before['rps'], stats['rps'])
+            p95 = _change(before['p95'], stats['p95'])
+            regressed = rps < -tolerance or p95 > tolerance
+            self.stdout.write(f'{name:<24} {rps:>+8.1f}% {p95:>+8.1f}%{"  regression" if regressed else ""}')
+            if regressed:
+                regressions.append(name)
+        if regressions:
+            raise CommandError(f'regressions beyond {tolerance}%: {", ".join(regressions)}')
+
@@ -0,0 +1,153 @@
+import time
+import uuid
+
+from asgiref.sync import async_to_sync
+from django.core.handlers.asgi import ASGIHandler
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+from django.urls import clear_url_caches, path
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from rest_framework_simplejwt.tokens import AccessToken
+
+from Backend.benchmark import asgi_request, percentile, run_load
+from groups_courses.models import Course, Group, GroupMember
+from groups_courses.permissions import ensure_group_member, get_group_policy_or_404
+from groups_courses.serializers import CourseSerializer
+from groups_courses.views import CoursesAPIView, GroupDetailAPIView
+from materials.models import Material, MaterialComment
+from materials.views import MaterialCommentsListAPIView, MaterialListAPIView
+from users.models import User
+
+
+# Sync versions of the async views, as they were served before, for comparison
+
+class SyncMaterialListAPIView(MaterialListAPIView):
+    dispatch = APIView.dispatch
+
+    def get(self, request, *args, **kwargs):
+        return self.list(request, *args, **kwargs)
+
+
+class SyncMaterialCommentsListAPIView(MaterialCommentsListAPIView):
+    dispatch = APIView.dispatch
+
+    def get(self, request, *args, **kwargs):
+        return self.list(request, *args, **kwargs)
+
+
+class SyncGroupDetailAPIView(GroupDetailAPIView):
+    dispatch = APIView.dispatch
+    http_method_names = ['get', 'options']
+
+    def get(self, request, *args, **kwargs):
+        group = self.get_queryset().first()
+        ensure_group_member(request, group)
+        return Response(self.get_serializer(group).data)
+
+
+class SyncCoursesAPIView(CoursesAPIView):
+    dispatch = APIView.dispatch
+    http_method_names = ['get', 'options']
+
+    def get(self, request, group_id):
+        group = get_group_policy_or_404(group_id)
+        ensure_group_member(request, group)
+        courses = CourseSerializer(context={'request': request}).prepare_queryset(Course.objects.filter(group_id=group.id))
+        return Response(CourseSerializer(courses, many=True, context={'request': request}).data)
+
+
+# the URLconf of the run, `ROOT_URLCONF` points to this module meanwhile
+urlpatterns = [
+    path('async/course/<uuid:course_id>/materials/', MaterialListAPIView.as_view()),
+    path('sync/course/<uuid:course_id>/materials/', SyncMaterialListAPIView.as_view()),
+    path('async/materials/<uuid:material_id>/comments/', MaterialCommentsListAPIView.as_view()),
+    path('sync/materials/<uuid:material_id>/comments/', SyncMaterialCommentsListAPIView.as_view()),
+    path('async/groups/<uuid:group_id>/', GroupDetailAPIView.as_view()),
+    path('sync/groups/<uuid:group_id>/', SyncGroupDetailAPIView.as_view()),
+    path('async/groups/<uuid:group_id>/courses/', CoursesAPIView.as_view()),
+    path('sync/groups/<uuid:group_id>/courses/', SyncCoursesAPIView.as_view()),
+]
+
+
+class Command(BaseCommand):
+    help = (
+        'Serve the async read views and their sync versions in process through the ASGI handler, '
+        'and compare the throughput and latency of one worker at increasing concurrency'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help='requests per endpoint and concurrency level')
+        parser.add_argument('--concurrency', default='1,10,50,100', help='comma separated concurrency levels')
+        parser.add_argument('--rows', type=int, default=50, help='materials and comments of the benchmark course')
+
+    def handle(self, *args, **options):
+        levels = [int(level) for level in options['concurrency'].split(',')]
+        user, owner, group, course, material = self.create_fixture(options['rows'])
+        try:
+            endpoints = {
+                'materials': f'course/{course.id}/materials/',
+                'comments': f'materials/{material.id}/comments/',
+                'group': f'groups/{group.id}/',
+                'courses': f'groups/{group.id}/courses/',
+            }
+            headers = [(b'authorization', f'Bearer {AccessToken.for_user(user)}'.encode())]
+            with override_settings(ROOT_URLCONF=__name__, ALLOWED_HOSTS=['benchmark']):
+                clear_url_caches()
+                self.run(endpoints, headers, levels, options['requests'])
+        finally:
+            clear_url_caches()
+            # the group, its courses and materials go with their owners
+            User.objects.filter(pk__in=[user.pk, owner.pk]).delete()
+
+    def create_fixture(self, rows):
+        suffix = uuid.uuid4().hex[:8]
+        user = User.objects.create_user(
+            email=f'benchmark-{suffix}@example.com', username=f'benchmark-{suffix}', password=None,
+        )
+        owner = User.objects.create_user(
+            email=f'benchmark-owner-{suffix}@example.com', username=f'benchmark-owner-{suffix}', password=None,
+        )
+        group = Group.objects.create(name=f'Benchmark {suffix}', owner=owner)
+        GroupMember.objects.create(group=group, user=user)
+        course = Course.objects.create(name='Benchmark', group=group)
+        Material.objects.bulk_create([
+            Material(title=f'Lecture {i}', type='url', url=f'https://youtu.be/{i}', course=course, owner=user)
+            for i in range(rows)
+        ])
+        material = Material.objects.filter(course=course).first()
+        MaterialComment.objects.bulk_create([
+            MaterialComment(material=material, User=user, Content=f'Comment {i}') for i in range(rows)
+        ])
+        return user, owner, group, course, material
+
+    def run(self, endpoints, headers, levels, requests):
+        app = ASGIHandler()
+        self.stdout.write(f'{requests} requests per level, latencies in ms')
+        self.stdout.write(
+            f'{"endpoint":<10} {"mode":<6} {"conc":>5} {"req/s":>9} {"p50":>8} {"p95":>8} {"errors":>7}'
+        )
+        for name, url in endpoints.items():
+            for level in levels:
+                for mode in ('sync', 'async'):
+                    elapsed, latencies, errors = async_to_sync(self.load)(
+                        app, f'/{mode}/{url}', headers, level, requests,
+                    )
+                    latencies.sort()
+                    self.stdout.write(
+                        f'{name:<10} {mode:<6} {level:>5} {requests / elapsed:>9.1f} '
+                        f'{percentile(latencies, 0.5):>8.1f} {percentile(latencies, 0.95):>8.1f} {errors:>7}'
+                    )
+
+    async def load(self, app, path, headers, concurrency, requests):
+        latencies, errors = [], 0
+
+        async def send_next():
+            nonlocal errors
+            start = time.perf_counter()
+            status = await asgi_request(app, 'GET', path, headers)
+            latencies.append((time.perf_counter() - start) * 1000)
+            errors += status != 200
+
+        elapsed = await run_load(send_next, concurrency, requests)
+        return elapsed, latencies, errors
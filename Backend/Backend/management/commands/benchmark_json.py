@@ -0,0 +1,83 @@
+import io
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from Backend.renderers import FastJSONParser, FastJSONRenderer, orjson
+from groups_courses.models import Group
+from groups_courses.serializers import GroupSerializer
+from materials.models import Material
+from materials.serializers import MaterialSerializer
+
+
+def build_groups(count):
+    now = timezone.now()
+    return [
+        Group(
+            id=uuid.uuid4(), owner_id=uuid.uuid4(), name=f'Study group {i}',
+            description='Weekly revision sessions for the algorithms course ' * 3,
+            join_type='open', post_permission='members', edit_permissions='admins', created_at=now,
+        )
+        for i in range(count)
+    ]
+
+
+def build_materials(count):
+    now = timezone.now()
+    materials = []
+    for i in range(count):
+        material = Material(
+            id=uuid.uuid4(), title=f'Lecture {i}', type='document' if i % 2 else 'url',
+            course_id=uuid.uuid4(), owner_id=uuid.uuid4(), created_at=now, updated_at=now,
+        )
+        if i % 2:
+            material.file.name = f'materials/lecture-{i}.pdf'
+        else:
+            material.url = f'https://youtu.be/{i}'
+        materials.append(material)
+    return materials
+
+
+class Command(BaseCommand):
+    help = 'Compare the stdlib and orjson based renderer and parser on list payloads'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000, help='rows per payload')
+        parser.add_argument('--repeat', type=int, default=50, help='runs per measurement')
+
+    def _time(self, func, repeat):
+        # best run, the least disturbed by the rest of the machine
+        best = float('inf')
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            best = min(best, time.perf_counter() - start)
+        return best * 1000
+
+    def handle(self, *args, **options):
+        rows, repeat = options['rows'], options['repeat']
+        if orjson is None:
+            self.stdout.write(self.style.WARNING('orjson is not installed, both columns use the json module'))
+
+        payloads = {
+            'GroupSerializer': GroupSerializer(build_groups(rows), many=True).data,
+            'MaterialSerializer': MaterialSerializer(build_materials(rows), many=True).data,
+        }
+        self.stdout.write(f'{rows} rows, best of {repeat} runs (ms)')
+        self.stdout.write(f'{"payload":<20} {"step":<8} {"stdlib":>9} {"fast":>9} {"speedup":>8}')
+        for name, data in payloads.items():
+            body = JSONRenderer().render(data)
+            steps = [
+                ('render', lambda: JSONRenderer().render(data), lambda: FastJSONRenderer().render(data)),
+                ('parse', lambda: JSONParser().parse(io.BytesIO(body)), lambda: FastJSONParser().parse(io.BytesIO(body))),
+            ]
+            for step, stdlib, fast in steps:
+                stdlib_ms = self._time(stdlib, repeat)
+                fast_ms = self._time(fast, repeat)
+                self.stdout.write(
+                    f'{name:<20} {step:<8} {stdlib_ms:>9.2f} {fast_ms:>9.2f} {stdlib_ms / fast_ms:>7.1f}x'
+                )
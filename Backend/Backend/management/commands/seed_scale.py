@@ -0,0 +1,249 @@
+import itertools
+import random
+import time
+import uuid
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from groups_courses.models import Course, Group, GroupMember
+from groups_courses.search import index_groups
+from materials.models import Label, Material, MaterialComment, MaterialLabel
+from users.models import Profile, User
+
+TOPICS = [
+    'algorithms', 'calculus', 'chemistry', 'databases', 'economics', 'history', 'linear algebra',
+    'machine learning', 'networks', 'operating systems', 'physics', 'statistics',
+]
+AFFILIATIONS = ['Cairo University', 'Ain Shams University', 'Alexandria University', 'AUC', 'GUC', None]
+COMMENTS = ['Thanks!', 'Very helpful', 'Is there a recording?', 'The slides are missing a page', 'Great summary']
+
+
+def skewed(count, exponent):
+    """
+    Cumulative Zipf weights of `count` ranks, rank 1 is the most popular
+    """
+    return list(itertools.accumulate(1 / rank ** exponent for rank in range(1, count + 1)))
+
+
+def batched(objects, size):
+    iterator = iter(objects)
+    while batch := list(itertools.islice(iterator, size)):
+        yield batch
+
+
+class Command(BaseCommand):
+    help = (
+        'Create a large synthetic dataset with skewed distributions: a few power users own many groups, a few '
+        'huge groups hold most members, courses and materials, and a few popular materials get most comments. '
+        'The same seed creates the same rows (timestamps aside). Rows are inserted with bulk_create and every '
+        'account shares one password hash, made once.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10000)
+        parser.add_argument('--groups', type=int, default=1000)
+        parser.add_argument('--memberships', type=int, default=30000, help='group members, duplicates are skipped')
+        parser.add_argument('--courses', type=int, default=3000)
+        parser.add_argument('--labels', type=int, default=2000)
+        parser.add_argument('--materials', type=int, default=50000)
+        parser.add_argument('--material-labels', type=float, default=0.6, help='share of materials with a label')
+        parser.add_argument('--comments', type=int, default=100000)
+        parser.add_argument(
+            '--skew', type=float, default=1.1, help='Zipf exponent of the popularity of groups, courses and materials',
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--prefix', help='prefix of the usernames, emails and group names, seed<seed> by default')
+        parser.add_argument('--password', default='seed-password', help='password of every account')
+        parser.add_argument('--batch-size', type=int, default=5000, help='rows per insert')
+
+    def handle(self, *args, **options):
+        if options['users'] < 1 or options['groups'] < 1:
+            raise CommandError('at least one user and one group are needed')
+        prefix = options['prefix'] or f'seed{options["seed"]}'
+        # the ids depend on the prefix too, runs with other prefixes do not collide
+        self.rng = random.Random(f'{options["seed"]}-{prefix}')
+        self.batch_size = options['batch_size']
+        self.skew = options['skew']
+        if User.objects.filter(username__startswith=f'{prefix}-').exists():
+            raise CommandError(f'users prefixed with {prefix} exist, pick another --prefix or --seed')
+
+        start = time.perf_counter()
+        users = self.create_users(prefix, options['users'], options['password'])
+        groups, owners = self.create_groups(prefix, options['groups'], users)
+        # the same groups are the largest by members, courses and labels
+        self.group_popularity = self.popularity(len(groups))
+        members = self.create_members(groups, owners, users, options['memberships'])
+        courses = self.create_courses(groups, options['courses'])
+        labels = self.create_labels(groups, options['labels'])
+        materials = self.create_materials(courses, members, options['materials'])
+        self.create_material_labels(materials, labels, options['material_labels'])
+        self.create_comments(materials, members, options['comments'])
+        self.stdout.write(self.style.SUCCESS(f'done in {time.perf_counter() - start:.1f}s'))
+
+    def new_id(self):
+        return uuid.UUID(int=self.rng.getrandbits(128), version=4)
+
+    def insert(self, model, objects, after_batch=None):
+        """
+        bulk_create `objects` in batches, returns the number of rows
+        """
+        start = time.perf_counter()
+        count = 0
+        # one commit per model, not per batch
+        with transaction.atomic():
+            for batch in batched(objects, self.batch_size):
+                model.objects.bulk_create(batch)
+                if after_batch is not None:
+                    after_batch(batch)
+                count += len(batch)
+        elapsed = time.perf_counter() - start
+        rate = count / elapsed if elapsed else 0
+        self.stdout.write(f'{model.__name__:<16} {count:>10} rows {elapsed:>8.1f}s {rate:>10.0f} rows/s')
+        return count
+
+    def pick(self, population, cum_weights, k):
+        return self.rng.choices(population, cum_weights=cum_weights, k=k)
+
+    def popularity(self, count):
+        """
+        The indexes 0..count-1 in a random order, with their cumulative
+        weights: the first ones are the most popular
+        """
+        ranks = list(range(count))
+        self.rng.shuffle(ranks)
+        return ranks, skewed(count, self.skew)
+
+    def create_users(self, prefix, count, password):
+        # the same hash for every account, hashing millions of passwords would take hours
+        password_hash = make_password(password)
+        users = [self.new_id() for _ in range(count)]
+        self.insert(User, (
+            User(id=user_id, email=f'{prefix}-{i}@example.com', username=f'{prefix}-{i}', password=password_hash)
+            for i, user_id in enumerate(users)
+        ))
+        self.insert(Profile, (
+            Profile(user_id=user_id, Affiliation=self.rng.choice(AFFILIATIONS)) for user_id in users
+        ))
+        return users
+
+    def create_groups(self, prefix, count, users):
+        groups = [self.new_id() for _ in range(count)]
+        # a few power users own most groups
+        ranks, weights = self.popularity(len(users))
+        owners = [users[i] for i in self.pick(ranks, weights, count)]
+        self.insert(Group, (
+            Group(
+                id=group_id, owner_id=owner, name=f'{prefix} group {i}',
+                description=f'{self.rng.choice(TOPICS)} study group',
+                join_type=self.rng.choices(['open', 'request', 'invite'], [6, 3, 1])[0],
+                post_permission=self.rng.choices(['members', 'moderators', 'admins', 'owner'], [6, 2, 1, 1])[0],
+                edit_permissions=self.rng.choices(['moderators', 'admins', 'owner'], [2, 6, 2])[0],
+            )
+            for i, (group_id, owner) in enumerate(zip(groups, owners))
+        ), after_batch=index_groups)
+        return groups, owners
+
+    def create_members(self, groups, owners, users, count):
+        """
+        Returns the members (owner first) of every group, by group index
+        """
+        members = [[owner] for owner in owners]
+        ranks, weights = self.group_popularity
+        seen = set()
+        rows = []
+        for group in self.pick(ranks, weights, count):
+            user = self.rng.randrange(len(users))
+            key = group * len(users) + user
+            if key in seen or users[user] == owners[group]:
+                continue
+            seen.add(key)
+            members[group].append(users[user])
+            rows.append((groups[group], users[user]))
+        self.insert(GroupMember, (
+            GroupMember(
+                group_id=group_id, user_id=user_id,
+                user_role=self.rng.choices(['member', 'moderator', 'admin'], [90, 7, 3])[0],
+            )
+            for group_id, user_id in rows
+        ))
+        return members
+
+    def create_courses(self, groups, count):
+        """
+        Returns (course id, group index) of every course
+        """
+        ranks, weights = self.group_popularity
+        per_group = [0] * len(groups)
+        courses = []
+        for group in self.pick(ranks, weights, count):
+            per_group[group] += 1
+            courses.append((self.new_id(), group, per_group[group]))
+        self.insert(Course, (
+            Course(id=course_id, group_id=groups[group], name=f'Course {number}')
+            for course_id, group, number in courses
+        ))
+        return [(course_id, group) for course_id, group, _ in courses]
+
+    def create_labels(self, groups, count):
+        """
+        Returns the (label id, max value) of every group, by group index
+        """
+        ranks, weights = self.group_popularity
+        labels = [[] for _ in groups]
+        rows = []
+        for group in self.pick(ranks, weights, count):
+            label = (self.new_id(), self.rng.choice([10, 14, 20, 52]))
+            labels[group].append(label)
+            rows.append((group, len(labels[group]), label))
+        self.insert(Label, (
+            Label(id=label_id, group_id=groups[group], name=f'Label {number}', min_value=1, max_value=max_value)
+            for group, number, (label_id, max_value) in rows
+        ))
+        return labels
+
+    def create_materials(self, courses, members, count):
+        """
+        Returns (material id, group index) of every material
+        """
+        if not courses:
+            return []
+        ranks, weights = self.popularity(len(courses))
+        per_course = [0] * len(courses)
+        materials = []
+        rows = []
+        for course in self.pick(ranks, weights, count):
+            course_id, group = courses[course]
+            per_course[course] += 1
+            material_id = self.new_id()
+            materials.append((material_id, group))
+            rows.append((material_id, course_id, per_course[course], self.rng.choice(members[group])))
+        self.insert(Material, (
+            Material(
+                id=material_id, course_id=course_id, owner_id=owner, type='url',
+                title=f'Material {number}', url=f'https://youtu.be/{material_id.hex[:11]}',
+            )
+            for material_id, course_id, number, owner in rows
+        ))
+        return materials
+
+    def create_material_labels(self, materials, labels, share):
+        def rows():
+            for material_id, group in materials:
+                if labels[group] and self.rng.random() < share:
+                    label_id, max_value = self.rng.choice(labels[group])
+                    yield MaterialLabel(material_id=material_id, label_id=label_id, number=self.rng.randint(1, max_value))
+        self.insert(MaterialLabel, rows())
+
+    def create_comments(self, materials, members, count):
+        if not materials:
+            return
+        ranks, weights = self.popularity(len(materials))
+        self.insert(MaterialComment, (
+            MaterialComment(
+                id=self.new_id(), material_id=materials[material][0], User_id=self.rng.choice(members[materials[material][1]]),
+                Content=self.rng.choice(COMMENTS),
+            )
+            for material in self.pick(ranks, weights, count)
+        ))
@@ -0,0 +1,235 @@
+import bisect
+import threading
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.http import Http404, HttpResponse
+from django.utils.crypto import constant_time_compare
+from django.utils.decorators import sync_and_async_middleware
+
+METRIC_PREFIX = 'studysphere'
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+class RequestProfile:
+    """
+    The queries run while handling one request
+    """
+    def __init__(self):
+        self.queries = 0
+        self.duplicates = 0
+        self.db_time = 0.0
+        self.statements = set()
+
+    def record(self, sql, duration):
+        self.queries += 1
+        self.db_time += duration
+        # the same statement with other parameters, as in N+1 patterns
+        if sql in self.statements:
+            self.duplicates += 1
+        else:
+            self.statements.add(sql)
+
+
+current_profile = ContextVar('current_profile', default=None)
+
+
+def profile_queries(execute, sql, params, many, context):
+    profile = current_profile.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        profile.record(sql, time.perf_counter() - start)
+
+
+def install_query_profiler(connection):
+    if profile_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.append(profile_queries)
+
+
+@receiver(connection_created)
+def profile_new_connection(sender, connection, **kwargs):
+    if getattr(settings, 'REQUEST_METRICS', False):
+        install_query_profiler(connection)
+
+
+class Histogram:
+    def __init__(self, name, help_text, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self.series = {}
+
+    def observe(self, labels, value):
+        series = self.series.get(labels)
+        if series is None:
+            # counts per bucket, then the +Inf count and the sum
+            series = self.series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        for labels, (counts, total) in sorted(self.series.items()):
+            label_text = _labels(labels)
+            cumulative = 0
+            for bound, count in zip((*self.buckets, '+Inf'), counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{label_text},le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_sum{{{label_text}}} {total}')
+            lines.append(f'{self.name}_count{{{label_text}}} {cumulative}')
+        return lines
+
+
+class Counter:
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help_text = help_text
+        self.series = {}
+
+    def inc(self, labels, value=1):
+        self.series[labels] = self.series.get(labels, 0) + value
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} counter']
+        for labels, value in sorted(self.series.items()):
+            lines.append(f'{self.name}{{{_labels(labels)}}} {value}')
+        return lines
+
+
+def _labels(labels):
+    view, method = labels
+    return f'view="{view}",method="{method}"'
+
+
+class MetricsRegistry:
+    """
+    Per-view metrics of this process, labelled by view and method. Each
+    worker process keeps its own, Prometheus scrapes every one of them.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.duration = Histogram(
+                f'{METRIC_PREFIX}_request_duration_seconds', 'Time spent handling the request.', DURATION_BUCKETS,
+            )
+            self.queries = Histogram(
+                f'{METRIC_PREFIX}_request_queries', 'SQL queries run by the request.', QUERY_BUCKETS,
+            )
+            self.db_time = Histogram(
+                f'{METRIC_PREFIX}_request_db_seconds', 'Time spent in SQL queries by the request.', DURATION_BUCKETS,
+            )
+            self.duplicates = Counter(
+                f'{METRIC_PREFIX}_request_duplicate_queries_total',
+                'Queries repeating a statement already run by the same request.',
+            )
+
+    def observe(self, view, method, duration, profile):
+        labels = (view, method)
+        with self._lock:
+            self.duration.observe(labels, duration)
+            self.queries.observe(labels, profile.queries)
+            self.db_time.observe(labels, profile.db_time)
+            if profile.duplicates:
+                self.duplicates.inc(labels, profile.duplicates)
+
+    def render(self):
+        with self._lock:
+            lines = [
+                line for metric in (self.duration, self.queries, self.db_time, self.duplicates)
+                for line in metric.render()
+            ]
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+
+def get_view_name(request):
+    """
+    `app.ViewClass` of the view that handled the request, None for views
+    outside of `REQUEST_METRICS_APPS`
+    """
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return None
+    view = getattr(match.func, 'cls', match.func)
+    app = view.__module__.split('.')[0]
+    if app not in getattr(settings, 'REQUEST_METRICS_APPS', ()):
+        return None
+    return f'{app}.{view.__name__}'
+
+
+def _start():
+    for connection in connections.all(initialized_only=True):
+        install_query_profiler(connection)
+    profile = RequestProfile()
+    current_profile.set(profile)
+    return profile, time.perf_counter()
+
+
+def _finish(request, response, profile, start):
+    duration = time.perf_counter() - start
+    current_profile.set(None)
+    view = get_view_name(request)
+    if view is None:
+        return response
+    registry.observe(view, request.method, duration, profile)
+    if getattr(settings, 'REQUEST_METRICS_HEADERS', False):
+        response['X-DB-Queries'] = str(profile.queries)
+        response['X-DB-Duplicate-Queries'] = str(profile.duplicates)
+        response['X-DB-Time'] = f'{profile.db_time * 1000:.1f}'
+        response['X-Response-Time'] = f'{duration * 1000:.1f}'
+    return response
+
+
+@sync_and_async_middleware
+def request_metrics_middleware(get_response):
+    """
+    Count the queries, the time spent in them and the repeated statements
+    of each request to the views of `REQUEST_METRICS_APPS`, aggregated in
+    `registry` and sent as `X-DB-*` headers with `REQUEST_METRICS_HEADERS`.
+
+    Unless `REQUEST_METRICS` is set the middleware is left out of the
+    stack, and no query wrapper is installed.
+    """
+    if not getattr(settings, 'REQUEST_METRICS', False):
+        raise MiddlewareNotUsed
+
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            profile, start = _start()
+            response = await get_response(request)
+            return _finish(request, response, profile, start)
+    else:
+        def middleware(request):
+            profile, start = _start()
+            response = get_response(request)
+            return _finish(request, response, profile, start)
+    return middleware
+
+
+def metrics_view(request):
+    """
+    The metrics of this process in the Prometheus text format, `METRICS_TOKEN`
+    when set must be given as a bearer token
+    """
+    if not getattr(settings, 'REQUEST_METRICS', False):
+        raise Http404
+    token = getattr(settings, 'METRICS_TOKEN', None)
+    if token and not constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return HttpResponse(status=401)
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
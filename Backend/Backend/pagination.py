@@ -0,0 +1,151 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import OrderedDict
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset (seek) pagination with an opaque cursor.
+
+    Rows are ordered by a timestamp and the primary key, and each page is
+    fetched with `WHERE (timestamp, id) < (last timestamp, last id)` instead
+    of an OFFSET, so a page deep in the list costs the same as the first one
+    as long as an index covers the ordering.
+
+    Views can override the ordering with a `keyset_ordering` attribute, both
+    fields must be ordered in the same direction. The first field can also be
+    an annotation of the queryset, such as a search rank.
+
+    Response format:
+    ```
+    {
+        "next": "<url of the next page or null>",
+        "results": [...]
+    }
+    ```
+    """
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+    cursor_query_param = 'cursor'
+    ordering = ('-created_at', '-id')
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self._page(list(self._page_queryset(queryset, request, view)))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """
+        `paginate_queryset` for async views, the page is read with the async ORM
+        """
+        return self._page([row async for row in self._page_queryset(queryset, request, view)])
+
+    def _page_queryset(self, queryset, request, view):
+        self.request = request
+        self.ordering = tuple(getattr(view, 'keyset_ordering', self.ordering))
+        self.page_size = self.get_page_size(request)
+        self.names = [self._field_name(field) for field in self.ordering]
+        self.fields = [self._get_field(queryset, name) for name in self.names]
+        # annotations are set on the instances under their own name
+        self.attnames = [
+            name if name in queryset.query.annotations else field.attname
+            for name, field in zip(self.names, self.fields)
+        ]
+
+        queryset = queryset.order_by(*self.ordering)
+        position = self.decode_cursor(request)
+        if position is not None:
+            queryset = queryset.filter(self._seek(position))
+
+        # one row more than the page tells whether there is a next page
+        return queryset[:self.page_size + 1]
+
+    def _page(self, rows):
+        self.has_next = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        self.next_position = self._position(rows[-1]) if self.has_next else None
+        return rows
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if size <= 0:
+            return self.page_size
+        return min(size, self.max_page_size)
+
+    def _field_name(self, ordering):
+        return ordering.lstrip('-')
+
+    def _get_field(self, queryset, name):
+        annotation = queryset.query.annotations.get(name)
+        if annotation is not None:
+            return annotation.output_field
+        return queryset.model._meta.get_field(name)
+
+    def _seek(self, position):
+        """
+        Build the filter selecting the rows after `position`.
+
+        `first <= value AND (first < value OR second < value)` is used instead
+        of the plain OR form, so the database can use the leading column of
+        the composite index as a range condition.
+        """
+        first, second = self.names
+        first_value, second_value = position
+        lookup = 'lt' if self.ordering[0].startswith('-') else 'gt'
+        return Q(**{f'{first}__{lookup}e': first_value}) & (
+            Q(**{f'{first}__{lookup}': first_value}) | Q(**{f'{second}__{lookup}': second_value})
+        )
+
+    def _position(self, instance):
+        if isinstance(instance, dict):
+            # rows of .values() are keyed by field name
+            return [instance[name] for name in self.names]
+        return [getattr(instance, name) for name in self.attnames]
+
+    def encode_cursor(self, position):
+        values = [value.isoformat() if hasattr(value, 'isoformat') else str(value) for value in position]
+        cursor = urlsafe_b64encode(json.dumps(values).encode()).decode()
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, cursor)
+
+    def decode_cursor(self, request):
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return None
+        try:
+            values = json.loads(urlsafe_b64decode(cursor.encode()).decode())
+            if not isinstance(values, list) or len(values) != len(self.fields):
+                raise ValueError
+            return [field.to_python(value) for field, value in zip(self.fields, values)]
+        except (TypeError, ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_next_link(self):
+        if self.next_position is None:
+            return None
+        return self.encode_cursor(self.next_position)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
@@ -0,0 +1,80 @@
+"""
+JSON renderer and parser built on orjson.
+
+orjson serializes UUID values natively and is several times faster than
+the `json` module on the payloads of the list endpoints. Raw datetime
+values are left to the DRF encoder, so they keep its millisecond `Z`
+format; serializer fields already turn them into strings. When orjson is
+not installed, or when an indented output is requested (browsable API,
+`application/json; indent=4`), the stdlib implementation of DRF is used,
+so the output stays valid either way.
+"""
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+if orjson is not None:
+    # dict keys are not always strings, e.g. label numbers in the materials by label view
+    ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+else:
+    ORJSON_OPTIONS = 0
+
+_fallback_encoder = JSONEncoder()
+
+
+def _default(value):
+    """
+    Values orjson does not know or passes through (lazy translations,
+    Decimal, datetimes...) are converted like DRF does
+    """
+    return _fallback_encoder.default(value)
+
+
+def dumps(data):
+    """
+    Encode `data` as compact UTF-8 JSON bytes
+    """
+    if orjson is not None:
+        return orjson.dumps(data, default=_default, option=ORJSON_OPTIONS)
+    return JSONRenderer().render(data)
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    `JSONRenderer` using orjson for compact output
+    """
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None or not self.compact or not self.strict:
+            return super().render(data, accepted_media_type, renderer_context)
+        if self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        ret = orjson.dumps(data, default=_default, option=ORJSON_OPTIONS)
+        # keep the output a strict javascript subset, as JSONRenderer does
+        if b'\xe2\x80\xa8' in ret or b'\xe2\x80\xa9' in ret:
+            ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+        return ret
+
+
+class FastJSONParser(JSONParser):
+    """
+    `JSONParser` using orjson, which only accepts UTF-8 and rejects NaN and Infinity
+    """
+    renderer_class = FastJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        if orjson is None or encoding.lower().replace('-', '') != 'utf8':
+            return super().parse(stream, media_type, parser_context)
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError('JSON parse error - %s' % str(exc))
@@ -0,0 +1,483 @@
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist, ImproperlyConfigured
+from django.db import models
+from django.db.models.query import ModelIterable
+from django.utils import timezone
+from rest_framework import ISO_8601, serializers
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.settings import api_settings
+
+from .pagination import KeysetPagination
+
+FIELDS_QUERY_PARAM = 'fields'
+EXPAND_QUERY_PARAM = 'expand'
+COMPACT_QUERY_PARAM = 'compact'
+
+# serializer fields whose output is the database value itself
+PASSTHROUGH_FIELDS = (
+    serializers.CharField, serializers.ChoiceField, serializers.IntegerField, serializers.BooleanField,
+)
+PASSTHROUGH_MODEL_FIELDS = (
+    models.CharField, models.TextField, models.IntegerField, models.BooleanField,
+)
+
+
+def parse_field_tree(value):
+    """
+    Parse `id,name,group.name` into `{'id': None, 'name': None, 'group': {'name': None}}`,
+    None standing for the whole field
+    """
+    tree = {}
+    for path in value.split(','):
+        parts = [part.strip() for part in path.split('.')]
+        if not all(parts):
+            continue
+        node = tree
+        for part in parts[:-1]:
+            if part in node and node[part] is None:
+                # the whole field is already requested
+                break
+            node = node.setdefault(part, {})
+        else:
+            node[parts[-1]] = None
+    return tree
+
+
+def get_query_tree(request, param):
+    """
+    The field tree given in `param` of the query string of a read request, or None
+    """
+    if request is None or request.method not in SAFE_METHODS:
+        return None
+    # plain Django requests can be given in the serializer context too
+    params = getattr(request, 'query_params', request.GET)
+    if param not in params:
+        return None
+    return parse_field_tree(params[param])
+
+
+def wants_compact(request):
+    return request.query_params.get(COMPACT_QUERY_PARAM, '').lower() in ('1', 'true', 'yes')
+
+
+def _check_known(tree, known, param):
+    unknown = sorted(set(tree) - set(known))
+    if unknown:
+        raise serializers.ValidationError({param: f"Unknown fields: {', '.join(unknown)}."})
+
+
+class DynamicFieldsMixin:
+    """
+    Sparse fieldsets for model serializers, read from the query string of
+    GET requests by the top level serializer or given as arguments:
+
+        - `fields=id,name,group.name`: only these fields are serialized,
+          dotted names select the fields of nested serializers
+        - `expand=group`: the fields of `Meta.expandable_fields` listed are
+          nested, the others are sent as their primary key. All of them
+          are nested when `expand` is not given, an empty `expand=` nests none
+
+    `prepare_queryset()` restricts a queryset to the columns and relations
+    the requested fields need, adding the lookups of `Meta.prefetch_fields`
+    of the fields that are requested.
+    """
+    def __init__(self, *args, fields=None, expand=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.requested_fields = fields
+        self.requested_expand = expand
+
+    def _is_root(self):
+        parent = self.parent
+        return parent is None or (isinstance(parent, serializers.ListSerializer) and parent.parent is None)
+
+    def get_requested(self):
+        """
+        The `(fields, expand)` trees of this serializer, None when not restricted
+        """
+        fields, expand = self.requested_fields, self.requested_expand
+        if self._is_root():
+            request = self.context.get('request')
+            if fields is None:
+                fields = get_query_tree(request, FIELDS_QUERY_PARAM)
+            if expand is None:
+                expand = get_query_tree(request, EXPAND_QUERY_PARAM)
+        return fields, expand
+
+    def get_fields(self):
+        fields = super().get_fields()
+        requested, expand = self.get_requested()
+        expandable = getattr(self.Meta, 'expandable_fields', ())
+        if expand is not None:
+            _check_known(expand, expandable, EXPAND_QUERY_PARAM)
+        if requested is not None:
+            _check_known(requested, fields, FIELDS_QUERY_PARAM)
+            fields = {name: field for name, field in fields.items() if name in requested}
+
+        for name in expandable:
+            if name not in fields:
+                continue
+            if expand is not None and name not in expand:
+                fields[name] = serializers.PrimaryKeyRelatedField(read_only=True, source=fields[name].source)
+            elif isinstance(fields[name], DynamicFieldsMixin):
+                fields[name].requested_fields = requested.get(name) if requested else None
+                fields[name].requested_expand = expand.get(name) if expand else None
+        return fields
+
+    def get_expanded_fields(self):
+        """
+        The nested serializers of single relations that are serialized
+        """
+        return {
+            name: field for name, field in self.fields.items()
+            if isinstance(field, DynamicFieldsMixin) and name in getattr(self.Meta, 'expandable_fields', ())
+        }
+
+    def _query_plan(self, prefix):
+        """
+        Return `(only, select_related, prefetch_related)` lookups, `only` is
+        None when some field can not be mapped to a column
+        """
+        opts = self.Meta.model._meta
+        only, related, prefetch = [prefix + opts.pk.name], [], []
+        prefetch_fields = getattr(self.Meta, 'prefetch_fields', {})
+        for name, field in self.fields.items():
+            if name in prefetch_fields:
+                prefetch.extend(prefix + lookup for lookup in prefetch_fields[name])
+                continue
+            value_columns = getattr(field, 'value_columns', None)
+            if value_columns is not None:
+                if only is not None:
+                    only.extend(prefix + column for column in value_columns)
+                continue
+            try:
+                model_field = opts.get_field(field.source)
+            except FieldDoesNotExist:
+                only = None
+                continue
+            if not model_field.concrete:
+                only = None
+            elif isinstance(field, DynamicFieldsMixin) and model_field.is_relation:
+                related.append(prefix + field.source)
+                nested_only, nested_related, nested_prefetch = field._query_plan(prefix + field.source + '__')
+                related.extend(nested_related)
+                prefetch.extend(nested_prefetch)
+                if only is not None and nested_only is not None:
+                    only.extend([prefix + field.source, *nested_only])
+                else:
+                    only = None
+            elif isinstance(field, serializers.BaseSerializer):
+                only = None
+            elif only is not None:
+                only.append(prefix + field.source)
+        return only, related, prefetch
+
+    def prepare_queryset(self, queryset, *extra):
+        """
+        Restrict `queryset` to what the requested fields need, `extra` are
+        other fields to load, e.g. the fields a paginator orders by
+        """
+        only, related, prefetch = self._query_plan('')
+        if related:
+            queryset = queryset.select_related(*related)
+        if prefetch:
+            queryset = queryset.prefetch_related(*prefetch)
+        if only is not None:
+            queryset = queryset.only(*only, *extra)
+        return queryset
+
+    def compact(self, queryset):
+        """
+        Serialize `queryset` with every expanded parent sent once:
+        `{"results": [rows referencing parents by id], "included": {"group": [parents]}}`
+        """
+        requested, expand = self.get_requested()
+        expanded = self.get_expanded_fields()
+        flat_expand = {name: sub for name, sub in (expand or {}).items() if name not in expanded}
+        serializer = type(self)(context=self.context, fields=requested, expand=flat_expand)
+        results = type(self)(
+            serializer.prepare_queryset(queryset), many=True,
+            context=self.context, fields=requested, expand=flat_expand,
+        ).data
+
+        included = {}
+        for name, field in expanded.items():
+            ids = {row[name] for row in results if row[name] is not None}
+            nested_class = type(field)
+            nested_fields = field.requested_fields
+            if nested_fields is not None:
+                # the rows reference their parent by primary key
+                nested_fields = {**nested_fields, nested_class.Meta.model._meta.pk.name: None}
+            parents = nested_class(context=self.context, fields=nested_fields, expand=field.requested_expand)
+            parents_queryset = parents.prepare_queryset(nested_class.Meta.model.objects.filter(pk__in=ids))
+            included[name] = nested_class(
+                parents_queryset, many=True, context=self.context,
+                fields=nested_fields, expand=field.requested_expand,
+            ).data
+        return {'results': results, 'included': included}
+
+
+def _model_field(serializer, source):
+    model = getattr(getattr(serializer, 'Meta', None), 'model', None)
+    if model is None or '.' in source:
+        return None
+    try:
+        return model._meta.get_field(source)
+    except FieldDoesNotExist:
+        return None
+
+
+def _file_converter(field, model_field):
+    use_url = getattr(field, 'use_url', api_settings.UPLOADED_FILES_USE_URL)
+
+    def convert(name, state):
+        if not name:
+            return None
+        if not use_url:
+            return name
+        url = model_field.storage.url(name)
+        request = state['request']
+        return request.build_absolute_uri(url) if request is not None else url
+    return convert
+
+
+def _datetime_converter(field):
+    output_format = getattr(field, 'format', api_settings.DATETIME_FORMAT)
+    if hasattr(field, 'timezone') or output_format is None or output_format.lower() != ISO_8601:
+        return lambda value, state: field.to_representation(value)
+
+    def convert(value, state):
+        # DateTimeField.to_representation without looking up the current timezone for every value
+        if state['timezone'] is None or value.tzinfo is None:
+            return field.to_representation(value)
+        value = value.astimezone(state['timezone']).isoformat()
+        return value[:-6] + 'Z' if value.endswith('+00:00') else value
+    return convert
+
+
+def _converter(field, model_field):
+    """
+    Return `convert(value, state)` giving the output of `field` for a
+    database value, or None when the value is output as is
+    """
+    if isinstance(field, serializers.DateTimeField):
+        return _datetime_converter(field)
+    if isinstance(field, serializers.FileField):
+        if model_field is None:
+            raise ImproperlyConfigured(f'{field.field_name} must be a model file field.')
+        return _file_converter(field, model_field)
+    if isinstance(field, serializers.PrimaryKeyRelatedField) and field.pk_field is None:
+        # `.values('owner')` gives the primary key, as PrimaryKeyRelatedField does
+        return None
+    if isinstance(field, serializers.UUIDField) and field.uuid_format == 'hex_verbose':
+        return lambda value, state: str(value)
+    if isinstance(field, PASSTHROUGH_FIELDS) and isinstance(model_field, PASSTHROUGH_MODEL_FIELDS):
+        return None
+    return lambda value, state: field.to_representation(value)
+
+
+def _row_converter(field, columns, names):
+    def convert(row, state):
+        return field.from_values({name: row[column] for name, column in zip(names, columns)}, state['request'])
+    return convert
+
+
+def _build_plan(serializer, prefix=''):
+    """
+    Turn the fields of `serializer` into `(name, column, convert)` entries,
+    nested serializers give `(name, column of the relation, nested plan)`
+    """
+    plan = []
+    for name, field in serializer.fields.items():
+        if field.write_only:
+            continue
+        value_columns = getattr(field, 'value_columns', None)
+        if value_columns is not None:
+            # fields computed from several columns, read from the row by `from_values`
+            columns = tuple(prefix + column for column in value_columns)
+            plan.append((name, columns, _row_converter(field, columns, value_columns)))
+            continue
+        if field.source == '*' or isinstance(field, serializers.SerializerMethodField):
+            raise ImproperlyConfigured(f'{name} can not be read with .values().')
+        column = prefix + field.source.replace('.', '__')
+        if isinstance(field, serializers.ListSerializer):
+            raise ImproperlyConfigured(f'{name} can not be read with .values().')
+        if isinstance(field, serializers.BaseSerializer):
+            plan.append((name, column, _build_plan(field, column + '__')))
+        else:
+            plan.append((name, column, _converter(field, _model_field(serializer, field.source))))
+    return plan
+
+
+def _expandable_tree(serializer):
+    """
+    `{name: subtree}` of the expandable nested serializers of `serializer`,
+    the subtree is None when the nested serializer has no sparse fieldsets
+    """
+    tree = {}
+    for name in getattr(getattr(serializer, 'Meta', None), 'expandable_fields', ()):
+        field = serializer.fields.get(name)
+        if isinstance(field, serializers.BaseSerializer):
+            tree[name] = _expandable_tree(field) if isinstance(field, DynamicFieldsMixin) else None
+    return tree
+
+
+def _select(plan, expandable, fields, expand):
+    """
+    The entries of `plan` for the `fields` and `expand` trees, as
+    `DynamicFieldsMixin` selects them: expandable relations that are not
+    expanded give their primary key, the column of the relation
+    """
+    if expand is not None:
+        _check_known(expand, expandable, EXPAND_QUERY_PARAM)
+    if fields is not None:
+        _check_known(fields, [name for name, column, convert in plan], FIELDS_QUERY_PARAM)
+    selected = []
+    for name, column, convert in plan:
+        if fields is not None and name not in fields:
+            continue
+        if name in expandable:
+            if expand is not None and name not in expand:
+                convert = None
+            elif expandable[name] is not None:
+                convert = _select(
+                    convert, expandable[name],
+                    fields.get(name) if fields else None, expand.get(name) if expand else None,
+                )
+        selected.append((name, column, convert))
+    return selected
+
+
+def _columns(plan):
+    for name, column, convert in plan:
+        if isinstance(column, tuple):
+            yield from column
+            continue
+        yield column
+        if isinstance(convert, list):
+            yield from _columns(convert)
+
+
+def _represent(plan, row, state):
+    ret = {}
+    for name, column, convert in plan:
+        if isinstance(column, tuple):
+            ret[name] = convert(row, state)
+            continue
+        value = row[column]
+        if value is None or convert is None:
+            ret[name] = value
+        elif isinstance(convert, list):
+            ret[name] = _represent(convert, row, state)
+        else:
+            ret[name] = convert(value, state)
+    return ret
+
+
+class ValuesListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        fields, expand = self.child.get_requested()
+        if isinstance(data, models.QuerySet) and data._iterable_class is ModelIterable:
+            data = self.child.values(data, fields=fields, expand=expand)
+        elif isinstance(data, models.Manager):
+            data = self.child.values(data.all(), fields=fields, expand=expand)
+        plan, state = self.child.get_plan(fields, expand), self.child.get_state()
+        return [_represent(plan, row, state) for row in data]
+
+
+class ValuesSerializer(serializers.BaseSerializer):
+    """
+    Read only serializer producing the output of `serializer_class` from
+    the dicts of `queryset.values()`, without building model instances or
+    going through the field machinery of every row.
+
+    The columns come from the declared fields of `serializer_class`: plain
+    and related fields map to their source, nested serializers to columns
+    across the relation (`user__username`), file fields give the URL of the
+    stored name, fields with `value_columns` read those columns and build
+    their output with `from_values(values, request)`. Querysets are turned
+    into `.values()` ones automatically.
+    `?fields=` and `?expand=` select the fields as `DynamicFieldsMixin` does,
+    and so the columns read: relations that are not expanded are read as
+    their primary key only.
+    """
+    serializer_class = None
+
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        kwargs['child'] = cls(context=kwargs.get('context'))
+        return ValuesListSerializer(*args, **kwargs)
+
+    @classmethod
+    def get_plan(cls, fields=None, expand=None):
+        if '_plan' not in cls.__dict__:
+            if cls.serializer_class is None:
+                raise ImproperlyConfigured(f'{cls.__name__} must define serializer_class.')
+            serializer = cls.serializer_class()
+            cls._plan = _build_plan(serializer)
+            cls._expandable = _expandable_tree(serializer)
+        if fields is None and expand is None:
+            return cls._plan
+        return _select(cls._plan, cls._expandable, fields, expand)
+
+    @classmethod
+    def get_columns(cls, fields=None, expand=None):
+        return list(_columns(cls.get_plan(fields, expand)))
+
+    @classmethod
+    def values(cls, queryset, *extra, fields=None, expand=None):
+        """
+        `queryset.values()` with the columns of the serializer and `extra`,
+        e.g. the fields a paginator orders by
+        """
+        return queryset.values(*dict.fromkeys([*cls.get_columns(fields, expand), *extra]))
+
+    def get_requested(self):
+        """
+        The `(fields, expand)` trees of the request, None when not restricted
+        """
+        request = self.context.get('request')
+        return get_query_tree(request, FIELDS_QUERY_PARAM), get_query_tree(request, EXPAND_QUERY_PARAM)
+
+    def get_state(self):
+        """
+        What the converters need, looked up once for all the rows
+        """
+        return {
+            'request': self.context.get('request'),
+            'timezone': timezone.get_current_timezone() if settings.USE_TZ else None,
+        }
+
+    def to_representation(self, row):
+        if not isinstance(row, dict):
+            raise TypeError(f'{type(self).__name__} serializes rows of .values(), not {type(row).__name__}.')
+        return _represent(self.get_plan(*self.get_requested()), row, self.get_state())
+
+
+class ValuesListMixin:
+    """
+    List views serializing with a `ValuesSerializer` read their rows with
+    `.values()`, including the fields of the keyset ordering
+    """
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        ordering = getattr(self, 'keyset_ordering', KeysetPagination.ordering)
+        return self.get_serializer_class().values(
+            queryset, *(field.lstrip('-') for field in ordering),
+            fields=get_query_tree(self.request, FIELDS_QUERY_PARAM),
+            expand=get_query_tree(self.request, EXPAND_QUERY_PARAM),
+        )
+
+
+class DynamicFieldsViewMixin:
+    """
+    Generic views reading only the columns and relations needed by the
+    fields requested from their `DynamicFieldsMixin` serializer
+    """
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.request.method not in SAFE_METHODS:
+            return queryset
+        extra = ()
+        if self.pagination_class is KeysetPagination:
+            extra = [field.lstrip('-') for field in getattr(self, 'keyset_ordering', KeysetPagination.ordering)]
+        return self.get_serializer().prepare_queryset(queryset, *extra)
@@ -41,6 +41,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'corsheaders',
     'rest_framework',
     'rest_framework_simplejwt',
@@ -48,9 +49,13 @@ INSTALLED_APPS = [
     'users',
     'groups_courses',
     'materials',
+    # the project wide management commands (benchmarks, seeding)
+    'Backend',
 ]
 
 MIDDLEWARE = [
+    'Backend.metrics.request_metrics_middleware',
+    'Backend.database.replica_routing_middleware',
     'django.middleware.security.SecurityMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -85,24 +90,133 @@ WSGI_APPLICATION = 'Backend.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
-DATABASES = {
-    'default': {
+# The app is served under ASGI, where every request runs in a new thread and
+# persistent connections are never reused but pile up, one per thread: they
+# are closed after each request unless DB_CONN_MAX_AGE (seconds) is set for a
+# WSGI deployment. To reuse connections under ASGI put PgBouncer in front of
+# PostgreSQL, or set DB_POOL to let Django pool them (needs psycopg 3 with
+# `psycopg[pool]` in place of psycopg2)
+DB_CONN_MAX_AGE = env.int('DB_CONN_MAX_AGE', default=0)
+DB_POOL = env.bool('DB_POOL', default=False)
+DB_POOL_MIN_SIZE = env.int('DB_POOL_MIN_SIZE', default=2)
+DB_POOL_MAX_SIZE = env.int('DB_POOL_MAX_SIZE', default=10)
+
+
+def database(host, port):
+    config = {
         'ENGINE': 'django.db.backends.postgresql',
         'NAME': env('DB_NAME'),
         'USER': env('DB_USER'),
         'PASSWORD': env('DB_PASSWORD'),
-        'HOST': env('DB_HOST'),
-        'PORT': env('DB_PORT'),
+        'HOST': host,
+        'PORT': port,
+        'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+        'CONN_HEALTH_CHECKS': True,
+    }
+    if DB_POOL:
+        config['CONN_MAX_AGE'] = 0
+        config['OPTIONS'] = {'pool': {'min_size': DB_POOL_MIN_SIZE, 'max_size': DB_POOL_MAX_SIZE}}
+    return config
+
+
+DATABASES = {
+    'default': database(env('DB_HOST'), env('DB_PORT')),
+}
+
+# Read replicas, `host` or `host:port` entries. The reads of safe requests are
+# sent to them by Backend.database.ReplicaRouter, the reads of a client stay on
+# the primary for REPLICA_STICKY_SECONDS after it wrote
+for number, replica in enumerate(env.list('DB_REPLICA_HOSTS', default=[]), start=1):
+    host, _, port = replica.partition(':')
+    DATABASES[f'replica{number}'] = {
+        **database(host, port or env('DB_PORT')),
+        # tests run against the primary only
+        'TEST': {'MIRROR': 'default'},
+    }
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+DATABASE_ROUTERS = ['Backend.database.ReplicaRouter']
+REPLICA_STICKY_SECONDS = env.int('REPLICA_STICKY_SECONDS', default=5)
+REPLICA_STICKY_COOKIE = 'use_primary'
+
+CACHES = {
+    'default': {
+        'BACKEND': env('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': env('CACHE_LOCATION', default='studysphere'),
     }
 }
 
+# Group policies and member roles used by the permission checks
+GROUP_ACCESS_CACHE_ALIAS = 'default'
+GROUP_ACCESS_CACHE_TIMEOUT = env.int('GROUP_ACCESS_CACHE_TIMEOUT', default=300)
+
+# Users resolved by CookieJWTAuthentication are kept in an in-process LRU,
+# and in the cache named by USER_CACHE_ALIAS when it is set
+USER_CACHE_SIZE = env.int('USER_CACHE_SIZE', default=1024)
+USER_CACHE_TIMEOUT = env.int('USER_CACHE_TIMEOUT', default=60)
+USER_CACHE_ALIAS = env('USER_CACHE_ALIAS', default=None)
+# Build the user from the signed token claims without any lookup, changes to
+# the user only apply once the access token expires
+JWT_TRUST_CLAIMS = env.bool('JWT_TRUST_CLAIMS', default=False)
+
+# Per-process Bloom filter of the blacklisted token ids, the blacklist table is
+# only queried on a possible match. New rows are read every SYNC_INTERVAL
+# seconds and the filter is rebuilt every REBUILD_INTERVAL seconds
+BLACKLIST_FILTER_CAPACITY = env.int('BLACKLIST_FILTER_CAPACITY', default=100_000)
+BLACKLIST_FILTER_ERROR_RATE = env.float('BLACKLIST_FILTER_ERROR_RATE', default=0.001)
+BLACKLIST_FILTER_SYNC_INTERVAL = env.int('BLACKLIST_FILTER_SYNC_INTERVAL', default=5)
+# ids read again at every sync, rows committed late below the last id seen
+BLACKLIST_FILTER_SYNC_OVERLAP = env.int('BLACKLIST_FILTER_SYNC_OVERLAP', default=1000)
+BLACKLIST_FILTER_REBUILD_INTERVAL = env.int('BLACKLIST_FILTER_REBUILD_INTERVAL', default=3600)
+# Password hashes of the async login and registration views run in a pool of
+# PASSWORD_HASHING_WORKERS threads, with PASSWORD_HASHING_QUEUE_SIZE more
+# waiting at most, the requests past that get a 429. Logins run the whole
+# authenticate() there, 0 runs it in the thread of the sync views instead
+PASSWORD_HASHING_WORKERS = env.int('PASSWORD_HASHING_WORKERS', default=4)
+PASSWORD_HASHING_QUEUE_SIZE = env.int('PASSWORD_HASHING_QUEUE_SIZE', default=16)
+# DNS deliverability checks of the emails at registration, cached per domain.
+# A check takes at most EMAIL_DNS_TIMEOUT seconds, and the domain is let
+# through when it cannot be checked in time. EMAIL_DNS_RESOLVER is the dotted
+# path of a resolver class, `users.deliverability.StubResolver` answers from
+# EMAIL_DNS_STUB_RECORDS ({domain: [mx hosts]}) without any network access
+EMAIL_DELIVERABILITY_CACHE_ALIAS = 'default'
+EMAIL_DELIVERABILITY_CACHE_TIMEOUT = env.int('EMAIL_DELIVERABILITY_CACHE_TIMEOUT', default=86400)
+EMAIL_DELIVERABILITY_NEGATIVE_CACHE_TIMEOUT = env.int('EMAIL_DELIVERABILITY_NEGATIVE_CACHE_TIMEOUT', default=3600)
+EMAIL_DNS_TIMEOUT = env.float('EMAIL_DNS_TIMEOUT', default=3.0)
+EMAIL_DNS_CONCURRENCY = env.int('EMAIL_DNS_CONCURRENCY', default=8)
+EMAIL_DNS_RESOLVER = env('EMAIL_DNS_RESOLVER', default=None)
+EMAIL_DNS_STUB_RECORDS = {}
+# Expired tokens deleted per statement by `manage.py prunetokens`
+TOKEN_PRUNE_BATCH_SIZE = env.int('TOKEN_PRUNE_BATCH_SIZE', default=1000)
+
+# Per-view query counts, DB time and repeated statements, served at /metrics
+# in the Prometheus text format (bearer METRICS_TOKEN when set), and sent as
+# X-DB-* response headers with REQUEST_METRICS_HEADERS. Off, the middleware is
+# left out of the stack
+REQUEST_METRICS = env.bool('REQUEST_METRICS', default=False)
+REQUEST_METRICS_HEADERS = env.bool('REQUEST_METRICS_HEADERS', default=False)
+REQUEST_METRICS_APPS = ['materials', 'groups_courses', 'users']
+METRICS_TOKEN = env('METRICS_TOKEN', default=None)
+
+# Rows read and serialized at a time by list views streamed with `?stream=true`
+STREAMING_CHUNK_SIZE = env.int('STREAMING_CHUNK_SIZE', default=500)
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'users.authentication.CookieJWTAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
-    ]
+    ],
+    # orjson based, falls back to the stdlib json module when orjson is missing
+    'DEFAULT_RENDERER_CLASSES': [
+        'Backend.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'Backend.renderers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
 }
 
 SIMPLE_JWT = {
@@ -188,4 +302,28 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Serve MEDIA_ROOT from Django during development (profile pictures). The
+# material files are never served from MEDIA_URL, only by the download
+# endpoint, which checks the group membership
+SERVE_MEDIA = env.bool('SERVE_MEDIA', default=False)
+PRIVATE_MEDIA_DIRS = ['materials', 'blobs', 'uploads']
+
+# 'path' stores every upload under materials/<course_id>/, 'content' (opt-in)
+# stores every distinct material file once, keyed by its SHA-256
+MATERIAL_STORAGE_MODE = env('MATERIAL_STORAGE_MODE', default='path')
+
+# Hand material downloads to the front server: None (stream from Django),
+# 'x-accel-redirect' (nginx, internal location MATERIAL_ACCEL_REDIRECT_PREFIX
+# aliased to MEDIA_ROOT) or 'x-sendfile' (apache, lighttpd)
+MATERIAL_DOWNLOAD_ACCEL = env('MATERIAL_DOWNLOAD_ACCEL', default=None)
+MATERIAL_ACCEL_REDIRECT_PREFIX = '/protected-media/'
+
+# Size of the chunks of resumable material uploads
+MATERIAL_UPLOAD_CHUNK_SIZE = env.int('MATERIAL_UPLOAD_CHUNK_SIZE', default=5 * 1024 * 1024)
+# Seconds a resumable upload has to complete, the expired ones are deleted
+# with their staging file by `manage.py purgeuploads`
+MATERIAL_UPLOAD_SESSION_TTL = env.int('MATERIAL_UPLOAD_SESSION_TTL', default=24 * 60 * 60)
+# Resumable uploads a user can have in progress
+MATERIAL_UPLOAD_MAX_SESSIONS = env.int('MATERIAL_UPLOAD_MAX_SESSIONS', default=10)
+
 AUTH_USER_MODEL = 'users.User'
\ No newline at end of file
@@ -0,0 +1,27 @@
+"""
+Settings of the test suite, `python manage.py test --settings=Backend.test_settings`:
+the primary and a read replica on two SQLite files, so that the reads sent to
+the replica by ReplicaRouter go through a connection of their own. The test
+database of the replica mirrors the primary's.
+"""
+import os
+
+for name, value in [('SECRET_KEY', 'test'), ('DB_NAME', 'studysphere'), ('DB_USER', ''), ('DB_PASSWORD', ''),
+                    ('DB_HOST', ''), ('DB_PORT', '')]:
+    os.environ.setdefault(name, value)
+
+from .settings import *  # noqa: E402,F401,F403
+from .settings import BASE_DIR  # noqa: E402
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(BASE_DIR, 'primary.sqlite3'),
+    },
+    'replica1': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(BASE_DIR, 'replica.sqlite3'),
+        'TEST': {'MIRROR': 'default'},
+    },
+}
+DATABASE_REPLICAS = ['replica1']
@@ -0,0 +1,579 @@
+import io
+import json
+import os
+import shutil
+import tempfile
+from importlib import import_module
+from unittest import skipUnless
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection, connections, transaction
+from django.http import HttpResponse
+from django.test import RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils.translation import gettext_lazy
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APITestCase, APITransactionTestCase
+from rest_framework_simplejwt.tokens import AccessToken
+
+from groups_courses.models import Course, Group, GroupMember, JoinRequest
+from groups_courses.serializers import GroupSerializer
+from materials.models import Label, Material, MaterialComment, MaterialLabel
+from users.authentication import UserRefreshToken
+from users.blacklist import blacklist_filter
+from users.cache import user_cache
+from users.deliverability import deliverability_checker
+from users.models import Profile, User
+from .database import replica_routing_middleware
+from .metrics import RequestProfile, registry
+from .renderers import FastJSONParser, FastJSONRenderer
+
+QUERY_BUDGET_APPS = ['groups_courses', 'materials', 'users']
+
+# Most queries each route may run with cold caches, savepoints included. The
+# count must not change with the number of members, materials, comments,
+# labels, courses and join requests (`QueryBudgetTests.sizes`)
+QUERY_BUDGETS = {
+    # groups_courses
+    ('group_create', 'post'): 5,
+    ('user_group_list', 'get'): 2,
+    ('group_list', 'get'): 1,
+    ('group_detail', 'get'): 2,
+    ('group_detail', 'put'): 6,
+    ('group_detail', 'patch'): 5,
+    ('group_detail', 'delete'): 22,
+    ('group_member_list', 'get'): 3,
+    ('group_member_create', 'post'): 5,
+    ('group_member_self_detail', 'get'): 3,
+    ('group_member_self_detail', 'delete'): 3,
+    ('group_member_detail', 'get'): 2,
+    ('group_member_detail', 'put'): 3,
+    ('group_member_detail', 'patch'): 3,
+    ('group_member_detail', 'delete'): 3,
+    ('join_request_list', 'get'): 3,
+    ('join_request_response', 'post'): 5,
+    ('course_list', 'get'): 3,
+    ('course_list', 'post'): 3,
+    ('course_detail', 'get'): 2,
+    ('course_detail', 'put'): 3,
+    ('course_detail', 'patch'): 3,
+    ('course_detail', 'delete'): 14,
+    # materials
+    ('create_material', 'post'): 5,
+    ('list_materials', 'get'): 4,
+    ('bulk_create_materials', 'post'): 7,
+    ('create_upload_session', 'post'): 7,
+    ('upload_session_detail', 'get'): 3,
+    ('upload_session_detail', 'delete'): 4,
+    ('upload_chunk', 'put'): 8,
+    ('complete_upload_session', 'post'): 10,
+    ('update_delete_material', 'get'): 4,
+    ('update_delete_material', 'put'): 5,
+    ('update_delete_material', 'patch'): 5,
+    ('update_delete_material', 'delete'): 5,
+    ('download_material', 'get'): 3,
+    ('list_create_labels', 'get'): 2,
+    ('list_create_labels', 'post'): 3,
+    ('material_labels', 'get'): 3,
+    ('material_labels', 'put'): 7,
+    ('materials_by_label', 'get'): 4,
+    ('create_material_comment', 'post'): 3,
+    ('list_material_comments', 'get'): 2,
+    ('update_delete_material_comment', 'get'): 2,
+    ('update_delete_material_comment', 'put'): 4,
+    ('update_delete_material_comment', 'patch'): 4,
+    ('update_delete_material_comment', 'delete'): 3,
+    # users
+    ('register', 'post'): 5,
+    # user_logged_in updates last_login
+    ('login', 'post'): 3,
+    ('logout', 'post'): 8,
+    ('token_refresh', 'post'): 2,
+    ('token_verify', 'post'): 2,
+    ('profile', 'get'): 2,
+    ('profile', 'put'): 3,
+    ('profile', 'patch'): 3,
+}
+
+def get_routes():
+    """
+    The (name, method) of every route of `QUERY_BUDGET_APPS`
+    """
+    routes = set()
+    for app in QUERY_BUDGET_APPS:
+        for pattern in import_module(f'{app}.urls').urlpatterns:
+            view = pattern.callback.cls
+            routes.update(
+                (pattern.name, method) for method in view.http_method_names
+                if method not in ('head', 'options') and hasattr(view, method)
+            )
+    return routes
+
+
+@override_settings(
+    MATERIAL_STORAGE_MODE='path', MATERIAL_UPLOAD_CHUNK_SIZE=4,
+    EMAIL_DNS_RESOLVER='users.deliverability.StubResolver',
+    EMAIL_DNS_STUB_RECORDS={'example.com': ['mx.example.com']},
+)
+# logins authenticate in the thread of the test, whose queries are counted
+@override_settings(PASSWORD_HASHING_WORKERS=0)
+class QueryBudgetTests(APITestCase):
+    """
+    Every route is requested with the fixture at each of `sizes`, each
+    request in a transaction rolled back afterwards, and must run the same
+    number of queries at every size, within its `QUERY_BUDGETS` entry
+    """
+    sizes = (10, 1000)
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        media = override_settings(MEDIA_ROOT=media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.addCleanup(self.clear_caches)
+
+        self.owner = User.objects.create_user(email='owner@example.com', username='owner', password='password')
+        Profile.objects.create(user=self.owner)
+        self.member = User.objects.create_user(email='member@example.com', username='member', password=None)
+        self.outsider = User.objects.create_user(email='outsider@example.com', username='outsider', password=None)
+        self.group = Group.objects.create(owner=self.owner, name='Study Group', join_type='open')
+        GroupMember.objects.create(group=self.group, user=self.member)
+        self.join_request = JoinRequest.objects.create(group=self.group, user=self.outsider)
+        self.course = Course.objects.create(group=self.group, name='Algorithms')
+        self.label = Label.objects.create(group=self.group, name='Week', min_value=1, max_value=20)
+        self.material = Material.objects.create(
+            title='Lecture', type='url', url='https://youtu.be/lecture', course=self.course, owner=self.owner,
+        )
+        MaterialLabel.objects.create(material=self.material, label=self.label, number=1)
+        self.document = Material.objects.create(
+            title='Notes', type='document', file=SimpleUploadedFile('notes.pdf', b'notes'),
+            course=self.course, owner=self.owner,
+        )
+        self.comment = MaterialComment.objects.create(material=self.material, User=self.owner, Content='First')
+        self.size = 0
+
+    def clear_caches(self):
+        cache.clear()
+        user_cache.clear()
+        blacklist_filter.clear()
+        deliverability_checker.clear()
+
+    def grow(self, size):
+        """
+        Add rows until every scaled relation holds `size` of them
+        """
+        new = range(self.size, size)
+        users = User.objects.bulk_create([User(email=f'user{i}@example.com', username=f'user{i}') for i in new])
+        GroupMember.objects.bulk_create([GroupMember(group=self.group, user=user) for user in users])
+        JoinRequest.objects.bulk_create([JoinRequest(group=self.group, user=user) for user in users])
+        Group.objects.bulk_create([Group(name=f'Group {i}', owner=self.owner) for i in new])
+        Course.objects.bulk_create([Course(name=f'Course {i}', group=self.group) for i in new])
+        Label.objects.bulk_create([
+            Label(name=f'Label {i}', group=self.group, min_value=1, max_value=20) for i in new
+        ])
+        materials = Material.objects.bulk_create([
+            Material(title=f'Material {i}', type='url', url=f'https://youtu.be/{i}', course=self.course, owner=self.owner)
+            for i in new
+        ])
+        MaterialLabel.objects.bulk_create([
+            MaterialLabel(material=material, label=self.label, number=i % 20 + 1)
+            for i, material in enumerate(materials)
+        ])
+        MaterialComment.objects.bulk_create([
+            MaterialComment(material=self.material, User=self.owner, Content=f'Comment {i}') for i in new
+        ])
+        self.size = size
+
+    def start_upload(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.owner)}')
+        response = self.client.post(
+            reverse('create_upload_session', args=[self.course.id]),
+            {'title': 'Upload', 'filename': 'notes.txt', 'size': 4}, format='json',
+        )
+        return response.data['id']
+
+    def upload_chunk(self):
+        upload_id = self.start_upload()
+        self.client.put(reverse('upload_chunk', args=[upload_id, 0]), b'0123', content_type='application/octet-stream')
+        return upload_id
+
+    def set_refresh_cookie(self):
+        self.client.cookies['refresh_token'] = str(UserRefreshToken.for_user(self.owner))
+
+    def get_endpoints(self):
+        """
+        The request of each route, `args` are the URL arguments, or returned
+        by `prepare` when the route needs more rows first
+        """
+        group, course, material = [self.group.id], [self.course.id], [self.material.id]
+        group_member = [self.group.id, self.member.id]
+        course_data = {'name': 'Data Structures', 'description': 'Trees'}
+        material_data = {'title': 'Renamed', 'type': 'url', 'url': 'https://youtu.be/renamed'}
+        new_material = {'title': 'New', 'type': 'url', 'url': 'https://youtu.be/new'}
+        return {
+            ('group_create', 'post'): {'data': {'name': 'New Group'}},
+            ('user_group_list', 'get'): {},
+            ('group_list', 'get'): {'user': None},
+            ('group_detail', 'get'): {'args': group},
+            ('group_detail', 'put'): {'args': group, 'data': {'name': 'Renamed', 'join_type': 'request'}},
+            ('group_detail', 'patch'): {'args': group, 'data': {'description': 'Weekly'}},
+            ('group_detail', 'delete'): {'args': group},
+            ('group_member_list', 'get'): {'args': group},
+            ('group_member_create', 'post'): {'args': group, 'user': self.outsider, 'data': {'user': self.outsider.id}},
+            ('group_member_self_detail', 'get'): {'args': group, 'user': self.member},
+            ('group_member_self_detail', 'delete'): {'args': group, 'user': self.member},
+            ('group_member_detail', 'get'): {'args': group_member},
+            ('group_member_detail', 'put'): {'args': group_member, 'data': {'user_role': 'admin'}},
+            ('group_member_detail', 'patch'): {'args': group_member, 'data': {'user_role': 'admin'}},
+            ('group_member_detail', 'delete'): {'args': group_member},
+            ('join_request_list', 'get'): {'args': group},
+            ('join_request_response', 'post'): {'args': [self.join_request.id], 'data': {'action': 'accept'}},
+            ('course_list', 'get'): {'args': group},
+            ('course_list', 'post'): {'args': group, 'data': course_data},
+            ('course_detail', 'get'): {'args': course},
+            ('course_detail', 'put'): {'args': course, 'data': course_data},
+            ('course_detail', 'patch'): {'args': course, 'data': {'description': 'Graphs'}},
+            ('course_detail', 'delete'): {'args': course},
+
+            ('create_material', 'post'): {'args': course, 'data': new_material},
+            ('list_materials', 'get'): {'args': course},
+            ('bulk_create_materials', 'post'): {
+                'args': course, 'data': {'materials': [new_material, {**new_material, 'title': 'Newer'}]},
+            },
+            ('create_upload_session', 'post'): {
+                'args': course, 'data': {'title': 'Upload', 'filename': 'notes.txt', 'size': 4},
+            },
+            ('upload_session_detail', 'get'): {'prepare': lambda: [self.upload_chunk()]},
+            ('upload_session_detail', 'delete'): {'prepare': lambda: [self.upload_chunk()]},
+            ('upload_chunk', 'put'): {
+                'prepare': lambda: [self.start_upload(), 0],
+                'data': b'0123', 'content_type': 'application/octet-stream',
+            },
+            ('complete_upload_session', 'post'): {'prepare': lambda: [self.upload_chunk()]},
+            ('update_delete_material', 'get'): {'args': material},
+            ('update_delete_material', 'put'): {'args': material, 'data': material_data},
+            ('update_delete_material', 'patch'): {'args': material, 'data': {'title': 'Renamed'}},
+            ('update_delete_material', 'delete'): {'args': material},
+            ('download_material', 'get'): {'args': [self.document.id]},
+            ('list_create_labels', 'get'): {'args': group},
+            ('list_create_labels', 'post'): {'args': group, 'data': {'name': 'Chapter', 'min_value': 1, 'max_value': 9}},
+            ('material_labels', 'get'): {'args': material},
+            ('material_labels', 'put'): {'args': material, 'data': {'labels': [{'label': self.label.id, 'number': 2}]}},
+            ('materials_by_label', 'get'): {'args': [self.course.id, self.label.id]},
+            ('create_material_comment', 'post'): {'data': {'material': self.material.id, 'Content': 'Thanks'}},
+            ('list_material_comments', 'get'): {'args': material},
+            ('update_delete_material_comment', 'get'): {'args': [self.comment.id]},
+            ('update_delete_material_comment', 'put'): {'args': [self.comment.id], 'data': {'Content': 'Edited'}},
+            ('update_delete_material_comment', 'patch'): {'args': [self.comment.id], 'data': {'Content': 'Edited'}},
+            ('update_delete_material_comment', 'delete'): {'args': [self.comment.id]},
+
+            ('register', 'post'): {'user': None, 'data': {
+                'email': 'new@example.com', 'username': 'new',
+                'password': 'a-long-passphrase', 'confirm_password': 'a-long-passphrase',
+            }},
+            ('login', 'post'): {'user': None, 'data': {'email': 'owner@example.com', 'password': 'password'}},
+            ('logout', 'post'): {'prepare': lambda: self.set_refresh_cookie()},
+            ('token_refresh', 'post'): {'user': None, 'prepare': lambda: self.set_refresh_cookie()},
+            ('token_verify', 'post'): {'user': None, 'prepare': lambda: self.set_refresh_cookie()},
+            ('profile', 'get'): {},
+            ('profile', 'put'): {'data': {'bio': 'Student', 'Affiliation': 'Uni', 'profile_picture': 'https://example.com/me.png'}},
+            ('profile', 'patch'): {'data': {'bio': 'Student'}},
+        }
+
+    def count_queries(self, route, endpoint):
+        """
+        Run the request of `route` with cold caches, and roll it back
+        """
+        name, method = route
+        with transaction.atomic():
+            self.client.cookies.clear()
+            args = endpoint['prepare']() if 'prepare' in endpoint else endpoint.get('args', [])
+            user = endpoint.get('user', self.owner)
+            if user is None:
+                self.client.credentials()
+            else:
+                self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(user)}')
+            if 'content_type' in endpoint:
+                options = {'content_type': endpoint['content_type']}
+            else:
+                options = {'format': 'json'}
+            self.clear_caches()
+
+            with CaptureQueriesContext(connection) as queries:
+                response = getattr(self.client, method)(reverse(name, args=args or None), endpoint.get('data'), **options)
+                if response.streaming:
+                    b''.join(response.streaming_content)
+            # only the queries of successful requests are budgeted
+            self.assertLess(response.status_code, 400, f'{method.upper()} {name}: {response.getvalue()[:200]}')
+            transaction.set_rollback(True)
+        return [query['sql'] for query in queries]
+
+    def test_every_route_has_a_budget(self):
+        self.assertEqual(get_routes(), set(QUERY_BUDGETS))
+        self.assertEqual(set(self.get_endpoints()), set(QUERY_BUDGETS))
+
+    def test_query_counts_do_not_grow_with_the_data(self):
+        counts = {}
+        for size in self.sizes:
+            self.grow(size)
+            counts[size] = {route: self.count_queries(route, endpoint) for route, endpoint in self.get_endpoints().items()}
+
+        smallest, largest = counts[self.sizes[0]], counts[self.sizes[-1]]
+        for route, budget in QUERY_BUDGETS.items():
+            with self.subTest(route=route):
+                self.assertEqual(
+                    len(smallest[route]), len(largest[route]),
+                    '\n'.join(['queries at the largest size:', *largest[route]]),
+                )
+                self.assertLessEqual(len(largest[route]), budget, '\n'.join(largest[route]))
+
+
+class FastJSONRendererTests(APITestCase):
+    def test_same_payload_as_stdlib(self):
+        user = User.objects.create_user(email='testuser@example.com', username='testuser', password='password')
+        group = Group.objects.create(owner=user, name="Study Group  ", join_type="open")
+        data = {
+            "group": GroupSerializer(group).data,
+            "owner": user.pk,
+            "created_at": group.created_at,
+            "detail": gettext_lazy("Not found."),
+            "materials": {1: [], 2: []},
+        }
+        fast = FastJSONRenderer().render(data)
+        self.assertEqual(json.loads(fast), json.loads(JSONRenderer().render(data)))
+
+    def test_parse_json_body(self):
+        response = self.client.post(reverse('login'), '{"email": "a@example.com", ', content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(FastJSONParser().parse(io.BytesIO('{"name": "été"}'.encode())), {"name": "été"})
+
+
+@override_settings(DATABASE_REPLICAS=['replica1'], REPLICA_STICKY_SECONDS=5)
+class ReplicaRouterTests(APITransactionTestCase):
+    # not wrapped in a transaction, reads inside one stay on the primary
+    def setUp(self):
+        self.user = User.objects.create_user(email='testuser@example.com', username='testuser', password='password')
+        self.factory = RequestFactory()
+
+    def _route(self, request, write=False):
+        routes = {}
+
+        def view(request):
+            routes['before'] = Group.objects.all().db
+            if write:
+                Group.objects.create(owner=self.user, name='Study Group')
+            routes['after'] = Group.objects.all().db
+            return HttpResponse()
+
+        response = replica_routing_middleware(view)(request)
+        return routes, response
+
+    def test_safe_reads_go_to_a_replica(self):
+        routes, response = self._route(self.factory.get('/'))
+        self.assertEqual(routes, {'before': 'replica1', 'after': 'replica1'})
+        self.assertNotIn('use_primary', response.cookies)
+
+    def test_unsafe_requests_read_from_the_primary(self):
+        routes, _ = self._route(self.factory.post('/'))
+        self.assertEqual(routes['before'], 'default')
+
+    def test_reads_after_a_write_stick_to_the_primary(self):
+        routes, response = self._route(self.factory.get('/'), write=True)
+        self.assertEqual(routes['after'], 'default')
+        self.assertEqual(response.cookies['use_primary']['max-age'], 5)
+
+        request = self.factory.get('/')
+        request.COOKIES['use_primary'] = response.cookies['use_primary'].value
+        routes, _ = self._route(request)
+        self.assertEqual(routes['before'], 'default')
+
+    def test_reads_in_a_transaction_use_the_primary(self):
+        def view(request):
+            with transaction.atomic():
+                return HttpResponse(Group.objects.all().db)
+
+        response = replica_routing_middleware(view)(self.factory.get('/'))
+        self.assertEqual(response.content, b'default')
+
+    def test_reads_outside_of_requests_use_the_primary(self):
+        self.assertEqual(Group.objects.all().db, 'default')
+
+    def test_writes_through_the_api_set_the_sticky_cookie(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.post(reverse('group_create'), {'name': 'Study Group'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertIn('use_primary', response.cookies)
+
+
+@skipUnless('replica1' in settings.DATABASES, 'needs a replica1 database, see Backend.test_settings')
+@override_settings(DATABASE_REPLICAS=['replica1'], REPLICA_STICKY_SECONDS=5)
+class ReplicaReadTests(APITransactionTestCase):
+    """
+    Reads through the replica connection of Backend.test_settings
+    """
+    databases = {'default', 'replica1'}
+
+    def setUp(self):
+        self.user = User.objects.create_user(email='testuser@example.com', username='testuser', password='password')
+        self.client.force_authenticate(user=self.user)
+
+    def _get_list(self):
+        with CaptureQueriesContext(connections['default']) as primary:
+            with CaptureQueriesContext(connections['replica1']) as replica:
+                response = self.client.get(reverse('group_list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response, len(primary), len(replica)
+
+    def test_reads_through_the_replica_and_stick_to_the_primary_after_a_write(self):
+        Group.objects.create(owner=self.user, name='Study Group')
+        response, primary, replica = self._get_list()
+        self.assertEqual([group['name'] for group in response.data['results']], ['Study Group'])
+        self.assertGreater(replica, 0)
+        self.assertEqual(primary, 0)
+
+        response = self.client.post(reverse('group_create'), {'name': 'Other Group'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        cookie = response.cookies['use_primary']
+        self.assertEqual(cookie['max-age'], 5)
+
+        # within the window the client sends the cookie back
+        response, primary, replica = self._get_list()
+        self.assertEqual(len(response.data['results']), 2)
+        self.assertGreater(primary, 0)
+        self.assertEqual(replica, 0)
+
+        # once it expired the reads go back to the replica
+        del self.client.cookies['use_primary']
+        _, primary, replica = self._get_list()
+        self.assertGreater(replica, 0)
+        self.assertEqual(primary, 0)
+
+
+@override_settings(REQUEST_METRICS=True, REQUEST_METRICS_HEADERS=True, METRICS_TOKEN='secret')
+class RequestMetricsTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        registry.reset()
+        self.user = User.objects.create_user(email='testuser@example.com', username='testuser', password='password')
+        self.group = Group.objects.create(owner=self.user, name='Study Group')
+        self.client.force_authenticate(user=self.user)
+
+    def test_headers_report_the_queries(self):
+        response = self.client.get(reverse('course_list', args=[self.group.id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertGreater(int(response['X-DB-Queries']), 0)
+        self.assertIn('X-DB-Duplicate-Queries', response)
+        self.assertIn('X-DB-Time', response)
+        self.assertIn('X-Response-Time', response)
+
+    async def test_queries_of_async_views_are_counted(self):
+        response = await self.async_client.get(
+            reverse('group_detail', args=[self.group.id]),
+            headers={'Authorization': f'Bearer {AccessToken.for_user(self.user)}'},
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertGreater(int(response['X-DB-Queries']), 0)
+
+    def test_repeated_statements_are_counted(self):
+        profile = RequestProfile()
+        for duration in (0.1, 0.2, 0.3):
+            profile.record('SELECT * FROM "course" WHERE "id" = %s', duration)
+        profile.record('SELECT * FROM "group"', 0.1)
+        self.assertEqual((profile.queries, profile.duplicates), (4, 2))
+        self.assertAlmostEqual(profile.db_time, 0.7)
+
+    def test_metrics_endpoint(self):
+        self.client.get(reverse('course_list', args=[self.group.id]))
+        self.client.get(reverse('course_list', args=[self.group.id]))
+
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        response = self.client.get(reverse('metrics'), headers={'Authorization': 'Bearer secret'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        body = response.content.decode()
+        self.assertIn('# TYPE studysphere_request_queries histogram', body)
+        self.assertIn(
+            'studysphere_request_duration_seconds_count{view="groups_courses.CoursesAPIView",method="GET"} 2', body,
+        )
+        self.assertIn('le="+Inf"', body)
+
+    @override_settings(REQUEST_METRICS=False)
+    def test_disabled(self):
+        response = self.client.get(reverse('course_list', args=[self.group.id]))
+        self.assertNotIn('X-DB-Queries', response)
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, status.HTTP_404_NOT_FOUND)
+
+
+class BenchmarkAPITests(APITestCase):
+    def setUp(self):
+        self.output = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.output, ignore_errors=True)
+
+    def _benchmark(self, **options):
+        out = io.StringIO()
+        call_command(
+            'benchmark_api', mix='browse=1,course=1,materials=1,comment=1', sessions=8, warmup=0,
+            concurrency=2, users=2, rows=3, stdout=out, **options,
+        )
+        return out.getvalue()
+
+    def test_results_and_baseline(self):
+        path = os.path.join(self.output, 'results.json')
+        self._benchmark(output=path)
+        with open(path) as output:
+            results = json.load(output)
+        self.assertEqual(results['total']['errors'], 0)
+        self.assertGreaterEqual(results['total']['requests'], 8)
+        self.assertTrue({'p50', 'p95', 'p99', 'rps'} <= set(results['endpoints']['group_list']))
+        # the fixture is removed
+        self.assertFalse(User.objects.exists())
+
+        self.assertIn('against the baseline', self._benchmark(baseline=path, tolerance=1000))
+        results['total']['rps'] *= 100
+        with open(path, 'w') as output:
+            json.dump(results, output)
+        with self.assertRaisesMessage(CommandError, 'total'):
+            self._benchmark(baseline=path, tolerance=50)
+
+
+class SeedScaleTests(APITestCase):
+    options = {
+        'users': 40, 'groups': 5, 'memberships': 100, 'courses': 8, 'labels': 6,
+        'materials': 60, 'comments': 120, 'batch_size': 25,
+    }
+
+    def _seed(self, **options):
+        call_command('seed_scale', stdout=io.StringIO(), **self.options, **options)
+        return sorted(Material.objects.values_list('id', 'course_id', 'owner_id', 'title'))
+
+    def test_rows_are_created(self):
+        self._seed()
+        self.assertEqual(User.objects.count(), 40)
+        self.assertEqual(Group.objects.count(), 5)
+        self.assertEqual(Material.objects.count(), 60)
+        self.assertEqual(MaterialComment.objects.count(), 120)
+        self.assertLessEqual(GroupMember.objects.count(), 100)
+        user = User.objects.first()
+        self.assertTrue(user.check_password('seed-password'))
+        self.assertTrue(hasattr(user, 'profile'))
+
+    def test_same_seed_same_rows(self):
+        first = self._seed(seed=3)
+        User.objects.all().delete()
+        self.assertEqual(self._seed(seed=3), first)
+        # other prefixes do not collide with the existing rows
+        self._seed(seed=3, prefix='other')
+        self.assertEqual(Material.objects.count(), 120)
+
+    def test_prefix_in_use(self):
+        self._seed()
+        with self.assertRaises(CommandError):
+            self._seed()
@@ -15,16 +15,28 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 from django.contrib import admin
-from django.urls import path, include
+import re
+
+from django.urls import path, include, re_path
 from django.conf import settings
-from django.conf.urls.static import static
+from django.views.static import serve
+
+from Backend.metrics import metrics_view
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/user/', include('users.urls')),
     path('api/', include('groups_courses.urls')),
     path('api/', include('materials.urls')),
+    path('metrics', metrics_view, name='metrics'),
 ]
 
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+if settings.SERVE_MEDIA:
+    # development only, the material files are left to the download endpoint
+    private = '|'.join(re.escape(name) for name in settings.PRIVATE_MEDIA_DIRS)
+    urlpatterns += [
+        re_path(
+            rf'^{re.escape(settings.MEDIA_URL.lstrip("/"))}(?!(?:{private})/)(?P<path>.*)$',
+            serve, {'document_root': settings.MEDIA_ROOT},
+        ),
+    ]
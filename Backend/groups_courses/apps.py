@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class GroupsCoursesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'groups_courses'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,161 @@
+import threading
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .models import Group, GroupMember
+
+
+class GroupPolicy(namedtuple('GroupPolicy', ['id', 'owner_id', 'join_type', 'post_permission', 'edit_permissions'])):
+    """
+    The access related fields of a group, cheap enough to keep in the cache.
+    It can be used in place of a Group object by the permission helpers.
+    """
+    __slots__ = ()
+    FIELDS = ('id', 'owner_id', 'join_type', 'post_permission', 'edit_permissions')
+
+    @property
+    def pk(self):
+        return self.id
+
+    @classmethod
+    def from_group(cls, group):
+        return cls(*(getattr(group, field) for field in cls.FIELDS))
+
+
+# stored for users that are not members of a group, so negative lookups are cached too
+NOT_A_MEMBER = ''
+
+
+class GroupAccessCache:
+    """
+    Cache of group policies and of the roles of users in groups.
+
+    Entries live in the Django cache named by `GROUP_ACCESS_CACHE_ALIAS` and
+    expire after `GROUP_ACCESS_CACHE_TIMEOUT` seconds. They are invalidated,
+    once the transaction of the change commits, by the receivers in
+    `groups_courses.signals`.
+    """
+    KEY_PREFIX = 'group_access'
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def cache(self):
+        return caches[getattr(settings, 'GROUP_ACCESS_CACHE_ALIAS', 'default')]
+
+    @property
+    def timeout(self):
+        return getattr(settings, 'GROUP_ACCESS_CACHE_TIMEOUT', 300)
+
+    def policy_key(self, group_id):
+        return f'{self.KEY_PREFIX}:policy:{group_id}'
+
+    def role_key(self, group_id, user_id):
+        return f'{self.KEY_PREFIX}:role:{group_id}:{user_id}'
+
+    def _count(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def get_policy(self, group_id):
+        """
+        Return the GroupPolicy of a group, or None if the group does not exist
+        """
+        key = self.policy_key(group_id)
+        policy = self.cache.get(key)
+        if policy is not None:
+            self._count(hit=True)
+            return GroupPolicy(*policy)
+
+        self._count(hit=False)
+        row = Group.objects.filter(id=group_id).values_list(*GroupPolicy.FIELDS).first()
+        if row is None:
+            return None
+        self.cache.set(key, tuple(row), self.timeout)
+        return GroupPolicy(*row)
+
+    async def aget_policy(self, group_id):
+        key = self.policy_key(group_id)
+        policy = await self.cache.aget(key)
+        if policy is not None:
+            self._count(hit=True)
+            return GroupPolicy(*policy)
+
+        self._count(hit=False)
+        row = await Group.objects.filter(id=group_id).values_list(*GroupPolicy.FIELDS).afirst()
+        if row is None:
+            return None
+        await self.cache.aset(key, tuple(row), self.timeout)
+        return GroupPolicy(*row)
+
+    def get_role(self, group_id, user_id):
+        """
+        Return the role of a user in a group, or None if the user is not a member
+        """
+        key = self.role_key(group_id, user_id)
+        role = self.cache.get(key)
+        if role is not None:
+            self._count(hit=True)
+            return role or None
+
+        self._count(hit=False)
+        role = GroupMember.objects.filter(
+            group_id=group_id, user_id=user_id
+        ).values_list('user_role', flat=True).first()
+        self.cache.set(key, role or NOT_A_MEMBER, self.timeout)
+        return role
+
+    async def aget_role(self, group_id, user_id):
+        key = self.role_key(group_id, user_id)
+        role = await self.cache.aget(key)
+        if role is not None:
+            self._count(hit=True)
+            return role or None
+
+        self._count(hit=False)
+        role = await GroupMember.objects.filter(
+            group_id=group_id, user_id=user_id
+        ).values_list('user_role', flat=True).afirst()
+        await self.cache.aset(key, role or NOT_A_MEMBER, self.timeout)
+        return role
+
+    def invalidate_group(self, group_id):
+        self.cache.delete(self.policy_key(group_id))
+
+    def invalidate_role(self, group_id, user_id):
+        self.cache.delete(self.role_key(group_id, user_id))
+
+    def invalidate_roles(self, members):
+        """
+        Drop the roles of the (group_id, user_id) pairs in `members`
+        """
+        self.cache.delete_many([self.role_key(group_id, user_id) for group_id, user_id in members])
+
+    def stats(self):
+        """
+        Return the hit and miss counters of this process
+        """
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        total = hits + misses
+        return {
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': hits / total if total else 0.0,
+        }
+
+    def reset_stats(self):
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+
+
+group_access_cache = GroupAccessCache()
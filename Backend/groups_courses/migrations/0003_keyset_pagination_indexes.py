@@ -0,0 +1,31 @@
+# Generated by Django 5.1.5 on 2026-10-17 19:40
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('groups_courses', '0002_group_edit_permissions_joinrequest'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='group',
+            index=models.Index(fields=['created_at', 'id'], name='group_created_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='group',
+            index=models.Index(fields=['owner', 'created_at', 'id'], name='group_owner_created_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='groupmember',
+            index=models.Index(fields=['group', 'joined_at', 'id'], name='member_group_joined_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='joinrequest',
+            index=models.Index(fields=['group', 'created_at', 'id'], name='joinreq_group_created_id_idx'),
+        ),
+    ]
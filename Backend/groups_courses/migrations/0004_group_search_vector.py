@@ -0,0 +1,76 @@
+# Generated by Django 5.1.5 on 2026-10-17 19:42
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+POSTGRES_FORWARD = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    """
+    CREATE OR REPLACE FUNCTION groups_courses_group_search_vector_update() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector :=
+            setweight(to_tsvector('english', coalesce(NEW.name, '')), 'A') ||
+            setweight(to_tsvector('english', coalesce(NEW.description, '')), 'B');
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE TRIGGER groups_courses_group_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF name, description ON groups_courses_group
+    FOR EACH ROW EXECUTE FUNCTION groups_courses_group_search_vector_update()
+    """,
+    # backfill the existing rows, the trigger computes the vector
+    "UPDATE groups_courses_group SET name = name",
+    "CREATE INDEX group_search_vector_idx ON groups_courses_group USING gin (search_vector)",
+    "CREATE INDEX group_name_trgm_idx ON groups_courses_group USING gin (name gin_trgm_ops)",
+]
+
+POSTGRES_BACKWARD = [
+    "DROP INDEX IF EXISTS group_name_trgm_idx",
+    "DROP INDEX IF EXISTS group_search_vector_idx",
+    "DROP TRIGGER IF EXISTS groups_courses_group_search_vector_trigger ON groups_courses_group",
+    "DROP FUNCTION IF EXISTS groups_courses_group_search_vector_update()",
+]
+
+SQLITE_FORWARD = [
+    "CREATE VIRTUAL TABLE groups_courses_group_fts USING fts5(id UNINDEXED, name, description)",
+    """
+    INSERT INTO groups_courses_group_fts (id, name, description)
+    SELECT id, name, description FROM groups_courses_group
+    """,
+]
+
+SQLITE_BACKWARD = [
+    "DROP TABLE IF EXISTS groups_courses_group_fts",
+]
+
+
+def _run(statements):
+    def run(apps, schema_editor):
+        vendor = schema_editor.connection.vendor
+        for statement in statements.get(vendor, []):
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('groups_courses', '0003_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='group',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        # PostgreSQL: trigger maintained tsvector with GIN and trigram indexes
+        # SQLite: FTS5 table kept in sync by groups_courses.search.index_group
+        migrations.RunPython(
+            _run({'postgresql': POSTGRES_FORWARD, 'sqlite': SQLITE_FORWARD}),
+            _run({'postgresql': POSTGRES_BACKWARD, 'sqlite': SQLITE_BACKWARD}),
+        ),
+    ]
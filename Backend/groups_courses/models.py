@@ -1,10 +1,13 @@
+
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
+from Backend.deletion import BulkCascadeMixin
 from users.models import User
 import uuid
 
 # Create your models here.
 
-class Group(models.Model):
+class Group(BulkCascadeMixin, models.Model):
     # Join types for the group
     JOIN_CHOICES = [
         ('open', 'Open - anyone can join'),
@@ -50,6 +53,17 @@ class Group(models.Model):
         default='admins'
     ) 
 
+    # weighted tsvector of name and description, maintained by a database
+    # trigger on PostgreSQL and GIN indexed (see migration 0004)
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    class Meta:
+        indexes = [
+            # backs the keyset pagination of the group lists
+            models.Index(fields=['created_at', 'id'], name='group_created_id_idx'),
+            models.Index(fields=['owner', 'created_at', 'id'], name='group_owner_created_id_idx'),
+        ]
+
     def __str__(self):
         return self.name
 
@@ -68,6 +82,9 @@ class GroupMember(models.Model):
 
     class Meta:
         unique_together = ('group', 'user')
+        indexes = [
+            models.Index(fields=['group', 'joined_at', 'id'], name='member_group_joined_id_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user.username} in {self.group.name} as {self.user_role}"
@@ -81,12 +98,15 @@ class JoinRequest(models.Model):
 
     class Meta:
         unique_together = ('group', 'user')
+        indexes = [
+            models.Index(fields=['group', 'created_at', 'id'], name='joinreq_group_created_id_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user.username} requested to join {self.group.name}"
 
 
-class Course(models.Model):
+class Course(BulkCascadeMixin, models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     group = models.ForeignKey(Group, on_delete=models.CASCADE, related_name='courses')
     name = models.CharField(max_length=100)
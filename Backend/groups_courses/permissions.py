@@ -1,6 +1,151 @@
+from django.http import Http404
 from rest_framework.exceptions import PermissionDenied
 from rest_framework import status
-from .models import GroupMember
+from .cache import group_access_cache
+
+
+class GroupAccessContext:
+    """
+    The role of a user inside a single group.
+
+    The role is resolved with one indexed lookup on GroupMember(group, user)
+    instead of walking `group.members.all()`, so the cost of a permission
+    check does not depend on the size of the group. Roles are served from
+    the group access cache when possible.
+
+    Attributes:
+        group: the group object or its cached GroupPolicy
+        user: the user object
+        role: 'owner', one of GroupMember.ROLE_CHOICES, or None for non-members
+    """
+    # roles ordered from the highest to the lowest
+    ROLES = ['owner', 'admin', 'moderator', 'member']
+
+    POST_ROLES = {
+        'members': {'owner', 'admin', 'moderator', 'member'},
+        'moderators': {'owner', 'admin', 'moderator'},
+        'admins': {'owner', 'admin'},
+        'owner': {'owner'},
+    }
+
+    EDIT_MEMBERS_ROLES = {
+        'moderators': {'owner', 'admin', 'moderator'},
+        'admins': {'owner', 'admin'},
+        'owner': {'owner'},
+    }
+
+    def __init__(self, group, user, role=None):
+        self.group = group
+        self.user = user
+        self.role = role
+
+    @classmethod
+    def resolve(cls, user, group):
+        """
+        Build the context for `user` in `group` using at most one query
+        """
+        if not user.is_authenticated:
+            return cls(group, user)
+        if group.owner_id == user.pk:
+            return cls(group, user, 'owner')
+        return cls(group, user, group_access_cache.get_role(group.pk, user.pk))
+
+    @classmethod
+    async def aresolve(cls, user, group):
+        if not user.is_authenticated:
+            return cls(group, user)
+        if group.owner_id == user.pk:
+            return cls(group, user, 'owner')
+        return cls(group, user, await group_access_cache.aget_role(group.pk, user.pk))
+
+    @property
+    def is_owner(self):
+        return self.role == 'owner'
+
+    @property
+    def is_member(self):
+        return self.role is not None
+
+    @property
+    def is_admin(self):
+        return self.role in ('owner', 'admin')
+
+    def can_post(self):
+        return self.role in self.POST_ROLES.get(self.group.post_permission, set())
+
+    def can_edit_members(self):
+        return self.role in self.EDIT_MEMBERS_ROLES.get(self.group.edit_permissions, set())
+
+    def outranks(self, role):
+        """
+        check if the user has a strictly higher role than `role`
+        """
+        if not self.is_member:
+            return False
+        return self.ROLES.index(self.role) < self.ROLES.index(role)
+
+
+def get_group_policy_or_404(group_id):
+    """
+    Return the cached GroupPolicy of a group
+
+    Raises:
+        Http404: If the group does not exist
+    """
+    policy = group_access_cache.get_policy(group_id)
+    if policy is None:
+        raise Http404("Group not found")
+    return policy
+
+
+async def aget_group_policy_or_404(group_id):
+    policy = await group_access_cache.aget_policy(group_id)
+    if policy is None:
+        raise Http404("Group not found")
+    return policy
+
+
+def get_group_access(request, group):
+    """
+    Return the GroupAccessContext of the requesting user in `group`.
+
+    The context is stored on the request, so every permission helper called
+    while handling the same request shares a single membership lookup.
+
+    Args:
+        request: the request object
+        group: the group object
+
+    Returns:
+        GroupAccessContext: the access context of the requesting user
+    """
+    cache = _get_access_cache(request)
+    context = cache.get(group.pk)
+    if context is None or context.user != request.user:
+        context = GroupAccessContext.resolve(request.user, group)
+        cache[group.pk] = context
+    return context
+
+
+async def aget_group_access(request, group):
+    """
+    `get_group_access` for async views
+    """
+    cache = _get_access_cache(request)
+    context = cache.get(group.pk)
+    if context is None or context.user != request.user:
+        context = await GroupAccessContext.aresolve(request.user, group)
+        cache[group.pk] = context
+    return context
+
+
+def _get_access_cache(request):
+    cache = getattr(request, '_group_access', None)
+    if cache is None:
+        cache = {}
+        request._group_access = cache
+    return cache
+
 
 def ensure_group_owner(request, group, message="You are not the owner of this group"):
     """
@@ -13,38 +158,61 @@ def ensure_group_owner(request, group, message="You are not the owner of this gr
     Raises:
         PermissionDenied: If the user is not the owner of the group
     """
-    if group.owner != request.user:
+    if not get_group_access(request, group).is_owner:
         raise PermissionDenied(
             detail=message,
             code=status.HTTP_403_FORBIDDEN,
         )
-        
 
-def can_edit_members(user, group):
-    if group.owner == user:
-        return True
 
-    roles_needed = {
-        'admins': {'admin'},
-        'moderators': {'admin', 'moderator'}
-    }.get(group.edit_permissions, set())
+def is_group_member(request, group):
+    """
+    Check if the requesting user is the owner or a member of a group
+    """
+    return get_group_access(request, group).is_member
+
 
-    for member in group.members.all():
-        if member.user == user:
-            print(user, member, roles_needed)  
-            return member.user_role in roles_needed
+def ensure_group_member(request, group, message="User is not a member of this group"):
+    """
+    This function checks if the requesting user is the owner or a member of the group
+
+    Args:
+        request: the request object
+        group: the group object
+        message (str, optional): Custom error message
 
-    return False
+    Raises:
+        PermissionDenied: If the user is not a member of the group
+    """
+    if not is_group_member(request, group):
+        raise PermissionDenied(
+            detail=message,
+            code=status.HTTP_403_FORBIDDEN,
+        )
 
 
-    
-def ensure_can_edit_members(user, group, message="User doesn't have the permission needed"):
+async def aensure_group_member(request, group, message="User is not a member of this group"):
     """
-    This function checks if the given user has the necessary permissions to edit members
+    `ensure_group_member` for async views
+    """
+    if not (await aget_group_access(request, group)).is_member:
+        raise PermissionDenied(
+            detail=message,
+            code=status.HTTP_403_FORBIDDEN,
+        )
+
+
+def can_edit_members(request, group):
+    return get_group_access(request, group).can_edit_members()
+
+
+def ensure_can_edit_members(request, group, message="User doesn't have the permission needed"):
+    """
+    This function checks if the requesting user has the necessary permissions to edit members
     in the specified group. If not, it raises a PermissionDenied exception.
 
     Args:
-        user: The user object to check permissions for
+        request: The request object of the user to check permissions for
         group: The group object to check against
         message (str, optional): Custom error message. Defaults to "User doesn't have the permission needed"
 
@@ -52,50 +220,37 @@ def ensure_can_edit_members(user, group, message="User doesn't have the permissi
         PermissionDenied: If the user lacks required permissions to edit group members
 
     """
-    if not can_edit_members(user, group):
+    if not can_edit_members(request, group):
         raise PermissionDenied(
             detail=message,
             code=status.HTTP_403_FORBIDDEN,
         )
-    
-    
-def check_group_admin(user, group):
-    if group.owner == user:
-        return True
-    return GroupMember.objects.filter(user=user, group=group, role='admin').exists()
 
 
-def has_higher_role(user, member):
-    roles = ['admin', 'moderator', 'member']
-    return roles.index(user.user_role) < roles.index(member.user_role)
-    
+def check_group_admin(request, group):
+    return get_group_access(request, group).is_admin
+
+
+async def acheck_group_admin(request, group):
+    return (await aget_group_access(request, group)).is_admin
 
-def can_post(user, group):
+
+def has_higher_role(request, member):
+    """
+    Check if the requesting user has a higher role than `member` in the member's group
+    """
+    return get_group_access(request, member.group).outranks(member.user_role)
+
+
+def can_post(request, group):
     """
     Check if a user can post in a group based on post permissions
 
     Args:
-        user: The user attempting to post
+        request: The request of the user attempting to post
         group: The group where the post would be made
 
     Returns:
         bool: True if user can post, False otherwise
     """
-    if user == group.owner:
-        return True
-    if group.post_permission == 'owner':
-        return group.owner == user  
-
-    roles_needed = {
-        'members': {'member', 'moderator', 'admin'},
-        'moderators': {'moderator', 'admin'},
-        'admins': {'admin'}
-    }.get(group.post_permission, set())
-
-    member = group.members.filter(user=user).first()
-    if member:
-        return member.user_role in roles_needed
-
-    return False
-
-    
+    return get_group_access(request, group).can_post()
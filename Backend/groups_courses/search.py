@@ -0,0 +1,137 @@
+import re
+from functools import reduce
+from operator import or_
+
+from django.contrib.postgres.search import SearchQuery, SearchRank, TrigramSimilarity
+from django.db import connections
+from django.db.models import F, FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+from rest_framework.filters import BaseFilterBackend
+
+from .models import Group
+
+# name of the annotation holding the relevance of a search result
+RANK = 'search_rank'
+
+SEARCH_CONFIG = 'english'
+
+# minimum trigram similarity for a group name to match a misspelled query
+TRIGRAM_THRESHOLD = 0.3
+
+FTS_TABLE = 'groups_courses_group_fts'
+
+
+def _vendor(queryset):
+    return connections[queryset.db].vendor
+
+
+def search_groups(queryset, query, fields=('name', 'description')):
+    """
+    Filter `queryset` to the groups matching `query`, annotated with their
+    relevance under the `search_rank` name (higher is better).
+
+    - PostgreSQL: the `search_vector` tsvector column (GIN indexed) with
+      `websearch_to_tsquery`, plus trigram similarity on the name for typos
+    - SQLite: the FTS5 table kept in sync by `index_group`, ranked with bm25
+    - anything else: case insensitive containment over `fields`
+    """
+    vendor = _vendor(queryset)
+    if vendor == 'postgresql':
+        return _postgres_search(queryset, query)
+    if vendor == 'sqlite':
+        return _sqlite_search(queryset, query)
+    condition = reduce(or_, (Q(**{f'{field}__icontains': query}) for field in fields))
+    return queryset.filter(condition).annotate(**{RANK: Value(0.0, output_field=FloatField())})
+
+
+def _postgres_search(queryset, query):
+    search_query = SearchQuery(query, config=SEARCH_CONFIG, search_type='websearch')
+    return queryset.annotate(**{
+        RANK: SearchRank(F('search_vector'), search_query) + TrigramSimilarity('name', query),
+    }).filter(
+        Q(search_vector=search_query) | Q(name__trigram_similar=query)
+    )
+
+
+def _fts_query(query):
+    """
+    Turn free text into an FTS5 query matching every word as a prefix,
+    quoting the words so that FTS5 operators in the input are ignored
+    """
+    words = re.findall(r'\w+', query)
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def _sqlite_search(queryset, query):
+    fts_query = _fts_query(query)
+    if not fts_query:
+        return queryset.none()
+    table = Group._meta.db_table
+    rank = RawSQL(
+        f'SELECT -bm25({FTS_TABLE}) FROM {FTS_TABLE} '
+        f'WHERE {FTS_TABLE} MATCH %s AND {FTS_TABLE}.id = {table}.id',
+        (fts_query,),
+        output_field=FloatField(),
+    )
+    return queryset.annotate(**{RANK: rank}).filter(**{f'{RANK}__isnull': False})
+
+
+def _fts_id(group, connection):
+    return Group._meta.pk.get_db_prep_value(group.pk, connection)
+
+
+def index_group(group, using='default'):
+    """
+    Refresh the SQLite FTS5 row of a group. PostgreSQL keeps `search_vector`
+    up to date with a trigger, so nothing is done there.
+    """
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE id = %s', [_fts_id(group, connection)])
+        cursor.execute(
+            f'INSERT INTO {FTS_TABLE} (id, name, description) VALUES (%s, %s, %s)',
+            [_fts_id(group, connection), group.name, group.description],
+        )
+
+
+def index_groups(groups, using='default'):
+    """
+    Add the SQLite FTS5 rows of new groups, for groups inserted with
+    `bulk_create`, which sends no `post_save`
+    """
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f'INSERT INTO {FTS_TABLE} (id, name, description) VALUES (%s, %s, %s)',
+            [(_fts_id(group, connection), group.name, group.description) for group in groups],
+        )
+
+
+def unindex_group(group, using='default'):
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE id = %s', [_fts_id(group, connection)])
+
+
+class GroupSearchFilter(BaseFilterBackend):
+    """
+    Full text search over the group catalog using `?search=<text>`.
+    Matching groups are annotated with `search_rank`.
+    """
+    search_param = 'search'
+
+    def get_search_query(self, request):
+        return request.query_params.get(self.search_param, '').strip()
+
+    def filter_queryset(self, request, queryset, view):
+        query = self.get_search_query(request)
+        if not query:
+            return queryset
+        fields = getattr(view, 'search_fields', ('name', 'description'))
+        return search_groups(queryset, query, fields)
@@ -1,46 +1,64 @@
 from .models import Group, GroupMember, JoinRequest, Course
 from users.models import User
 from rest_framework import serializers
+from Backend.serializers import DynamicFieldsMixin, ValuesSerializer
 
-class GroupSerializer(serializers.ModelSerializer):
+class GroupSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Group
         fields = ['id', 'owner', 'name', 'description', 'join_type', 'post_permission', 'edit_permissions', 'created_at']
         read_only_fields = ['id', 'owner', 'created_at']
 
-class UserSerializer(serializers.ModelSerializer):
+class GroupDetailSerializer(GroupSerializer):
+    # annotated by GroupDetailAPIView.get_queryset, the related rows are never loaded
+    member_count = serializers.IntegerField(read_only=True)
+    course_count = serializers.IntegerField(read_only=True)
+
+    class Meta(GroupSerializer.Meta):
+        fields = GroupSerializer.Meta.fields + ['member_count', 'course_count']
+
+class GroupValuesSerializer(ValuesSerializer):
+    serializer_class = GroupSerializer
+
+class UserSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ['id', 'username']
 
-class GroupMemberSerializer(serializers.ModelSerializer):
+class GroupMemberSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     user = UserSerializer()
     class Meta:
         model = GroupMember
         fields = ['user', 'user_role', 'joined_at']
         read_only_fields = ['joined_at']
+        expandable_fields = ['user']
+
+class GroupMemberValuesSerializer(ValuesSerializer):
+    serializer_class = GroupMemberSerializer
 
 class CreateGroupMemberSerializer(serializers.ModelSerializer):
     class Meta:
         model = GroupMember
         fields = ['user']
 
-class GroupJoinRequestSerializer(serializers.ModelSerializer):
+class GroupJoinRequestSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     user = UserSerializer()
     class Meta:
         model = JoinRequest
         fields = ['user', 'created_at']
         read_only_fields = ['created_at']
+        expandable_fields = ['user']
 
 class CreateCourseSerializer(serializers.ModelSerializer):
     class Meta:
         model = Course
         fields = ['name', 'description']
 
-class CourseSerializer(serializers.ModelSerializer):
-    group = GroupSerializer()
+class CourseSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    group = GroupSerializer(read_only=True)
     class Meta:
         model = Course
         fields = ['id', 'group', 'name', 'description']
         read_only_fields = ['id', 'group']
+        expandable_fields = ['group']
 
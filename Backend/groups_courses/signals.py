@@ -0,0 +1,43 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from Backend.deletion import bulk_pre_delete
+from .cache import group_access_cache
+from .models import Group, GroupMember
+from .search import index_group, unindex_group
+
+
+# the cache entries are dropped once the change is committed, a reader
+# could otherwise cache the old value again before the commit
+
+@receiver([post_save, post_delete], sender=Group)
+def invalidate_group_policy(sender, instance, using, **kwargs):
+    transaction.on_commit(partial(group_access_cache.invalidate_group, instance.pk), using=using)
+
+
+@receiver(post_save, sender=Group)
+def update_group_search_index(sender, instance, using, **kwargs):
+    index_group(instance, using)
+
+
+@receiver(post_delete, sender=Group)
+def remove_group_search_index(sender, instance, using, **kwargs):
+    unindex_group(instance, using)
+
+
+@receiver([post_save, post_delete], sender=GroupMember)
+def invalidate_member_role(sender, instance, using, **kwargs):
+    transaction.on_commit(
+        partial(group_access_cache.invalidate_role, instance.group_id, instance.user_id), using=using,
+    )
+
+
+# the members deleted along with their group (see Backend.deletion) are read
+# with one query, instead of being loaded by the deletion collector
+@receiver(bulk_pre_delete, sender=GroupMember)
+def invalidate_deleted_member_roles(sender, queryset, **kwargs):
+    members = list(queryset.values_list('group_id', 'user_id'))
+    transaction.on_commit(partial(group_access_cache.invalidate_roles, members), using=queryset.db)
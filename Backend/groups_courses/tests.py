@@ -1,7 +1,15 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import AccessToken
 from .models import Group, GroupMember, JoinRequest, Course
+from .cache import group_access_cache
+from .permissions import GroupAccessContext
+from .views import CoursesAPIView, GroupDetailAPIView
+from .serializers import GroupMemberSerializer, GroupMemberValuesSerializer, GroupSerializer, GroupValuesSerializer
 from users.models import User
 
 class GroupTests(APITestCase):
@@ -29,7 +37,7 @@ class GroupTests(APITestCase):
         url = reverse('group_list')
         response = self.client.get(url, format='json')
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 1)
+        self.assertEqual(len(response.data['results']), 1)
 
     def test_retrieve_group(self):
         group = Group.objects.create(owner=self.user, **self.group_data)
@@ -38,6 +46,41 @@ class GroupTests(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data['name'], 'Study Group')
 
+    def test_retrieve_group_counts(self):
+        group = Group.objects.create(owner=self.user, **self.group_data)
+        GroupMember.objects.create(group=group, user=self.other_user)
+        Course.objects.bulk_create([Course(group=group, name=f'Course {i}') for i in range(3)])
+        self.client.force_authenticate(user=self.other_user)
+        url = reverse('group_detail', args=[group.id])
+        response = self.client.get(url, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['member_count'], 1)
+        self.assertEqual(response.data['course_count'], 3)
+
+    def test_retrieve_group_not_member(self):
+        group = Group.objects.create(owner=self.user, **self.group_data)
+        self.client.force_authenticate(user=self.other_user)
+        url = reverse('group_detail', args=[group.id])
+        response = self.client.get(url, format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_retrieve_group_single_query(self):
+        group = Group.objects.create(owner=self.user, **self.group_data)
+        url = reverse('group_detail', args=[group.id])
+        self.client.get(url, format='json')
+        with CaptureQueriesContext(connection) as small:
+            self.client.get(url, format='json')
+        users = User.objects.bulk_create([
+            User(email=f'member{i}@example.com', username=f'member{i}') for i in range(50)
+        ])
+        GroupMember.objects.bulk_create([GroupMember(group=group, user=user) for user in users])
+        Course.objects.bulk_create([Course(group=group, name=f'Course {i}') for i in range(20)])
+        with CaptureQueriesContext(connection) as large:
+            response = self.client.get(url, format='json')
+        self.assertEqual(response.data['member_count'], 50)
+        self.assertEqual(len(large), len(small))
+        self.assertEqual(sum('groups_courses_group' in query['sql'] for query in large), 1)
+
     def test_update_group_permission_denied(self):
         group = Group.objects.create(owner=self.user, **self.group_data)
         self.client.force_authenticate(user=self.other_user)
@@ -74,7 +117,22 @@ class GroupMemberTests(APITestCase):
         url = reverse('group_member_list', args=[self.group.id])
         response = self.client.get(url, format='json')
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 1)
+        self.assertEqual(len(response.data['results']), 1)
+
+    def test_list_nested_fields_and_expand(self):
+        GroupMember.objects.create(group=self.group, user=self.user, user_role='member')
+        url = reverse('group_member_list', args=[self.group.id])
+        response = self.client.get(url, {'fields': 'user.username,user_role'})
+        self.assertEqual(response.data['results'], [{'user': {'username': 'testuser'}, 'user_role': 'member'}])
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, {'expand': ''})
+        self.assertEqual(response.data['results'][0]['user'], self.user.id)
+        member_query = next(query['sql'] for query in queries if 'FROM "groups_courses_groupmember"' in query['sql'])
+        self.assertNotIn('JOIN', member_query)
+
+        self.assertEqual(self.client.get(url, {'expand': 'group'}).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.get(url, {'fields': 'user.email'}).status_code, status.HTTP_400_BAD_REQUEST)
 
     def test_retrieve_group_member(self):
         member = GroupMember.objects.create(group=self.group, user=self.user, user_role='member')
@@ -111,7 +169,7 @@ class JoinRequestTests(APITestCase):
         url = reverse('join_request_list', args=[self.group.id])
         response = self.client.get(url, format='json')
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 1)
+        self.assertEqual(len(response.data['results']), 1)
 
 class CourseTests(APITestCase):
     def setUp(self):
@@ -172,3 +230,298 @@ class CourseTests(APITestCase):
         url = reverse('course_detail', args=[course.id])
         response = self.client.delete(url)
         self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+class CourseFieldsTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='testuser@example.com', username='testuser', password='password')
+        self.client.force_authenticate(user=self.user)
+        self.group = Group.objects.create(owner=self.user, name="Study Group", join_type="open")
+        for i in range(3):
+            Course.objects.create(group=self.group, name=f"Course {i}", description="Description")
+        self.url = reverse('course_list', args=[self.group.id])
+
+    def _get(self, **params):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url, params)
+        return response, [query['sql'] for query in queries]
+
+    def test_default_output_is_nested(self):
+        response, _ = self._get()
+        self.assertEqual(response.data[0]['group']['name'], "Study Group")
+        self.assertEqual(set(response.data[0]), {'id', 'group', 'name', 'description'})
+
+    def test_sparse_fields_are_not_queried(self):
+        response, queries = self._get(fields='id,name')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([set(course) for course in response.data], [{'id', 'name'}] * 3)
+        course_query = next(sql for sql in queries if 'FROM "groups_courses_course"' in sql)
+        self.assertNotIn('description', course_query)
+        self.assertNotIn('JOIN', course_query)
+
+    def test_nested_fields_and_expand(self):
+        response, _ = self._get(fields='name,group.name')
+        self.assertEqual(response.data[0]['group'], {'name': "Study Group"})
+        response, _ = self._get(expand='')
+        self.assertEqual(response.data[0]['group'], self.group.id)
+
+    def test_unknown_field(self):
+        response, _ = self._get(fields='id,secret')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_compact_sends_the_group_once(self):
+        response, queries = self._get(compact='true')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([course['group'] for course in response.data['results']], [self.group.id] * 3)
+        self.assertEqual(len(response.data['included']['group']), 1)
+        self.assertEqual(response.data['included']['group'][0]['name'], "Study Group")
+        self.assertFalse(any('JOIN' in sql for sql in queries if 'FROM "groups_courses_course"' in sql))
+
+
+class GroupAccessContextTests(APITestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(email='owner@example.com', username='owner', password='password')
+        self.user = User.objects.create_user(email='testuser@example.com', username='testuser', password='password')
+        self.group = Group.objects.create(owner=self.owner, name="Study Group", join_type="open", post_permission="members", edit_permissions="admins")
+        GroupMember.objects.create(group=self.group, user=self.user, user_role='admin')
+
+    def _add_members(self, count):
+        users = User.objects.bulk_create(
+            User(email=f'member{i}@example.com', username=f'member{i}') for i in range(count)
+        )
+        GroupMember.objects.bulk_create(GroupMember(group=self.group, user=user) for user in users)
+
+    def _courses_queries(self):
+        cache.clear()
+        self.client.force_authenticate(user=self.user)
+        url = reverse('course_list', args=[self.group.id])
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return len(queries)
+
+    def test_resolve_roles(self):
+        self.assertEqual(GroupAccessContext.resolve(self.owner, self.group).role, 'owner')
+        self.assertEqual(GroupAccessContext.resolve(self.user, self.group).role, 'admin')
+        outsider = User.objects.create_user(email='outsider@example.com', username='outsider', password='password')
+        context = GroupAccessContext.resolve(outsider, self.group)
+        self.assertFalse(context.is_member)
+        self.assertFalse(context.can_post())
+
+    def test_member_check_is_constant(self):
+        small = self._courses_queries()
+        self._add_members(200)
+        self.assertEqual(self._courses_queries(), small)
+
+
+class GroupAccessCacheTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        group_access_cache.reset_stats()
+        self.owner = User.objects.create_user(email='owner@example.com', username='owner', password='password')
+        self.user = User.objects.create_user(email='testuser@example.com', username='testuser', password='password')
+        self.group = Group.objects.create(owner=self.owner, name="Study Group", join_type="open", post_permission="admins", edit_permissions="admins")
+
+    def test_role_is_cached(self):
+        GroupMember.objects.create(group=self.group, user=self.user, user_role='member')
+        self.assertEqual(group_access_cache.get_role(self.group.id, self.user.id), 'member')
+        with self.assertNumQueries(0):
+            self.assertEqual(group_access_cache.get_role(self.group.id, self.user.id), 'member')
+        self.assertEqual(group_access_cache.stats()['hits'], 1)
+        self.assertEqual(group_access_cache.stats()['misses'], 1)
+
+    def test_non_member_is_cached(self):
+        self.assertIsNone(group_access_cache.get_role(self.group.id, self.user.id))
+        with self.assertNumQueries(0):
+            self.assertIsNone(group_access_cache.get_role(self.group.id, self.user.id))
+
+    def test_role_invalidated_on_save_and_delete(self):
+        self.assertIsNone(group_access_cache.get_role(self.group.id, self.user.id))
+        with self.captureOnCommitCallbacks(execute=True):
+            member = GroupMember.objects.create(group=self.group, user=self.user, user_role='member')
+        self.assertEqual(group_access_cache.get_role(self.group.id, self.user.id), 'member')
+        member.user_role = 'admin'
+        with self.captureOnCommitCallbacks(execute=True):
+            member.save()
+        self.assertEqual(group_access_cache.get_role(self.group.id, self.user.id), 'admin')
+        with self.captureOnCommitCallbacks(execute=True):
+            member.delete()
+        self.assertIsNone(group_access_cache.get_role(self.group.id, self.user.id))
+
+    def test_invalidated_after_commit(self):
+        # a read before the commit caches the old role, which the commit drops
+        with self.captureOnCommitCallbacks(execute=True):
+            GroupMember.objects.create(group=self.group, user=self.user, user_role='member')
+            cache.set(group_access_cache.role_key(self.group.id, self.user.id), '')
+        self.assertEqual(group_access_cache.get_role(self.group.id, self.user.id), 'member')
+
+    def test_group_delete_reads_members_once(self):
+        users = User.objects.bulk_create([User(email=f'user{i}@example.com', username=f'user{i}') for i in range(150)])
+        GroupMember.objects.bulk_create([GroupMember(group=self.group, user=user) for user in users])
+        self.assertEqual(group_access_cache.get_role(self.group.id, users[0].id), 'member')
+        with CaptureQueriesContext(connection) as queries, self.captureOnCommitCallbacks(execute=True):
+            self.group.delete()
+        self.assertFalse(GroupMember.objects.exists())
+        # the bulk receiver reads the members once, the collector of the group then finds none left
+        self.assertEqual(sum(query['sql'].startswith('SELECT "groups_courses_groupmember"') for query in queries), 2)
+        self.assertIsNone(cache.get(group_access_cache.role_key(self.group.id, users[0].id)))
+
+    def test_role_invalidated_on_queryset_and_user_delete(self):
+        other = User.objects.create_user(email='other@example.com', username='other', password='password')
+        GroupMember.objects.create(group=self.group, user=self.user, user_role='member')
+        GroupMember.objects.create(group=self.group, user=other, user_role='member')
+        self.assertEqual(group_access_cache.get_role(self.group.id, self.user.id), 'member')
+        self.assertEqual(group_access_cache.get_role(self.group.id, other.id), 'member')
+        with self.captureOnCommitCallbacks(execute=True):
+            GroupMember.objects.filter(user=self.user).delete()
+        self.assertIsNone(group_access_cache.get_role(self.group.id, self.user.id))
+        with self.captureOnCommitCallbacks(execute=True):
+            other.delete()
+        self.assertIsNone(group_access_cache.get_role(self.group.id, other.id))
+
+    def test_policy_invalidated_on_save(self):
+        self.assertEqual(group_access_cache.get_policy(self.group.id).post_permission, 'admins')
+        self.group.post_permission = 'members'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.group.save()
+        self.assertEqual(group_access_cache.get_policy(self.group.id).post_permission, 'members')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.group.delete()
+        self.assertIsNone(group_access_cache.get_policy(self.group.id))
+
+
+class KeysetPaginationTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='testuser@example.com', username='testuser', password='password')
+        self.client.force_authenticate(user=self.user)
+        Group.objects.bulk_create(
+            Group(owner=self.user, name=f"Group {i}", join_type="open") for i in range(7)
+        )
+
+    def test_walk_all_pages(self):
+        url = reverse('group_list') + '?page_size=3'
+        names = []
+        pages = 0
+        while url:
+            response = self.client.get(url, format='json')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            names.extend(group['name'] for group in response.data['results'])
+            url = response.data['next']
+            pages += 1
+        self.assertEqual(pages, 3)
+        self.assertEqual(sorted(names), sorted(f"Group {i}" for i in range(7)))
+        expected = list(Group.objects.order_by('-created_at', '-id').values_list('name', flat=True))
+        self.assertEqual(names, expected)
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse('group_list') + '?cursor=not-a-cursor', format='json')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class GroupSearchTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='testuser@example.com', username='testuser', password='password')
+        Group.objects.create(owner=self.user, name="Linear Algebra", description="Matrices and vector spaces", join_type="open")
+        Group.objects.create(owner=self.user, name="Organic Chemistry", description="Reactions and mechanisms", join_type="request")
+        Group.objects.create(owner=self.user, name="Algebra Club", description="Weekly problem sessions", join_type="open")
+        Group.objects.create(owner=self.user, name="Secret Algebra", description="", join_type="invite")
+
+    def _search(self, query, **params):
+        response = self.client.get(reverse('group_list'), {'search': query, **params}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [group['name'] for group in response.data['results']]
+
+    def test_search_matches_name_and_description(self):
+        self.assertEqual(sorted(self._search('algebra')), ['Algebra Club', 'Linear Algebra'])
+        self.assertEqual(self._search('mechanisms'), ['Organic Chemistry'])
+
+    def test_search_prefix(self):
+        self.assertEqual(self._search('chem'), ['Organic Chemistry'])
+
+    def test_search_follows_updates(self):
+        group = Group.objects.get(name="Organic Chemistry")
+        group.name = "Physical Chemistry"
+        group.save()
+        self.assertEqual(self._search('physical'), ['Physical Chemistry'])
+        group.delete()
+        self.assertEqual(self._search('chemistry'), [])
+
+    def test_search_is_paginated(self):
+        names = self._search('algebra', page_size=1)
+        self.assertEqual(len(names), 1)
+        response = self.client.get(reverse('group_list'), {'search': 'algebra', 'page_size': 1}, format='json')
+        next_page = self.client.get(response.data['next'], format='json')
+        self.assertEqual(len(next_page.data['results']), 1)
+        self.assertNotEqual(next_page.data['results'][0]['name'], response.data['results'][0]['name'])
+        self.assertIsNone(next_page.data['next'])
+
+    def test_filter_join_type(self):
+        response = self.client.get(reverse('group_list'), {'join_type': 'request'}, format='json')
+        self.assertEqual([group['name'] for group in response.data['results']], ['Organic Chemistry'])
+
+
+class ValuesSerializerTests(APITestCase):
+    def test_same_output_as_model_serializers(self):
+        user = User.objects.create_user(email='testuser@example.com', username='testuser', password='password')
+        other_user = User.objects.create_user(email='otheruser@example.com', username='otheruser', password='password')
+        group = Group.objects.create(owner=user, name="Study Group", description="Algorithms", join_type="open")
+        GroupMember.objects.create(group=group, user=other_user, user_role='moderator')
+
+        groups = Group.objects.order_by('id')
+        self.assertEqual(GroupValuesSerializer(groups, many=True).data, GroupSerializer(groups, many=True).data)
+        members = GroupMember.objects.order_by('id')
+        self.assertEqual(GroupMemberValuesSerializer(members, many=True).data, GroupMemberSerializer(members, many=True).data)
+
+
+class AsyncViewTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email='testuser@example.com', username='testuser', password='password')
+        self.member = User.objects.create_user(email='member@example.com', username='member', password='password')
+        self.outsider = User.objects.create_user(email='outsider@example.com', username='outsider', password='password')
+        self.group = Group.objects.create(owner=self.user, name='Study Group', join_type='open')
+        GroupMember.objects.create(group=self.group, user=self.member)
+        Course.objects.create(group=self.group, name='Algorithms')
+
+    def _headers(self, user):
+        return {'Authorization': f'Bearer {AccessToken.for_user(user)}'}
+
+    def test_views_are_async(self):
+        self.assertTrue(GroupDetailAPIView.view_is_async)
+        self.assertTrue(CoursesAPIView.view_is_async)
+
+    async def test_group_detail_under_asgi(self):
+        url = reverse('group_detail', args=[self.group.id])
+        response = await self.async_client.get(url, headers=self._headers(self.member))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['name'], 'Study Group')
+
+        response = await self.async_client.get(url, headers=self._headers(self.outsider))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    async def test_courses_under_asgi(self):
+        url = reverse('course_list', args=[self.group.id])
+        response = await self.async_client.get(url, headers=self._headers(self.member))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([course['name'] for course in response.json()], ['Algorithms'])
+
+        response = await self.async_client.get(url, {'compact': 'true'}, headers=self._headers(self.member))
+        self.assertEqual(response.json()['included']['group'][0]['name'], 'Study Group')
+
+    def test_owner_updates_and_deletes_group(self):
+        self.client.force_authenticate(user=self.user)
+        url = reverse('group_detail', args=[self.group.id])
+        response = self.client.patch(url, {'description': 'Weekly sessions'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.description, 'Weekly sessions')
+
+        response = self.client.delete(url)
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(Group.objects.exists())
+
+    def test_member_cannot_update_group(self):
+        self.client.force_authenticate(user=self.member)
+        url = reverse('group_detail', args=[self.group.id])
+        response = self.client.patch(url, {'description': 'Weekly sessions'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
@@ -1,5 +1,9 @@
+from asgiref.sync import sync_to_async
 from django.shortcuts import get_object_or_404
 from django.db import IntegrityError
+from django.db.models import Count, Exists, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.http import Http404
 
 from rest_framework import generics, status
 from rest_framework.exceptions import NotFound, PermissionDenied
@@ -8,8 +12,16 @@ from rest_framework.views import APIView
 from rest_framework.serializers import ValidationError 
 from rest_framework.response import Response
 
+from Backend.async_views import AsyncAPIView, AsyncViewMixin
+from Backend.pagination import KeysetPagination
+from Backend.serializers import DynamicFieldsViewMixin, ValuesListMixin, wants_compact
+from Backend.streaming import StreamingListMixin
 from . import models, serializers
-from .permissions import can_edit_members, has_higher_role, ensure_can_edit_members, ensure_group_owner
+from .search import GroupSearchFilter, RANK
+from .permissions import (
+    acheck_group_admin, aensure_group_member, aget_group_policy_or_404, can_edit_members,
+    has_higher_role, ensure_can_edit_members, ensure_group_owner, get_group_policy_or_404,
+)
 
 
 # Create your views here.
@@ -29,23 +41,38 @@ class CreateGroupAPIView(generics.CreateAPIView):
         serializer.save(owner=self.request.user)
 
 
-class GroupListAPIView(generics.ListAPIView):
+class GroupListAPIView(ValuesListMixin, generics.ListAPIView):
     """
     This view is used to list all groups
 
-    Endpoint: `/groups/`
+    Endpoint: `/groups/list/`
     Methods: GET
     Permissions: AllowAny
+    Query params:
+        - search: full text search over name and description, results are ranked by relevance
+        - join_type: only list groups with this join type (`open` or `request`)
     """
-    serializer_class = serializers.GroupSerializer
-    queryset = models.Group.objects.filter(join_type__in=['open', 'request']).all()
+    serializer_class = serializers.GroupValuesSerializer
     permission_classes = [AllowAny,]
+    pagination_class = KeysetPagination
+    filter_backends = [GroupSearchFilter,]
     search_fields = ['name', 'description']
-    filterset_fields = ['join_type']
-    
-    
+    join_types = ['open', 'request']
+
+    def get_queryset(self):
+        join_type = self.request.query_params.get('join_type')
+        join_types = [join_type] if join_type in self.join_types else self.join_types
+        return models.Group.objects.filter(join_type__in=join_types)
+
+    @property
+    def keyset_ordering(self):
+        if GroupSearchFilter().get_search_query(self.request):
+            return ('-' + RANK, '-id')
+        return KeysetPagination.ordering
 
-class OwnedGroupListAPIView(generics.ListAPIView):
+
+
+class OwnedGroupListAPIView(ValuesListMixin, generics.ListAPIView):
     """
     This view is used to list all groups owned by the user
 
@@ -53,73 +80,109 @@ class OwnedGroupListAPIView(generics.ListAPIView):
     Methods: GET
     Permissions: IsAuthenticated
     """
-    serializer_class = serializers.GroupSerializer
+    serializer_class = serializers.GroupValuesSerializer
     permission_classes = [IsAuthenticated,]
+    pagination_class = KeysetPagination
 
     def get_queryset(self):
         return models.Group.objects.filter(owner=self.request.user)
 
 
-class GroupDetailAPIView(generics.RetrieveUpdateDestroyAPIView):
+def _count_per_group(model):
     """
-    This view is used to view, update, or delete a specific group 
-    
+    Correlated subquery counting the rows of `model` in the outer group,
+    unlike joined Count()s two of them do not multiply each other
+    """
+    counts = model.objects.filter(group=OuterRef('pk')).order_by().values('group').annotate(count=Count('pk'))
+    return Coalesce(Subquery(counts.values('count'), output_field=IntegerField()), 0)
+
+
+class GroupDetailAPIView(AsyncViewMixin, generics.GenericAPIView):
+    """
+    This view is used to view, update, or delete a specific group, served
+    with the async ORM
+
     Endpoint: `/groups/<group_id>/`
-    Methods: GET, PUT, DELETE
+    Methods: GET, PUT, PATCH, DELETE
     Permissions: IsAuthenticated (user must be a member of the group)
         - GET: Open to all group members
-        - PUT, DELETE: group owner only
+        - PUT, PATCH, DELETE: group owner only
     """
-    serializer_class = serializers.GroupSerializer
+    serializer_class = serializers.GroupDetailSerializer
     queryset = models.Group.objects.all()
     lookup_url_kwarg = 'group_id'
     lookup_field = 'id'
 
     def get_queryset(self):
         """
-        This method is used to override the queryset for the view
-        to improve performance by reducing the number of queries
-        by prefetching related fields
+        The group annotated with `is_member`, an EXISTS on the
+        GroupMember(group, user) index, and its `member_count` and
+        `course_count`, so one query answers the request whatever the size
+        of the group
         """
         group_id = self.kwargs.get(self.lookup_url_kwarg)
-        return models.Group.objects.select_related('owner').prefetch_related('members').filter(id=group_id)
+        return models.Group.objects.filter(id=group_id).annotate(
+            is_member=Exists(models.GroupMember.objects.filter(group=OuterRef('pk'), user=self.request.user.pk)),
+            member_count=_count_per_group(models.GroupMember),
+            course_count=_count_per_group(models.Course),
+        )
 
-    def get_object(self):
-        group = self.get_queryset().first()
+    async def aget_object(self):
+        """
+        Fetch the group once per request and check that the user is its
+        owner or a member
+        """
+        group = getattr(self, '_group', None)
+        if group is not None:
+            return group
+        group = await self.get_queryset().afirst()
         if group is None:
             raise NotFound(
                 detail="Group not found",
                 code=status.HTTP_404_NOT_FOUND,
             )
-        # Check if user is a member of the group
-        if group.owner == self.request.user or any(member.user == self.request.user for member in group.members.all()):
-            return group
-        else:
+        if group.owner_id != self.request.user.pk and not group.is_member:
             raise PermissionDenied(
                 detail="You are not a member of this group",
                 code=status.HTTP_403_FORBIDDEN,
             )
-    
-    def perform_update(self, serializer):
-        group = self.get_object()
-        if group.owner != self.request.user:
+        self._group = group
+        return group
+
+    async def get(self, request, *args, **kwargs):
+        group = await self.aget_object()
+        return Response(self.get_serializer(group).data)
+
+    async def put(self, request, *args, **kwargs):
+        return await self.aupdate(request, partial=False)
+
+    async def patch(self, request, *args, **kwargs):
+        return await self.aupdate(request, partial=True)
+
+    async def aupdate(self, request, partial):
+        group = await self.aget_object()
+        if group.owner_id != request.user.pk:
             raise PermissionDenied(
                 detail="User doesn't have permission to update this group",
                 code=status.HTTP_403_FORBIDDEN,
             )
-        serializer.save()
+        serializer = self.get_serializer(group, data=request.data, partial=partial)
+        await sync_to_async(serializer.is_valid)(raise_exception=True)
+        await sync_to_async(serializer.save)()
+        return Response(serializer.data)
 
-    def perform_destroy(self, instance):
-        group = self.get_object()
-        if group.owner != self.request.user:
+    async def delete(self, request, *args, **kwargs):
+        group = await self.aget_object()
+        if group.owner_id != request.user.pk:
             raise PermissionDenied(
                 detail="User doesn't have permission to delete this group",
                 code=status.HTTP_403_FORBIDDEN,
             )
-        instance.delete()
+        await group.adelete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
 
 
-class GroupMemberListAPIView(generics.ListAPIView):
+class GroupMemberListAPIView(ValuesListMixin, StreamingListMixin, generics.ListAPIView):
     """
     
     Endpoint: `/groups/<group_id>/members/`
@@ -127,19 +190,18 @@ class GroupMemberListAPIView(generics.ListAPIView):
     Permissions: IsAuthenticated (user must be a member of the group)
         - GET: Open to all members
     """
-    serializer_class = serializers.GroupMemberSerializer
+    serializer_class = serializers.GroupMemberValuesSerializer
     queryset = models.GroupMember.objects.all()
     lookup_url_kwarg = 'group_id'
     lookup_field = 'group_id'
+    pagination_class = KeysetPagination
+    keyset_ordering = ('-joined_at', '-id')
 
     def get_queryset(self):
         group_id = self.kwargs.get(self.lookup_url_kwarg)
-        group = get_object_or_404(
-            models.Group.objects.prefetch_related('members'),
-            id=group_id
-        )
-        ensure_can_edit_members(self.request.user, group, message="User doesn't have permission to view group members")
-        return group.members.all()
+        group = get_group_policy_or_404(group_id)
+        ensure_can_edit_members(self.request, group, message="User doesn't have permission to view group members")
+        return models.GroupMember.objects.filter(group_id=group.id)
 
             
 class CreateGroupMemberAPIView(generics.CreateAPIView):
@@ -167,18 +229,16 @@ class CreateGroupMemberAPIView(generics.CreateAPIView):
 
     def perform_create(self, serializer):
         user = self.request.user
-        group = get_object_or_404(
-            models.Group.objects.prefetch_related("members"),
-            id=self.kwargs.get('group_id')
-        )
-        
-        if serializer.validated_data.get('user') == group.owner:
+        group = get_object_or_404(models.Group, id=self.kwargs.get('group_id'))
+
+        new_member = serializer.validated_data.get('user')
+        if new_member is not None and new_member.pk == group.owner_id:
             raise ValidationError(
                 detail="Owner can't be a member of his group",
                 code=status.HTTP_400_BAD_REQUEST,
             )
 
-        if can_edit_members(user, group):
+        if can_edit_members(self.request, group):
             self._try_save_membership(serializer, group)
             return
                         
@@ -219,6 +279,10 @@ class GroupMemberSelfDetailAPIView(generics.RetrieveDestroyAPIView):
             group=self.kwargs.get(self.lookup_url_kwarg), user=self.request.user
         )
 
+    def get_object(self):
+        # the URL holds the group, the user's membership is the only row
+        return get_object_or_404(self.get_queryset())
+
 
 class GroupMembershipsDetailAPIView(generics.RetrieveUpdateDestroyAPIView):
     """
@@ -246,7 +310,7 @@ class GroupMembershipsDetailAPIView(generics.RetrieveUpdateDestroyAPIView):
         only users that have permission to edit the group members can view group members
         """
         membership = get_object_or_404(self.get_queryset())
-        ensure_can_edit_members(self.request.user, membership.group, message="User doesn't have permission to view group members")
+        ensure_can_edit_members(self.request, membership.group, message="User doesn't have permission to view group members")
         return membership
 
     def update(self, request, *args, **kwargs):
@@ -254,7 +318,7 @@ class GroupMembershipsDetailAPIView(generics.RetrieveUpdateDestroyAPIView):
         user can only update group member roles if they are the group owner
         """
         membership = self.get_object()
-        ensure_group_owner(self.request.user, membership.group, message="User doesn't have permission to update group members")
+        ensure_group_owner(self.request, membership.group, message="User doesn't have permission to update group members")
         
         serializer = self.get_serializer(membership, data=request.data, partial=True)
         serializer.is_valid(raise_exception=True)
@@ -265,7 +329,7 @@ class GroupMembershipsDetailAPIView(generics.RetrieveUpdateDestroyAPIView):
         """
         user can only delete group member if they have higher role
         """
-        if has_higher_role(self.request.user, instance.user):
+        if has_higher_role(self.request, instance):
             instance.delete()
         else:
             raise PermissionDenied(
@@ -274,7 +338,7 @@ class GroupMembershipsDetailAPIView(generics.RetrieveUpdateDestroyAPIView):
             )
 
 
-class GroupJoinRequestListAPIView(generics.ListAPIView):
+class GroupJoinRequestListAPIView(DynamicFieldsViewMixin, generics.ListAPIView):
     """
     This view is used to list all join requests for a group
     
@@ -284,14 +348,12 @@ class GroupJoinRequestListAPIView(generics.ListAPIView):
     """
     serializer_class = serializers.GroupJoinRequestSerializer
     lookup_url_kwarg = 'group_id'
+    pagination_class = KeysetPagination
 
     def get_queryset(self):
-        group = get_object_or_404(
-            models.Group.objects.prefetch_related('join_requests', 'members'),
-            id=self.kwargs.get('group_id')
-        )
-        ensure_can_edit_members(self.request.user, group, message="User doesn't have permission to view join requests")
-        return group.join_requests.all()
+        group = get_group_policy_or_404(self.kwargs.get('group_id'))
+        ensure_can_edit_members(self.request, group, message="User doesn't have permission to view join requests")
+        return models.JoinRequest.objects.filter(group_id=group.id)
 
 
 class JoinRequestResponseAPIView(APIView):
@@ -309,7 +371,7 @@ class JoinRequestResponseAPIView(APIView):
         join_request = get_object_or_404(models.JoinRequest.objects.select_related('group'), id=join_request_id)
         group = join_request.group
 
-        ensure_can_edit_members(request.user, group, message="User doesn't have permission to respond to join requests")
+        ensure_can_edit_members(request, group, message="User doesn't have permission to respond to join requests")
 
         if request.data.get('action') == 'accept':
             try:
@@ -342,57 +404,45 @@ class JoinRequestResponseAPIView(APIView):
             )
 
 
-class CoursesAPIView(APIView):
+class CoursesAPIView(AsyncAPIView):
     """
-    This view is used to list and create courses for a group
+    This view is used to list and create courses for a group, served with
+    the async ORM
 
     Endpoint: `/groups/<group_id>/courses/`
     Methods: GET, POST
     Permissions: IsAuthenticated
+    Query params (GET):
+        - fields / expand: sparse fieldsets, e.g. `fields=id,name` or `expand=`
+        - compact: send the group once in `included` instead of in every course
     """
     permission_classes = [IsAuthenticated]
 
-    def get(self, request, group_id):
-        group = get_object_or_404(
-            models.Group.objects.prefetch_related('members', 'courses'),
-            id=group_id
-        )
+    async def get(self, request, group_id):
+        group = await aget_group_policy_or_404(group_id)
+        await aensure_group_member(request, group, message="User is not a member of this group")
 
-        # using any() to check if user is a member of the group without needing to hit the database since members are prefetched
-        if group.owner == request.user or any(member.user == request.user for member in group.members.all()):
-            courses = group.courses.all()
-            serializer = serializers.CourseSerializer(courses, many=True)
-            return Response(serializer.data)
-        else:
-            raise PermissionDenied(
-                detail="User is not a member of this group",
-                code=status.HTTP_403_FORBIDDEN,
-            )
-        
-    def _check_group_admin(self, group, user):
-        for member in group.members.all():
-            if member.user == user:
-                if member.user_role == 'admin':
-                    return True
-                else:
-                    return False
-        return False
-        
-    def post(self, request, group_id):
-        group = get_object_or_404(
-            models.Group.objects.prefetch_related('members'),
-            id=group_id
-        )
-        if not (group.owner == request.user or self._check_group_admin(group, request.user)):
+        courses = models.Course.objects.filter(group_id=group.id)
+        serializer = serializers.CourseSerializer(context={'request': request})
+        if wants_compact(request):
+            return Response(await sync_to_async(serializer.compact)(courses))
+        courses = [course async for course in serializer.prepare_queryset(courses)]
+        return Response(serializers.CourseSerializer(courses, many=True, context={'request': request}).data)
+
+    async def post(self, request, group_id):
+        group = await models.Group.objects.filter(id=group_id).afirst()
+        if group is None:
+            raise Http404("No Group matches the given query.")
+        if not await acheck_group_admin(request, group):
             raise PermissionDenied(
                 detail="User doesn't have permission to create courses in this group",
                 code=status.HTTP_403_FORBIDDEN,
             )
             
         serializer = serializers.CreateCourseSerializer(data=request.data)
-        serializer.is_valid(raise_exception=True)
+        await sync_to_async(serializer.is_valid)(raise_exception=True)
         try:
-            serializer.save(group=group)
+            await sync_to_async(serializer.save)(group=group)
         except IntegrityError:  
             raise ValidationError(
                 detail="Course with this name already exists",
@@ -417,14 +467,9 @@ class CourseDetailAPIView(generics.RetrieveUpdateDestroyAPIView):
 
     def get_object(self):
         course = get_object_or_404(
-            models.Course.objects.select_related('group__owner'),
+            models.Course.objects.select_related('group'),
             id=self.kwargs.get('course_id')
         )
-        if course.group.owner == self.request.user:
-            return course
-        
-        raise PermissionDenied(
-            detail="Only the group owner can edit this course",
-            code=status.HTTP_403_FORBIDDEN,
-        )
+        ensure_group_owner(self.request, course.group, message="Only the group owner can edit this course")
+        return course
 
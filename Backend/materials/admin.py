@@ -8,4 +8,5 @@ admin.site.register(models.Material)
 admin.site.register(models.MaterialComment)
 admin.site.register(models.Label)
 admin.site.register(models.MaterialLabel)
+admin.site.register(models.Blob)
 
@@ -0,0 +1,187 @@
+"""
+Serving material files with HTTP caching and Range support.
+
+The transfer itself is handed to the front server when
+`MATERIAL_DOWNLOAD_ACCEL` is set:
+    - 'x-accel-redirect' (nginx): the internal location
+      `MATERIAL_ACCEL_REDIRECT_PREFIX` + file name is sent back
+    - 'x-sendfile' (apache, lighttpd): the absolute file path is sent back
+otherwise the file is streamed by Django.
+"""
+import mimetypes
+import os
+import re
+from datetime import datetime, timezone
+from urllib.parse import quote
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import content_disposition_header, http_date, parse_http_date_safe, quote_etag
+
+# size of the blocks read from the file when streaming a range
+STREAM_BLOCK_SIZE = 64 * 1024
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def file_etag(material, stat):
+    """
+    Content addressed files are identified by their hash, other files by their size and mtime
+    """
+    if material.blob_id:
+        return quote_etag(material.blob_id)
+    return quote_etag(f'{stat.st_size:x}-{int(stat.st_mtime):x}')
+
+
+def parse_range(header, size):
+    """
+    Parse a single `bytes=` range
+
+    Returns:
+        (start, end) inclusive, None if there is no usable range (the whole
+        file is sent), or False if the range can not be satisfied
+    """
+    match = RANGE_RE.match(header.strip()) if header else None
+    if match is None:
+        # missing, malformed or multiple ranges, RFC 9110 allows ignoring them
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # suffix range, the last N bytes
+        length = int(last)
+        if length == 0:
+            return False
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+class RangeFileIterator:
+    """
+    Iterate over `length` bytes of `file` from `start`, closing it at the end
+    """
+    def __init__(self, file, start, length):
+        self.file = file
+        self.start = start
+        self.length = length
+
+    def __iter__(self):
+        try:
+            self.file.seek(self.start)
+            remaining = self.length
+            while remaining > 0:
+                block = self.file.read(min(STREAM_BLOCK_SIZE, remaining))
+                if not block:
+                    break
+                remaining -= len(block)
+                yield block
+        finally:
+            self.file.close()
+
+    def close(self):
+        self.file.close()
+
+
+async def aiter_blocks(blocks):
+    """
+    Iterate `blocks` asynchronously, each block being read in a worker
+    thread. ASGI servers given a sync iterator would load it whole first.
+    """
+    blocks = iter(blocks)
+    read = sync_to_async(next, thread_sensitive=False)
+    try:
+        while (block := await read(blocks, None)) is not None:
+            yield block
+    finally:
+        blocks.close()
+
+
+def _range_requested(request, etag, last_modified):
+    """
+    Honour `If-Range`, a range is only served for an unchanged file
+    """
+    if_range = request.headers.get('If-Range')
+    if not if_range:
+        return True
+    if if_range.startswith(('"', 'W/')):
+        return if_range == etag
+    since = parse_http_date_safe(if_range)
+    return since is not None and int(last_modified.timestamp()) <= since
+
+
+def serve_material_file(request, material):
+    """
+    Build the response sending the file of a material, with `ETag`,
+    `Last-Modified`, conditional requests and single byte ranges
+    """
+    path = material.file.path
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        raise Http404("File not found")
+    size = stat.st_size
+    etag = file_etag(material, stat)
+    last_modified = datetime.fromtimestamp(int(stat.st_mtime), tz=timezone.utc)
+
+    conditional = get_conditional_response(
+        request, etag=etag, last_modified=int(last_modified.timestamp()),
+    )
+    if conditional is not None:
+        conditional['ETag'] = etag
+        conditional['Last-Modified'] = http_date(last_modified.timestamp())
+        return conditional
+
+    content_type = mimetypes.guess_type(material.file.name)[0] or 'application/octet-stream'
+    extension = os.path.splitext(material.file.name)[1]
+    filename = material.title if material.title.endswith(extension) else f'{material.title}{extension}'
+
+    byte_range = None
+    if _range_requested(request, etag, last_modified):
+        byte_range = parse_range(request.headers.get('Range'), size)
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+
+    accel = getattr(settings, 'MATERIAL_DOWNLOAD_ACCEL', None)
+    asgi = isinstance(getattr(request, '_request', request), ASGIRequest)
+    if accel:
+        # the front server handles Range itself
+        response = HttpResponse(content_type=content_type)
+        if accel == 'x-accel-redirect':
+            prefix = getattr(settings, 'MATERIAL_ACCEL_REDIRECT_PREFIX', '/protected-media/')
+            response['X-Accel-Redirect'] = prefix + quote(material.file.name)
+        else:
+            response['X-Sendfile'] = path
+    elif byte_range is None and not asgi:
+        # wsgi.file_wrapper can send the file with sendfile()
+        response = FileResponse(open(path, 'rb'), content_type=content_type)
+        response['Content-Length'] = str(size)
+    else:
+        start, end = byte_range or (0, size - 1)
+        length = end - start + 1
+        blocks = RangeFileIterator(open(path, 'rb'), start, length)
+        if asgi:
+            blocks = aiter_blocks(blocks)
+        response = StreamingHttpResponse(
+            blocks, status=200 if byte_range is None else 206, content_type=content_type,
+        )
+        response['Content-Length'] = str(length)
+        if byte_range is not None:
+            response['Content-Range'] = f'bytes {start}-{end}/{size}'
+
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified.timestamp())
+    response['Content-Disposition'] = content_disposition_header(True, filename)
+    # files can only be fetched by group members, never by shared caches
+    response['Cache-Control'] = 'private, no-cache'
+    return response
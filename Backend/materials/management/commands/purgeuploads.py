@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from materials import uploads
+from materials.models import UploadSession
+
+
+class Command(BaseCommand):
+    help = (
+        'Delete the expired upload sessions with their staging files, and the staging files '
+        'left without a session, meant to be scheduled (cron, systemd timer)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=100,
+            help='sessions deleted per statement',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        before = uploads.expired_before()
+        expired = UploadSession.objects.filter(created_at__lte=before).only('id').order_by('id')
+        sessions = 0
+        while True:
+            batch = list(expired[:batch_size])
+            if not batch:
+                break
+            uploads.delete_sessions(batch)
+            sessions += len(batch)
+        files = uploads.delete_orphan_staging_files(before)
+        self.stdout.write(f'Deleted {sessions} expired upload sessions and {files} orphaned staging files')
@@ -0,0 +1,24 @@
+# Generated by Django 5.1.5 on 2026-10-17 19:40
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('groups_courses', '0003_keyset_pagination_indexes'),
+        ('materials', '0003_alter_label_group_alter_label_max_value_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='material',
+            index=models.Index(fields=['course', 'created_at', 'id'], name='material_course_created_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='materialcomment',
+            index=models.Index(fields=['material', 'CreatedAt', 'id'], name='comment_material_created_idx'),
+        ),
+    ]
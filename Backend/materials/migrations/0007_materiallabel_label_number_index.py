@@ -0,0 +1,17 @@
+# Generated by Django 5.1.5 on 2026-10-17 19:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('materials', '0006_content_addressed_blobs'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='materiallabel',
+            index=models.Index(fields=['label', 'number'], name='materiallabel_label_number_idx'),
+        ),
+    ]
@@ -1,8 +1,15 @@
-from django.db import models
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import models, transaction, IntegrityError
 from groups_courses.models import Course, Group
 from django.core.validators import FileExtensionValidator
 from .validation import  VideoURLValidator, validate_file_size
 from users.models import User
+from collections import Counter
+import hashlib
+import os
 import uuid
 # Create your models here.
 
@@ -10,6 +17,156 @@ def material_file_path(instance, filename):
     folder = instance.course.id
     return f'materials/{folder}/{filename}'
 
+
+def content_addressed_storage():
+    """
+    Check if material files are stored once per content (`MATERIAL_STORAGE_MODE = 'content'`)
+    instead of once per upload under the course folder (`'path'`)
+    """
+    return getattr(settings, 'MATERIAL_STORAGE_MODE', 'path') == 'content'
+
+
+def file_sha256(file):
+    digest = hashlib.sha256()
+    file.seek(0)
+    for chunk in file.chunks():
+        digest.update(chunk)
+    file.seek(0)
+    return digest.hexdigest()
+
+
+def _delete_files(names):
+    for name in names:
+        default_storage.delete(name)
+
+
+class BlobManager(models.Manager):
+    def _blob_name(self, sha256, filename):
+        extension = os.path.splitext(filename)[1].lower()
+        return f'blobs/{sha256[:2]}/{sha256}{extension}'
+
+    def _reference(self, sha256):
+        """
+        Add a reference to an existing blob, returns None if there is no such blob
+        """
+        if self.filter(sha256=sha256).update(ref_count=models.F('ref_count') + 1):
+            return self.get(sha256=sha256)
+        return None
+
+    def _create(self, sha256, name, size):
+        try:
+            with transaction.atomic():
+                return self.create(sha256=sha256, file=name, size=size, ref_count=1)
+        except IntegrityError:
+            # the same content was stored concurrently, keep the other copy
+            default_storage.delete(name)
+            return self._reference(sha256)
+
+    def acquire(self, file):
+        """
+        Return the blob holding the content of `file` with one more reference,
+        the content is only written to the storage if no blob has it yet
+
+        Args:
+            file: a django File, such as an uploaded file
+        """
+        sha256 = file_sha256(file)
+        blob = self._reference(sha256)
+        if blob is not None:
+            return blob
+        name = default_storage.save(self._blob_name(sha256, file.name), file)
+        return self._create(sha256, name, file.size)
+
+    def acquire_path(self, path, filename, sha256=None):
+        """
+        Same as `acquire` for a local file that is no longer needed, the file
+        is moved into the blob store instead of being copied, or deleted if
+        the content is already stored. `sha256` is the digest of the file
+        when it is already known, the file is not read then.
+
+        The media storage must be on the local filesystem (FileSystemStorage).
+        """
+        if sha256 is None:
+            with open(path, 'rb') as local:
+                sha256 = file_sha256(File(local))
+        size = os.path.getsize(path)
+        blob = self._reference(sha256)
+        if blob is not None:
+            os.remove(path)
+            return blob
+        name = default_storage.get_available_name(self._blob_name(sha256, filename))
+        try:
+            target = default_storage.path(name)
+        except NotImplementedError:
+            raise ImproperlyConfigured('Blobs can only be moved into a media storage on the local filesystem.')
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.replace(path, target)
+        return self._create(sha256, name, size)
+
+    def delete_orphan_files(self, names):
+        """
+        Delete the files among `names` that no blob points at, such as the
+        files stored by `acquire` in a transaction that was rolled back
+        """
+        names = set(names)
+        if names:
+            _delete_files(names - set(self.filter(file__in=names).values_list('file', flat=True)))
+
+    def release(self, sha256):
+        """
+        Drop one reference to a blob, the blob and its file are deleted with the last reference
+        """
+        self.release_all([sha256])
+
+    def release_all(self, hashes):
+        """
+        Drop one reference to the blobs per occurrence of their hash in
+        `hashes`, with one UPDATE per distinct number of references dropped.
+        The blobs left without references are deleted, their files once
+        the transaction commits.
+        """
+        dropped = {}
+        for sha256, count in Counter(hashes).items():
+            dropped.setdefault(count, []).append(sha256)
+        if not dropped:
+            return
+        with transaction.atomic():
+            for count, group in dropped.items():
+                self.filter(sha256__in=group).update(ref_count=models.F('ref_count') - count)
+            freed = self.filter(sha256__in=[sha256 for group in dropped.values() for sha256 in group], ref_count=0)
+            names = list(freed.values_list('file', flat=True))
+            if names:
+                freed.delete()
+                transaction.on_commit(lambda: _delete_files(names))
+
+    def release_materials(self, materials):
+        """
+        Drop the references of the `materials` queryset about to be deleted,
+        with a constant number of queries. Their `blob` is cleared first so
+        that the blobs left without references can be deleted.
+        """
+        hashes = list(materials.exclude(blob=None).values_list('blob_id', flat=True))
+        if hashes:
+            materials.exclude(blob=None).update(blob=None)
+            self.release_all(hashes)
+
+
+class Blob(models.Model):
+    """
+    A material file stored once per content, keyed by its SHA-256.
+    `ref_count` is the number of materials pointing at the blob.
+    """
+    sha256 = models.CharField(max_length=64, primary_key=True)
+    file = models.FileField(max_length=255)
+    size = models.PositiveBigIntegerField()
+    ref_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    objects = BlobManager()
+
+    def __str__(self):
+        return self.sha256
+
 class Material(models.Model):
     TYPE = [
         ('document', 'Document'),
@@ -35,6 +192,8 @@ class Material(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     course = models.ForeignKey(Course, on_delete=models.CASCADE)
     owner = models.ForeignKey(User, on_delete=models.CASCADE)
+    # set when the file is stored in the content addressed blob store, `file` then points at the blob file
+    blob = models.ForeignKey(Blob, null=True, blank=True, default=None, on_delete=models.PROTECT, related_name='materials')
 
 
     class Meta:
@@ -48,9 +207,29 @@ class Material(models.Model):
                 name='file_or_url_required'
             )
         ]
+        indexes = [
+            # backs the keyset pagination of the course materials list
+            models.Index(fields=['course', 'created_at', 'id'], name='material_course_created_id_idx'),
+        ]
 
+    def save(self, *args, **kwargs):
+        if not (self.file and not self.file._committed and content_addressed_storage()):
+            return super().save(*args, **kwargs)
 
+        # a new file was assigned, store it in the blob store
+        previous = None
+        if not self._state.adding:
+            previous = Material.objects.filter(pk=self.pk).values_list('blob_id', flat=True).first()
+        with transaction.atomic():
+            self.attach_blob(Blob.objects.acquire(self.file))
+            super().save(*args, **kwargs)
+            if previous:
+                Blob.objects.release(previous)
 
+    def attach_blob(self, blob):
+        self.blob = blob
+        self.file.name = blob.file.name
+        self.file._committed = True
 
     def __str__(self):
         return self.title
@@ -75,6 +254,56 @@ class MaterialLabel(models.Model):
 
     class Meta:
         unique_together = ['material', 'label']
+        indexes = [
+            # materials of a label ordered by number (materials by label view)
+            models.Index(fields=['label', 'number'], name='materiallabel_label_number_idx'),
+        ]
+
+
+class UploadSession(models.Model):
+    """
+    A resumable upload of a material file sent in fixed size chunks.
+    The chunks are written into `staging_name` at their offset, so the file
+    is complete once every chunk has been received. A session expires
+    `MATERIAL_UPLOAD_SESSION_TTL` seconds after it was created.
+    """
+    STAGING_DIR = 'uploads'
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='upload_sessions')
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='upload_sessions')
+    title = models.CharField(max_length=255)
+    filename = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField()
+    chunk_size = models.PositiveIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    @property
+    def total_chunks(self):
+        return max(1, -(-self.size // self.chunk_size))
+
+    def chunk_length(self, index):
+        """
+        Expected length of a chunk, the last one holds the remainder
+        """
+        return min(self.chunk_size, self.size - index * self.chunk_size)
+
+    @property
+    def staging_name(self):
+        return f'{self.STAGING_DIR}/{self.id}.part'
+
+    def __str__(self):
+        return f"Upload of {self.filename} by {self.owner}"
+
+
+class UploadChunk(models.Model):
+    session = models.ForeignKey(UploadSession, on_delete=models.CASCADE, related_name='chunks')
+    index = models.PositiveIntegerField()
+    size = models.PositiveIntegerField()
+    sha256 = models.CharField(max_length=64)
+
+    class Meta:
+        unique_together = ['session', 'index']
 
 
 class MaterialComment(models.Model):
@@ -84,5 +313,10 @@ class MaterialComment(models.Model):
     Content = models.TextField(null=False)
     CreatedAt = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['material', 'CreatedAt', 'id'], name='comment_material_created_idx'),
+        ]
+
     def __str__(self):
         return f"Comment by {self.User} on material {self.material}"
@@ -1,5 +1,41 @@
-from groups_courses.models import GroupMember
+from rest_framework import status
+from rest_framework.exceptions import PermissionDenied
 
+from groups_courses.permissions import can_post, check_group_admin, get_group_policy_or_404
 
 
-    
\ No newline at end of file
+def can_delete_material(request, material):
+    """
+    Check if the requesting user can delete a material
+
+    The owner of the material can always delete it, group admins and the
+    group owner can delete any material posted in the group.
+
+    Args:
+        request: the request object
+        material: the material object, with `course__group` selected
+
+    Returns:
+        bool: True if the user can delete the material, False otherwise
+    """
+    if material.owner_id == request.user.pk:
+        return True
+    return check_group_admin(request, material.course.group)
+
+
+def ensure_can_post_material(request, course):
+    """
+    This function checks if the requesting user can post materials in a course
+
+    Args:
+        request: the request object
+        course: the course object
+
+    Raises:
+        PermissionDenied: If the group of the course doesn't allow the user to post
+    """
+    if not can_post(request, get_group_policy_or_404(course.group_id)):
+        raise PermissionDenied(
+            {"detail": "You do not have permission to post materials in this course."},
+            code=status.HTTP_403_FORBIDDEN
+        )
@@ -1,8 +1,52 @@
+from django.core.files import File
+from django.core.validators import FileExtensionValidator
+from django.db import models as django_models
+from django.urls import reverse
 from rest_framework import serializers
+from Backend.serializers import DynamicFieldsMixin, ValuesSerializer
 from . import models
+from .validation import MAX_FILE_SIZE
 
 
-class LabelSerializer(serializers.ModelSerializer):
+def download_url(material_id, name, request=None):
+    """
+    URL of the download endpoint of a material, None when it has no file
+    """
+    if not name:
+        return None
+    url = reverse('download_material', args=[material_id])
+    return request.build_absolute_uri(url) if request is not None else url
+
+
+class MaterialFileField(serializers.FileField):
+    """
+    Writable file field sending the URL of the download endpoint of the
+    material, which checks the group membership, instead of the media URL
+    """
+    # the columns ValuesSerializer reads for this field
+    value_columns = ('id', 'file')
+
+    def to_representation(self, value):
+        if not value:
+            return None
+        return download_url(value.instance.pk, value.name, self.context.get('request'))
+
+    def from_values(self, values, request):
+        return download_url(values['id'], values['file'], request)
+
+
+class MaterialFileMixin:
+    """
+    Model serializers of materials building `file` as a `MaterialFileField`,
+    with the validators of the model field
+    """
+    serializer_field_mapping = {
+        **serializers.ModelSerializer.serializer_field_mapping,
+        django_models.FileField: MaterialFileField,
+    }
+
+
+class LabelSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = models.Label
         fields = ['id', 'name', 'group', 'min_value', 'max_value']
@@ -16,15 +60,16 @@ class MaterialLabelSerializer(serializers.ModelSerializer):
         read_only_fields = ['material']
 
 
-class ViewMaterialLabelsSerializer(serializers.ModelSerializer):
+class ViewMaterialLabelsSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     label = LabelSerializer()
     class Meta:
         model = models.MaterialLabel
         fields = ['label', 'number']
         read_only_fields = ['label', 'number']
+        expandable_fields = ['label']
 
 
-class CreateMaterialSerializer(serializers.ModelSerializer):
+class CreateMaterialSerializer(MaterialFileMixin, serializers.ModelSerializer):
     labels = MaterialLabelSerializer(many=True, required=False)
 
     class Meta:
@@ -51,19 +96,66 @@ class CreateMaterialSerializer(serializers.ModelSerializer):
     
         
 
-class MaterialSerializer(serializers.ModelSerializer):
+class BulkMaterialLabelSerializer(serializers.Serializer):
+    label = serializers.UUIDField()
+    number = serializers.IntegerField(min_value=0)
+
+
+def check_material_labels(items, labels):
+    """
+    Check validated `{"label": id, "number": n}` items in memory
+
+    Args:
+        items: the validated data of BulkMaterialLabelSerializer(many=True)
+        labels: the Label objects of the group keyed by id
+
+    Raises:
+        ValidationError: if a label is unknown, repeated or its number is out of range
+    """
+    seen = set()
+    for item in items:
+        label = labels.get(item['label'])
+        if label is None:
+            raise serializers.ValidationError(f"Label {item['label']} does not exist in this group.")
+        if label.id in seen:
+            raise serializers.ValidationError(f"Label {label.name} is given more than once.")
+        if not label.min_value <= item['number'] <= label.max_value:
+            raise serializers.ValidationError(
+                f"{label.name} must be between {label.min_value} and {label.max_value}."
+            )
+        seen.add(label.id)
+    return items
+
+
+class BulkMaterialItemSerializer(CreateMaterialSerializer):
+    """
+    Validates one material of a bulk creation without touching the database,
+    the labels of the group are passed in `context['labels']` keyed by id
+    """
+    labels = BulkMaterialLabelSerializer(many=True, required=False)
+
+    def validate_labels(self, value):
+        return check_material_labels(value, self.context['labels'])
+
+
+class MaterialSerializer(MaterialFileMixin, DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = models.Material
         fields = ['id', 'title', 'file', 'url', 'type', 'created_at', 'updated_at']
         read_only_fields = ['id', 'created_at', 'updated_at']
 
 
-class MaterialDetailSerializer(serializers.ModelSerializer):
+class MaterialValuesSerializer(ValuesSerializer):
+    serializer_class = MaterialSerializer
+
+
+class MaterialDetailSerializer(MaterialFileMixin, DynamicFieldsMixin, serializers.ModelSerializer):
         labels = serializers.SerializerMethodField()
         class Meta:
             model = models.Material
             fields = ['id', 'title', 'file', 'url', 'type', 'created_at', 'updated_at', 'labels']
             read_only_fields = ['id', 'created_at', 'updated_at']
+            prefetch_fields = {'labels': ['labels__label']}
 
         def get_labels(self, obj):
             material_labels = obj.labels.all()
@@ -75,29 +167,68 @@ class MaterialDetailSerializer(serializers.ModelSerializer):
                 for label in material_labels  
             ]
     
-class MaterialListSerializer(serializers.ModelSerializer):
+class MaterialListSerializer(MaterialFileMixin, DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = models.Material
         fields = ['id', 'title', 'file', 'url', 'type', 'created_at', 'updated_at']
         read_only_fields = ['id', 'title', 'file', 'url', 'type', 'created_at', 'updated_at']
 
 
+class MaterialListValuesSerializer(ValuesSerializer):
+    serializer_class = MaterialListSerializer
 
-          
-class MaterialLabelListSerializer(serializers.ModelSerializer):
-    label = serializers.CharField(source='label.name')
-    material = MaterialSerializer()  
+
+class MaterialLabelFilterSerializer(serializers.Serializer):
+    number_min = serializers.IntegerField(min_value=0, required=False)
+    number_max = serializers.IntegerField(min_value=0, required=False)
+
+    def validate(self, data):
+        if 'number_min' in data and 'number_max' in data and data['number_min'] > data['number_max']:
+            raise serializers.ValidationError("number_min can not be greater than number_max.")
+        return data
+
+
+class CreateUploadSessionSerializer(serializers.ModelSerializer):
     class Meta:
-        model = models.MaterialLabel
-        fields = ['label', 'number', 'material']
-        read_only_fields = ['label', 'number', 'material']
+        model = models.UploadSession
+        fields = ['title', 'filename', 'size']
+
+    def validate_filename(self, value):
+        # only the extension can be checked before the file is uploaded
+        for validator in models.Material._meta.get_field('file').validators:
+            if isinstance(validator, FileExtensionValidator):
+                validator(File(None, name=value))
+        return value
+
+    def validate_size(self, value):
+        if value <= 0:
+            raise serializers.ValidationError("File must not be empty.")
+        if value > MAX_FILE_SIZE:
+            raise serializers.ValidationError(
+                f"File size must be under 100 MB. Current file size: {value} bytes."
+            )
+        return value
+
+
+class UploadSessionSerializer(serializers.ModelSerializer):
+    received_chunks = serializers.SerializerMethodField()
+
+    class Meta:
+        model = models.UploadSession
+        fields = ['id', 'course', 'title', 'filename', 'size', 'chunk_size', 'total_chunks', 'received_chunks', 'created_at']
+        read_only_fields = fields
+
+    def get_received_chunks(self, obj):
+        return sorted(chunk.index for chunk in obj.chunks.all())
+
 
 class CreateMaterialCommentsSerializer(serializers.ModelSerializer):
     class Meta:
         model = models.MaterialComment
         fields = ['material', 'Content', 'User']
+        read_only_fields = ['User']
 
-class MaterialCommentSerializer(serializers.ModelSerializer):
+class MaterialCommentSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = models.MaterialComment
         fields = ['id', 'material', 'User', 'Content', 'CreatedAt']
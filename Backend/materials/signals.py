@@ -0,0 +1,20 @@
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from Backend.deletion import bulk_pre_delete
+from .models import Blob, Material
+
+
+# the materials deleted by the deletion collector (Material.delete(),
+# queryset deletes, cascades from a user) release their blob one by one once
+# their row is gone, the ones deleted along with a course or a group (see
+# Backend.deletion) release them in bulk
+@receiver(post_delete, sender=Material)
+def release_material_blob(sender, instance, **kwargs):
+    if instance.blob_id:
+        Blob.objects.release(instance.blob_id)
+
+
+@receiver(bulk_pre_delete, sender=Material)
+def release_deleted_materials(sender, queryset, **kwargs):
+    Blob.objects.release_materials(queryset)
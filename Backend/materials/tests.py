@@ -1,3 +1,723 @@
-from django.test import TestCase
+import hashlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import uuid
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.db.models.signals import pre_delete
+from asgiref.sync import async_to_sync
+from django.test import AsyncRequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIRequestFactory, APITestCase, force_authenticate
+from rest_framework_simplejwt.tokens import AccessToken
+
+from groups_courses.models import Group, GroupMember, Course
+from users.models import User
+from .serializers import MaterialListSerializer, MaterialListValuesSerializer, MaterialSerializer, MaterialValuesSerializer
+from .models import Blob, Label, Material, MaterialComment, MaterialLabel, UploadSession
+from .views import BulkCreateMaterialAPIView, MaterialCommentsListAPIView, MaterialListAPIView
+
+
+class MaterialTestCase(APITestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        media = override_settings(MEDIA_ROOT=self.media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+
+        self.user = User.objects.create_user(email='testuser@example.com', username='testuser', password='password')
+        self.other_user = User.objects.create_user(email='otheruser@example.com', username='otheruser', password='password')
+        self.client.force_authenticate(user=self.user)
+        self.group = Group.objects.create(owner=self.user, name="Study Group", join_type="open", post_permission="admins", edit_permissions="admins")
+        self.course = Course.objects.create(group=self.group, name="Course Name")
+
+
+@override_settings(MATERIAL_UPLOAD_CHUNK_SIZE=4, MATERIAL_STORAGE_MODE='path')
+class ChunkedUploadTests(MaterialTestCase):
+    content = b'0123456789'
+
+    def _start(self, **data):
+        url = reverse('create_upload_session', args=[self.course.id])
+        payload = {"title": "Lecture Notes", "filename": "notes.txt", "size": len(self.content), **data}
+        return self.client.post(url, payload, format='json')
+
+    def _put_chunk(self, upload_id, index, body, **headers):
+        url = reverse('upload_chunk', args=[upload_id, index])
+        return self.client.put(url, body, content_type='application/octet-stream', headers=headers)
+
+    def test_upload_out_of_order_and_complete(self):
+        response = self._start()
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        upload_id = response.data['id']
+        self.assertEqual(response.data['total_chunks'], 3)
+
+        self.assertEqual(self._put_chunk(upload_id, 2, self.content[8:]).status_code, status.HTTP_200_OK)
+        self.assertEqual(self._put_chunk(upload_id, 0, self.content[:4]).status_code, status.HTTP_200_OK)
+
+        response = self.client.get(reverse('upload_session_detail', args=[upload_id]))
+        self.assertEqual(response.data['received_chunks'], [0, 2])
+
+        response = self.client.post(reverse('complete_upload_session', args=[upload_id]))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['missing_chunks'], ['1'])
+
+        sha256 = hashlib.sha256(self.content[4:8]).hexdigest()
+        self.assertEqual(self._put_chunk(upload_id, 1, self.content[4:8], X_Chunk_SHA256=sha256).status_code, status.HTTP_200_OK)
+
+        response = self.client.post(reverse('complete_upload_session', args=[upload_id]))
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        material = Material.objects.get(id=response.data['id'])
+        with material.file.open('rb') as uploaded:
+            self.assertEqual(uploaded.read(), self.content)
+        self.assertFalse(UploadSession.objects.exists())
+
+    @override_settings(MATERIAL_STORAGE_MODE='content')
+    def test_complete_into_blob_store(self):
+        upload_id = self._start().data['id']
+        for index in range(3):
+            self._put_chunk(upload_id, index, self.content[index * 4:(index + 1) * 4])
+        response = self.client.post(reverse('complete_upload_session', args=[upload_id]))
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        blob = Blob.objects.get()
+        self.assertEqual(blob.sha256, hashlib.sha256(self.content).hexdigest())
+        self.assertEqual(Material.objects.get().blob, blob)
+        self.assertFalse(os.listdir(os.path.join(self.media_root, 'uploads')))
+
+    @override_settings(MATERIAL_STORAGE_MODE='content')
+    def test_in_order_chunks_are_hashed_while_written(self):
+        upload_id = self._start().data['id']
+        for index in range(3):
+            self._put_chunk(upload_id, index, self.content[index * 4:(index + 1) * 4])
+        with mock.patch('materials.models.file_sha256', side_effect=AssertionError('file read again')):
+            response = self.client.post(reverse('complete_upload_session', args=[upload_id]))
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Blob.objects.get().sha256, hashlib.sha256(self.content).hexdigest())
+
+    @override_settings(MATERIAL_STORAGE_MODE='content')
+    def test_out_of_order_and_resent_chunks_hash(self):
+        upload_id = self._start().data['id']
+        self._put_chunk(upload_id, 0, self.content[:4])
+        self._put_chunk(upload_id, 2, self.content[8:])
+        self._put_chunk(upload_id, 1, b'xxxx')
+        self._put_chunk(upload_id, 1, self.content[4:8])
+        response = self.client.post(reverse('complete_upload_session', args=[upload_id]))
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Blob.objects.get().sha256, hashlib.sha256(self.content).hexdigest())
+
+    def test_chunk_with_wrong_length_or_checksum(self):
+        upload_id = self._start().data['id']
+        self.assertEqual(self._put_chunk(upload_id, 0, b'012').status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self._put_chunk(upload_id, 0, b'01234').status_code, status.HTTP_400_BAD_REQUEST)
+        response = self._put_chunk(upload_id, 0, b'0123', X_Chunk_SHA256='0' * 64)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self._put_chunk(upload_id, 3, b'01').status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(UploadSession.objects.get(id=upload_id).chunks.exists())
+
+    def test_start_validation(self):
+        self.assertEqual(self._start(filename="virus.exe").status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self._start(size=101 * 1024 * 1024).status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_permission_denied(self):
+        GroupMember.objects.create(group=self.group, user=self.other_user, user_role='member')
+        self.client.force_authenticate(user=self.other_user)
+        self.assertEqual(self._start().status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_other_user_cannot_use_session(self):
+        upload_id = self._start().data['id']
+        self.client.force_authenticate(user=self.other_user)
+        self.assertEqual(self._put_chunk(upload_id, 0, b'0123').status_code, status.HTTP_404_NOT_FOUND)
+
+    def _expire(self, upload_id):
+        UploadSession.objects.filter(id=upload_id).update(created_at=timezone.now() - timedelta(days=2))
+
+    def test_expired_session_is_gone(self):
+        upload_id = self._start().data['id']
+        self._expire(upload_id)
+        self.assertEqual(self._put_chunk(upload_id, 0, b'0123').status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(
+            self.client.get(reverse('upload_session_detail', args=[upload_id])).status_code, status.HTTP_404_NOT_FOUND
+        )
+
+    @override_settings(MATERIAL_UPLOAD_MAX_SESSIONS=2)
+    def test_sessions_per_user_are_capped(self):
+        first = self._start(title="First").data['id']
+        self.assertEqual(self._start(title="Second").status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self._start(title="Third").status_code, status.HTTP_400_BAD_REQUEST)
+        # the expired sessions do not count, and are deleted with their staging file
+        self._expire(first)
+        self.assertEqual(self._start(title="Third").status_code, status.HTTP_201_CREATED)
+        self.assertFalse(UploadSession.objects.filter(id=first).exists())
+        self.assertFalse(os.path.exists(os.path.join(self.media_root, 'uploads', f'{first}.part')))
+
+    def test_purge_command(self):
+        expired = self._start(title="Expired").data['id']
+        kept = self._start(title="Kept").data['id']
+        self._put_chunk(expired, 0, b'0123')
+        self._expire(expired)
+        # a session deleted along with its course leaves its staging file behind
+        orphan = UploadSession.objects.create(
+            owner=self.user, course=self.course, title="Orphan", filename="notes.txt", size=4, chunk_size=4,
+        )
+        orphan_path = os.path.join(self.media_root, 'uploads', f'{orphan.id}.part')
+        open(orphan_path, 'wb').close()
+        os.utime(orphan_path, (0, 0))
+        orphan.delete()
+
+        out = io.StringIO()
+        call_command('purgeuploads', batch_size=1, stdout=out)
+        self.assertIn('Deleted 1 expired upload sessions and 1 orphaned staging files', out.getvalue())
+        self.assertEqual(list(UploadSession.objects.values_list('id', flat=True)), [uuid.UUID(kept)])
+        self.assertEqual(os.listdir(os.path.join(self.media_root, 'uploads')), [f'{kept}.part'])
+
+
+@override_settings(MATERIAL_STORAGE_MODE='content')
+class BlobStoreTests(MaterialTestCase):
+    def setUp(self):
+        super().setUp()
+        self.other_course = Course.objects.create(group=self.group, name="Other Course")
+
+    def _upload(self, course, title, content=b'lecture notes'):
+        url = reverse('create_material', args=[course.id])
+        data = {"title": title, "type": "document", "file": SimpleUploadedFile("notes.pdf", content)}
+        response = self.client.post(url, data, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return Material.objects.get(course=course, title=title)
+
+    def test_duplicate_uploads_share_a_blob(self):
+        first = self._upload(self.course, "Notes")
+        second = self._upload(self.other_course, "Notes")
+        self.assertEqual(first.blob_id, hashlib.sha256(b'lecture notes').hexdigest())
+        self.assertEqual(first.file.name, second.file.name)
+        self.assertEqual(Blob.objects.get().ref_count, 2)
+        self.assertEqual(len(os.listdir(os.path.join(self.media_root, 'blobs', first.blob_id[:2]))), 1)
+
+    def test_blob_freed_with_last_reference(self):
+        first = self._upload(self.course, "Notes")
+        second = self._upload(self.other_course, "Notes")
+        path = first.file.path
+        first.delete()
+        self.assertEqual(Blob.objects.get().ref_count, 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertFalse(Blob.objects.exists())
+        self.assertFalse(os.path.exists(path))
+
+    def test_different_content_different_blobs(self):
+        self._upload(self.course, "Notes")
+        self._upload(self.course, "Slides", content=b'slides')
+        self.assertEqual(Blob.objects.count(), 2)
+
+    def test_course_delete_releases_blobs_in_bulk(self):
+        self._upload(self.course, "Notes")
+        self._upload(self.course, "Notes again")
+        kept = self._upload(self.other_course, "Slides", content=b'slides')
+        path = Material.objects.get(title="Notes").file.path
+        with self.captureOnCommitCallbacks(execute=True):
+            self.course.delete()
+        self.assertEqual(Blob.objects.get().sha256, kept.blob_id)
+        self.assertEqual(Blob.objects.get().ref_count, 1)
+        self.assertFalse(os.path.exists(path))
+        self.assertEqual(Material.objects.get(), kept)
+
+    def test_group_delete_releases_blobs(self):
+        self._upload(self.course, "Notes")
+        self._upload(self.other_course, "Notes")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.group.delete()
+        self.assertFalse(Blob.objects.exists())
+        self.assertFalse(Material.objects.exists())
+
+    def test_user_delete_releases_blobs(self):
+        self._upload(self.course, "Notes")
+        self.user.delete()
+        self.assertFalse(Blob.objects.exists())
+
+    def test_queryset_delete_releases_blobs(self):
+        self._upload(self.course, "Notes")
+        self._upload(self.other_course, "Notes")
+        kept = self._upload(self.course, "Slides", content=b'slides')
+        path = kept.file.path
+        Material.objects.filter(title="Notes", course=self.course).delete()
+        self.assertEqual(Blob.objects.get(sha256=hashlib.sha256(b'lecture notes').hexdigest()).ref_count, 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            Material.objects.all().delete()
+        self.assertFalse(Blob.objects.exists())
+        self.assertFalse(os.path.exists(path))
+
+    def test_bulk_delete_needs_a_bulk_receiver(self):
+        def receiver(sender, instance, **kwargs):
+            pass
+
+        pre_delete.connect(receiver, sender=MaterialComment)
+        self.addCleanup(pre_delete.disconnect, receiver, sender=MaterialComment)
+        with self.assertRaises(ValueError):
+            self.course.delete()
+        self.assertTrue(Course.objects.filter(pk=self.course.pk).exists())
+
+
+class MaterialDownloadTests(MaterialTestCase):
+    content = b'0123456789'
+
+    def setUp(self):
+        super().setUp()
+        self.material = Material.objects.create(
+            title="Notes", type="document", course=self.course, owner=self.user,
+            file=SimpleUploadedFile("notes.txt", self.content),
+        )
+        self.url = reverse('download_material', args=[self.material.id])
+
+    def test_download(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertIn('filename="Notes.txt"', response['Content-Disposition'])
+
+        response = self.client.get(self.url, headers={'If-None-Match': response['ETag']})
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_range(self):
+        response = self.client.get(self.url, headers={'Range': 'bytes=2-5'})
+        self.assertEqual(response.status_code, status.HTTP_206_PARTIAL_CONTENT)
+        self.assertEqual(b''.join(response.streaming_content), b'2345')
+        self.assertEqual(response['Content-Range'], 'bytes 2-5/10')
+
+        response = self.client.get(self.url, headers={'Range': 'bytes=-3'})
+        self.assertEqual(b''.join(response.streaming_content), b'789')
+
+        response = self.client.get(self.url, headers={'Range': 'bytes=20-'})
+        self.assertEqual(response.status_code, status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE)
+
+        response = self.client.get(self.url, headers={'Range': 'bytes=2-5', 'If-Range': '"stale"'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    async def test_streamed_under_asgi(self):
+        headers = {'Authorization': f'Bearer {AccessToken.for_user(self.user)}'}
+        response = await self.async_client.get(self.url, headers=headers)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.is_async)
+        self.assertEqual(b''.join([block async for block in response.streaming_content]), self.content)
+
+        response = await self.async_client.get(self.url, headers={**headers, 'Range': 'bytes=2-5'})
+        self.assertEqual(response.status_code, status.HTTP_206_PARTIAL_CONTENT)
+        self.assertTrue(response.is_async)
+        self.assertEqual(b''.join([block async for block in response.streaming_content]), b'2345')
+
+    @override_settings(MATERIAL_DOWNLOAD_ACCEL='x-accel-redirect')
+    def test_accel_redirect(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['X-Accel-Redirect'], '/protected-media/' + self.material.file.name)
+        self.assertEqual(response.content, b'')
+
+        self.material.file.save("résumé.txt", ContentFile(self.content))
+        response = self.client.get(self.url)
+        self.assertEqual(response['X-Accel-Redirect'], f'/protected-media/materials/{self.course.id}/r%C3%A9sum%C3%A9.txt')
+
+    def test_update_file(self):
+        url = reverse('update_delete_material', args=[self.material.id])
+        data = {"file": SimpleUploadedFile("notes.txt", b'new notes')}
+        response = self.client.patch(url, data, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['file'], 'http://testserver' + self.url)
+        self.material.refresh_from_db()
+        with self.material.file.open('rb') as notes:
+            self.assertEqual(notes.read(), b'new notes')
+
+        data = {"file": SimpleUploadedFile("virus.exe", b'MZ')}
+        response = self.client.patch(url, data, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_non_member(self):
+        self.client.force_authenticate(user=self.other_user)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_missing_file(self):
+        os.remove(self.material.file.path)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_list_sends_download_url(self):
+        response = self.client.get(reverse('list_materials', args=[self.course.id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['results'][0]['file'], 'http://testserver' + self.url)
+
+    def test_not_served_as_media(self):
+        response = self.client.get('/media/' + self.material.file.name)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+@override_settings(MATERIAL_STORAGE_MODE='path')
+class BulkCreateMaterialTests(MaterialTestCase):
+    def setUp(self):
+        super().setUp()
+        self.url = reverse('bulk_create_materials', args=[self.course.id])
+        self.week = Label.objects.create(name="Week", group=self.group, min_value=1, max_value=14)
+
+    def test_bulk_create_urls_and_files(self):
+        materials = [
+            {"title": "Intro", "type": "url", "url": "https://youtu.be/intro", "labels": [{"label": str(self.week.id), "number": 1}]},
+            {"title": "Slides", "type": "document", "file": "slides"},
+        ]
+        data = {"materials": json.dumps(materials), "slides": SimpleUploadedFile("slides.pdf", b'slides')}
+        response = self.client.post(self.url, data, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(response.data['created']), 2)
+        self.assertEqual(response.data['errors'], [])
+        self.assertEqual(MaterialLabel.objects.get().number, 1)
+        with Material.objects.get(title="Slides").file.open('rb') as slides:
+            self.assertEqual(slides.read(), b'slides')
+
+    def test_partial_failure(self):
+        Material.objects.create(title="Taken", type="url", url="https://youtu.be/taken", course=self.course, owner=self.user)
+        materials = [
+            {"title": "Ok", "type": "url", "url": "https://youtu.be/ok"},
+            {"title": "Taken", "type": "url", "url": "https://youtu.be/other"},
+            {"title": "Bad url", "type": "url", "url": "https://example.com/video"},
+            {"title": "Out of range", "type": "url", "url": "https://youtu.be/week", "labels": [{"label": str(self.week.id), "number": 20}]},
+            {"title": "Ok", "type": "url", "url": "https://youtu.be/again"},
+            {"title": "Missing file", "type": "document", "file": "nothing"},
+        ]
+        response = self.client.post(self.url, {"materials": materials}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_207_MULTI_STATUS)
+        self.assertEqual([material['title'] for material in response.data['created']], ["Ok"])
+        self.assertEqual([error['index'] for error in response.data['errors']], [1, 2, 3, 4, 5])
+
+    @override_settings(MATERIAL_STORAGE_MODE='content')
+    def test_title_taken_concurrently(self):
+        shared = Material.objects.create(
+            title="Shared", type="document", course=self.course, owner=self.user,
+            file=SimpleUploadedFile("shared.pdf", b'shared'),
+        )
+        Material.objects.create(title="Taken", type="url", url="https://youtu.be/taken", course=self.course, owner=self.user)
+        materials = [
+            {"title": "New", "type": "document", "file": "new"},
+            {"title": "Copy", "type": "document", "file": "copy"},
+            {"title": "Taken", "type": "url", "url": "https://youtu.be/other"},
+        ]
+        data = {
+            "materials": json.dumps(materials),
+            "new": SimpleUploadedFile("new.pdf", b'new'),
+            "copy": SimpleUploadedFile("copy.pdf", b'shared'),
+        }
+        # the titles are checked before the other request creates "Taken"
+        with mock.patch.object(BulkCreateMaterialAPIView, '_taken_titles', side_effect=[set(), {"Taken"}]):
+            response = self.client.post(self.url, data, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(response.data['created'], [])
+        self.assertEqual([error['index'] for error in response.data['errors']], [2])
+        self.assertEqual(Material.objects.count(), 2)
+        self.assertEqual(list(Blob.objects.values_list('sha256', 'ref_count')), [(shared.blob_id, 1)])
+        blob_files = [name for _, _, names in os.walk(os.path.join(self.media_root, 'blobs')) for name in names]
+        self.assertEqual(blob_files, [os.path.basename(shared.file.name)])
+
+    def test_title_taken_concurrently_in_path_mode(self):
+        Material.objects.create(title="Taken", type="url", url="https://youtu.be/taken", course=self.course, owner=self.user)
+        materials = [
+            {"title": "New", "type": "document", "file": "new"},
+            {"title": "Taken", "type": "url", "url": "https://youtu.be/other"},
+        ]
+        data = {"materials": json.dumps(materials), "new": SimpleUploadedFile("new.pdf", b'new')}
+        with mock.patch.object(BulkCreateMaterialAPIView, '_taken_titles', side_effect=[set(), {"Taken"}]):
+            response = self.client.post(self.url, data, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        files = [name for _, _, names in os.walk(self.media_root) for name in names]
+        self.assertEqual(files, [])
+
+    def test_query_count_is_constant(self):
+        def create(count, offset):
+            materials = [
+                {"title": f"Video {i}", "type": "url", "url": f"https://youtu.be/{i}", "labels": [{"label": str(self.week.id), "number": 2}]}
+                for i in range(offset, offset + count)
+            ]
+            cache.clear()
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.post(self.url, {"materials": materials}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+            return len(queries)
+        self.assertEqual(create(2, 0), create(40, 100))
+
+    def test_permission_denied(self):
+        self.client.force_authenticate(user=self.other_user)
+        response = self.client.post(self.url, {"materials": [{"title": "Intro", "type": "url", "url": "https://youtu.be/intro"}]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class MaterialLabelsTests(MaterialTestCase):
+    def setUp(self):
+        super().setUp()
+        self.material = Material.objects.create(title="Intro", type="url", url="https://youtu.be/intro", course=self.course, owner=self.user)
+        self.url = reverse('material_labels', args=[self.material.id])
+        self.labels = [
+            Label.objects.create(name=f"Label {i}", group=self.group, min_value=1, max_value=10)
+            for i in range(30)
+        ]
+
+    def _put(self, numbers):
+        labels = [{"label": str(label.id), "number": number} for label, number in numbers.items()]
+        return self.client.put(self.url, {"labels": labels}, format='json')
+
+    def _current(self):
+        return {material_label.label_id: material_label.number for material_label in MaterialLabel.objects.filter(material=self.material)}
+
+    def test_replace_labels(self):
+        first, second, third = self.labels[:3]
+        self._put({first: 1, second: 2})
+        kept = MaterialLabel.objects.get(material=self.material, label=first)
+
+        response = self._put({first: 1, second: 5, third: 3})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self._current(), {first.id: 1, second.id: 5, third.id: 3})
+        self.assertEqual(MaterialLabel.objects.get(material=self.material, label=first).id, kept.id)
+
+        self._put({third: 4})
+        self.assertEqual(self._current(), {third.id: 4})
+
+    def test_empty_labels_remove_all(self):
+        self._put({self.labels[0]: 1})
+        response = self.client.put(self.url, {"labels": []}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(self._current(), {})
+
+    def test_invalid_labels_change_nothing(self):
+        self._put({self.labels[0]: 1})
+        other_group = Group.objects.create(owner=self.user, name="Other Group", join_type="open")
+        foreign = Label.objects.create(name="Foreign", group=other_group, min_value=1, max_value=10)
+        self.assertEqual(self._put({self.labels[1]: 11}).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self._put({foreign: 1}).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self._current(), {self.labels[0].id: 1})
+
+    def test_query_count_is_constant(self):
+        def replace(numbers):
+            cache.clear()
+            with CaptureQueriesContext(connection) as queries:
+                response = self._put(numbers)
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+            return len(queries)
+
+        # each replacement inserts, updates and deletes some labels
+        small = replace({label: 1 for label in self.labels[:2]})
+        small = replace({self.labels[0]: 2, self.labels[2]: 1})
+        replace({label: 1 for label in self.labels[:20]})
+        large = replace({**{label: 2 for label in self.labels[:10]}, **{label: 1 for label in self.labels[20:]}})
+        self.assertEqual(small, large)
+
+    def test_permission_denied(self):
+        self.client.force_authenticate(user=self.other_user)
+        self.assertEqual(self._put({self.labels[0]: 1}).status_code, status.HTTP_403_FORBIDDEN)
+
+
+class MaterialsByLabelTests(MaterialTestCase):
+    def setUp(self):
+        super().setUp()
+        self.week = Label.objects.create(name="Week", group=self.group, min_value=1, max_value=14)
+        self.url = reverse('materials_by_label', args=[self.course.id, self.week.id])
+
+    def _create(self, count, offset=0):
+        for i in range(offset, offset + count):
+            material = Material.objects.create(title=f"Video {i}", type="url", url=f"https://youtu.be/{i}", course=self.course, owner=self.user)
+            MaterialLabel.objects.create(material=material, label=self.week, number=i % 7 + 1)
+
+    def test_grouped_by_number(self):
+        self._create(10)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['label_name'], "Week")
+        self.assertEqual(list(response.data['materials']), [1, 2, 3, 4, 5, 6, 7])
+        self.assertEqual(
+            [entry['material']['title'] for entry in response.data['materials'][1]],
+            ["Video 0", "Video 7"]
+        )
+
+    def test_number_range(self):
+        self._create(10)
+        response = self.client.get(self.url, {"number_min": 3, "number_max": 5})
+        self.assertEqual(list(response.data['materials']), [3, 4, 5])
+        response = self.client.get(self.url, {"number_min": 5, "number_max": 3})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_query_count_is_constant(self):
+        def fetch():
+            cache.clear()
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(self.url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            return len(queries)
+        self._create(2)
+        small = fetch()
+        self._create(30, offset=2)
+        self.assertEqual(fetch(), small)
+
+    def test_permission_denied(self):
+        self.client.force_authenticate(user=self.other_user)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+@override_settings(STREAMING_CHUNK_SIZE=3)
+class StreamingListTests(MaterialTestCase):
+    def setUp(self):
+        super().setUp()
+        self.url = reverse('list_materials', args=[self.course.id])
+        for i in range(7):
+            Material.objects.create(title=f"Video {i}", type="url", url=f"https://youtu.be/{i}", course=self.course, owner=self.user)
+
+    def test_stream_matches_list(self):
+        response = self.client.get(self.url, {"stream": "true"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        chunks = list(response.streaming_content)
+        # opening bracket, three chunks of rows and closing bracket
+        self.assertEqual(len(chunks), 5)
+        streamed = json.loads(b''.join(chunks))
+        self.assertEqual(streamed, json.loads(json.dumps(self.client.get(self.url).data['results'])))
+
+    def test_stream_empty_list(self):
+        Material.objects.all().delete()
+        response = self.client.get(self.url, {"stream": "true"})
+        self.assertEqual(json.loads(b''.join(response.streaming_content)), [])
+
+    def test_stream_comments(self):
+        material = Material.objects.first()
+        for i in range(4):
+            MaterialComment.objects.create(material=material, User=self.user, Content=f"Comment {i}")
+        response = self.client.get(reverse('list_material_comments', args=[material.id]), {"stream": "1"})
+        self.assertEqual(len(json.loads(b''.join(response.streaming_content))), 4)
+
+    def test_stream_permission_denied(self):
+        self.client.force_authenticate(user=self.other_user)
+        response = self.client.get(self.url, {"stream": "true"})
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_async_stream_under_asgi(self):
+        request = AsyncRequestFactory().get(self.url, {"stream": "true"})
+        force_authenticate(request, user=self.user)
+
+        async def consume():
+            # the view is async, it returns a coroutine
+            response = await MaterialListAPIView.as_view()(request, course_id=self.course.id)
+            self.assertTrue(response.is_async)
+            return [chunk async for chunk in response.streaming_content]
+
+        self.assertEqual(len(json.loads(b''.join(async_to_sync(consume)()))), 7)
+
+
+class AsyncListTests(MaterialTestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.materials = [
+            Material.objects.create(title=f"Lecture {i}", type="url", url=f"https://youtu.be/{i}", course=self.course, owner=self.user)
+            for i in range(3)
+        ]
+        for i in range(3):
+            MaterialComment.objects.create(material=self.materials[0], User=self.user, Content=f"Comment {i}")
+        self.headers = {'Authorization': f'Bearer {AccessToken.for_user(self.user)}'}
+
+    def test_views_are_async(self):
+        self.assertTrue(MaterialListAPIView.view_is_async)
+        self.assertTrue(MaterialCommentsListAPIView.view_is_async)
+
+    async def test_materials_pages_under_asgi(self):
+        url = reverse('list_materials', args=[self.course.id])
+        response = await self.async_client.get(url, {'page_size': 2}, headers=self.headers)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        page = response.json()
+        self.assertEqual([material['title'] for material in page['results']], ['Lecture 2', 'Lecture 1'])
+
+        response = await self.async_client.get(page['next'], headers=self.headers)
+        self.assertEqual([material['title'] for material in response.json()['results']], ['Lecture 0'])
+
+    async def test_materials_of_another_group_are_denied(self):
+        headers = {'Authorization': f'Bearer {AccessToken.for_user(self.other_user)}'}
+        response = await self.async_client.get(reverse('list_materials', args=[self.course.id]), headers=headers)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    async def test_comments_under_asgi(self):
+        url = reverse('list_material_comments', args=[self.materials[0].id])
+        response = await self.async_client.get(url, {'fields': 'Content'}, headers=self.headers)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['results'], [{'Content': f'Comment {i}'} for i in (2, 1, 0)])
+
+
+class ValuesSerializerTests(MaterialTestCase):
+    def test_same_output_as_model_serializers(self):
+        Material.objects.create(title="Intro", type="url", url="https://youtu.be/intro", course=self.course, owner=self.user)
+        Material.objects.create(
+            title="Slides", type="document", course=self.course, owner=self.user,
+            file=SimpleUploadedFile("slides.pdf", b'slides'),
+        )
+        queryset = Material.objects.order_by('title')
+        request = APIRequestFactory().get('/')
+        for context in ({}, {'request': request}):
+            self.assertEqual(
+                MaterialValuesSerializer(queryset, many=True, context=context).data,
+                MaterialSerializer(queryset, many=True, context=context).data,
+            )
+            self.assertEqual(
+                MaterialListValuesSerializer(queryset, many=True, context=context).data,
+                MaterialListSerializer(queryset, many=True, context=context).data,
+            )
+
+
+    def test_list_view_fields_and_expand(self):
+        Material.objects.create(
+            title="Slides", type="document", course=self.course, owner=self.user,
+            file=SimpleUploadedFile("slides.pdf", b'slides'),
+        )
+        url = reverse('list_materials', args=[self.course.id])
+        for params in ({'expand': ''}, {'fields': 'title,file.url'}):
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            request = APIRequestFactory().get(url, params)
+            self.assertEqual(
+                response.data['results'],
+                MaterialSerializer(Material.objects.all(), many=True, context={'request': request}).data,
+            )
+        self.assertEqual(self.client.get(url, {'expand': 'owner'}).status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class MaterialFieldsTests(MaterialTestCase):
+    def setUp(self):
+        super().setUp()
+        self.material = Material.objects.create(title="Intro", type="url", url="https://youtu.be/intro", course=self.course, owner=self.user)
+        self.url = reverse('update_delete_material', args=[self.material.id])
+
+    def _get(self, count, **params):
+        for i in range(count):
+            label = Label.objects.create(name=f"Label {i}-{count}", group=self.group, min_value=0, max_value=10)
+            MaterialLabel.objects.create(material=self.material, label=label, number=i)
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response, len(queries)
+
+    def test_labels_only_loaded_when_requested(self):
+        response, with_labels = self._get(1)
+        self.assertEqual(len(response.data['labels']), 1)
+        response, without_labels = self._get(0, fields='id,title')
+        self.assertEqual(set(response.data), {'id', 'title'})
+        # the material only, labels and their names are not fetched
+        self.assertEqual(without_labels, 1)
+        self.assertLess(without_labels, with_labels)
+
+    def test_labels_are_prefetched(self):
+        _, few = self._get(1)
+        response, many = self._get(5)
+        self.assertEqual(len(response.data['labels']), 6)
+        self.assertEqual(few, many)
@@ -0,0 +1,319 @@
+"""
+Resumable chunked uploads of material files.
+
+The flow is:
+    1. a session is created with the final file size, an empty staging file
+       of that size is allocated in the media storage
+    2. every chunk is streamed straight into the staging file at its offset,
+       hashing it on the way, so a chunk can be resent until it is accepted
+    3. once every chunk is received the staging file is moved into place and
+       attached to a new material, the file is never read back: the SHA-256
+       of the whole file needed by the content addressed storage is kept up
+       to date while the chunks are written (see `RunningDigests`)
+
+The staging file is written in place, so the media storage must be on the
+local filesystem (FileSystemStorage).
+"""
+import hashlib
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import ValidationError
+
+from . import models
+
+# size of the blocks read from the request stream while writing a chunk
+STREAM_BLOCK_SIZE = 64 * 1024
+
+
+def get_chunk_size():
+    return getattr(settings, 'MATERIAL_UPLOAD_CHUNK_SIZE', 5 * 1024 * 1024)
+
+
+def get_max_sessions():
+    return getattr(settings, 'MATERIAL_UPLOAD_MAX_SESSIONS', 10)
+
+
+def expired_before():
+    """
+    Return the start time of the newest expired upload session
+    """
+    return timezone.now() - timedelta(seconds=getattr(settings, 'MATERIAL_UPLOAD_SESSION_TTL', 24 * 60 * 60))
+
+
+class RunningDigests:
+    """
+    SHA-256 of the leading chunks of the uploads handled by this process,
+    extended while the chunks arrive in order. hashlib states can not be
+    shared between processes: when some chunks were written by another
+    worker or arrived out of order, only the bytes that were not hashed
+    are read from the staging file when the upload completes.
+    """
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        # session id -> (number of bytes hashed, digest)
+        self._digests = OrderedDict()
+
+    def start(self, session_id):
+        self.put(session_id, 0, hashlib.sha256())
+
+    def put(self, session_id, hashed, digest):
+        with self._lock:
+            self._digests[session_id] = (hashed, digest)
+            self._digests.move_to_end(session_id)
+            while len(self._digests) > self.max_entries:
+                self._digests.popitem(last=False)
+
+    def take(self, session_id, offset):
+        """
+        Return the digest to extend with the bytes written at `offset`, or
+        None when they do not follow the bytes hashed so far. The digest is
+        taken out until it is `put` back.
+        """
+        with self._lock:
+            entry = self._digests.get(session_id)
+            if entry is None or entry[0] < offset:
+                # not started here, or a chunk before this one is missing
+                return None
+            del self._digests[session_id]
+        # a chunk that was already hashed is written again, the digest is stale
+        return entry[1] if entry[0] == offset else None
+
+    def finish(self, session_id):
+        """
+        Return and forget `(number of bytes hashed, digest)`
+        """
+        with self._lock:
+            return self._digests.pop(session_id, None) or (0, hashlib.sha256())
+
+
+running_digests = RunningDigests()
+
+
+def local_path(name):
+    try:
+        return default_storage.path(name)
+    except NotImplementedError:
+        raise ImproperlyConfigured('Chunked uploads need a media storage on the local filesystem.')
+
+
+def check_session_quota(owner):
+    """
+    Delete the expired upload sessions of `owner` and check that they can
+    start another one
+
+    Raises:
+        ValidationError: if `owner` has `MATERIAL_UPLOAD_MAX_SESSIONS` uploads in progress
+    """
+    sessions = list(models.UploadSession.objects.filter(owner=owner).only('id', 'created_at'))
+    cutoff = expired_before()
+    expired = [session for session in sessions if session.created_at <= cutoff]
+    if expired:
+        delete_sessions(expired)
+    if len(sessions) - len(expired) >= get_max_sessions():
+        raise ValidationError(
+            {"detail": "Too many uploads in progress, complete or abort one first."},
+            code=status.HTTP_400_BAD_REQUEST
+        )
+
+
+def start_upload(session):
+    """
+    Allocate the staging file of a new upload session
+    """
+    path = local_path(session.staging_name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as staging:
+        staging.truncate(session.size)
+    running_digests.start(session.id)
+
+
+def write_chunk(session, index, stream, expected_sha256=None):
+    """
+    Stream chunk `index` of an upload from `stream` into the staging file.
+
+    Args:
+        session: the UploadSession
+        index: the index of the chunk, starting at 0
+        stream: file like object holding the chunk
+        expected_sha256 (str, optional): hex digest sent by the client
+
+    Returns:
+        UploadChunk: the recorded chunk
+
+    Raises:
+        ValidationError: if the index, the length or the checksum is wrong
+    """
+    if not 0 <= index < session.total_chunks:
+        raise ValidationError(
+            {"detail": f"Chunk index must be between 0 and {session.total_chunks - 1}."},
+            code=status.HTTP_400_BAD_REQUEST
+        )
+
+    expected_length = session.chunk_length(index)
+    offset = index * session.chunk_size
+    digest = hashlib.sha256()
+    file_digest = running_digests.take(session.id, offset)
+    remaining = expected_length
+    with open(local_path(session.staging_name), 'r+b') as staging:
+        staging.seek(offset)
+        # never write past the chunk, the rest of the file belongs to other chunks
+        while remaining > 0:
+            block = stream.read(min(STREAM_BLOCK_SIZE, remaining))
+            if not block:
+                break
+            staging.write(block)
+            digest.update(block)
+            if file_digest is not None:
+                file_digest.update(block)
+            remaining -= len(block)
+
+    if remaining or stream.read(1):
+        raise ValidationError(
+            {"detail": f"Chunk {index} must be exactly {expected_length} bytes."},
+            code=status.HTTP_400_BAD_REQUEST
+        )
+
+    sha256 = digest.hexdigest()
+    if expected_sha256 and expected_sha256.lower() != sha256:
+        raise ValidationError(
+            {"detail": f"Checksum mismatch for chunk {index}."},
+            code=status.HTTP_400_BAD_REQUEST
+        )
+
+    chunk, _ = models.UploadChunk.objects.update_or_create(
+        session=session, index=index,
+        defaults={'size': expected_length, 'sha256': sha256},
+    )
+    if file_digest is not None:
+        running_digests.put(session.id, offset + expected_length, file_digest)
+    return chunk
+
+
+def file_sha256(session, path):
+    """
+    SHA-256 of the complete staging file, reading only the bytes that were
+    not hashed while the chunks were written
+    """
+    hashed, digest = running_digests.finish(session.id)
+    if hashed < session.size:
+        with open(path, 'rb') as staging:
+            staging.seek(hashed)
+            while block := staging.read(STREAM_BLOCK_SIZE):
+                digest.update(block)
+    return digest.hexdigest()
+
+
+def session_checksum(chunks):
+    """
+    Checksum of a complete upload, the SHA-256 of the chunk digests in order
+    followed by the number of chunks (the same scheme as S3 multipart ETags).
+    It is computed from the digests recorded while writing the chunks.
+    """
+    digest = hashlib.sha256()
+    for chunk in chunks:
+        digest.update(bytes.fromhex(chunk.sha256))
+    return f'{digest.hexdigest()}-{len(chunks)}'
+
+
+def complete_upload(session):
+    """
+    Attach the uploaded file to a new material and delete the session
+
+    Raises:
+        ValidationError: if some chunks are missing or the title is taken
+    """
+    chunks = list(session.chunks.order_by('index'))
+    missing = sorted(set(range(session.total_chunks)) - {chunk.index for chunk in chunks})
+    if missing:
+        raise ValidationError(
+            {"detail": "Some chunks are missing.", "missing_chunks": missing},
+            code=status.HTTP_400_BAD_REQUEST
+        )
+    if models.Material.objects.filter(course_id=session.course_id, title=session.title).exists():
+        raise ValidationError(
+            {"detail": "A material with this title already exists in this course."},
+            code=status.HTTP_400_BAD_REQUEST
+        )
+
+    material = models.Material(
+        title=session.title,
+        type='document',
+        course=session.course,
+        owner_id=session.owner_id,
+    )
+    staging_path = local_path(session.staging_name)
+
+    if models.content_addressed_storage():
+        sha256 = file_sha256(session, staging_path)
+        with transaction.atomic():
+            material.attach_blob(models.Blob.objects.acquire_path(staging_path, session.filename, sha256))
+            material.save()
+            session.delete()
+        return material, session_checksum(chunks)
+
+    running_digests.finish(session.id)
+    name = material.file.field.generate_filename(material, session.filename)
+    name = default_storage.get_available_name(name)
+    path = local_path(name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    with transaction.atomic():
+        material.file.name = name
+        material.save()
+        session.delete()
+        os.replace(staging_path, path)
+    return material, session_checksum(chunks)
+
+
+def abort_upload(session):
+    staging_name = session.staging_name
+    running_digests.finish(session.id)
+    session.delete()
+    default_storage.delete(staging_name)
+
+
+def delete_sessions(sessions):
+    """
+    Delete upload sessions along with their chunks and staging files
+    """
+    sessions = list(sessions)
+    models.UploadSession.objects.filter(id__in=[session.id for session in sessions]).delete()
+    for session in sessions:
+        running_digests.finish(session.id)
+        default_storage.delete(session.staging_name)
+
+
+def delete_orphan_staging_files(before):
+    """
+    Delete the staging files left without a session, by the sessions deleted
+    along with their course or owner, that were last written before `before`.
+    Return their number.
+    """
+    try:
+        names = default_storage.listdir(models.UploadSession.STAGING_DIR)[1]
+    except FileNotFoundError:
+        return 0
+    files = {}
+    for name in names:
+        try:
+            files[uuid.UUID(name.removesuffix('.part'))] = f'{models.UploadSession.STAGING_DIR}/{name}'
+        except ValueError:
+            continue
+    alive = set(models.UploadSession.objects.filter(id__in=list(files)).values_list('id', flat=True))
+    deleted = 0
+    for session_id, name in files.items():
+        if session_id not in alive and default_storage.get_modified_time(name) < before:
+            default_storage.delete(name)
+            deleted += 1
+    return deleted
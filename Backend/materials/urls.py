@@ -4,7 +4,13 @@ from . import views
 urlpatterns = [
     path('course/<uuid:course_id>/materials/create/', views.CreateMaterialAPIView.as_view(), name='create_material'),
     path('course/<uuid:course_id>/materials/', views.MaterialListAPIView.as_view(), name='list_materials'),  
+    path('course/<uuid:course_id>/materials/bulk/', views.BulkCreateMaterialAPIView.as_view(), name='bulk_create_materials'),
+    path('course/<uuid:course_id>/materials/uploads/', views.UploadSessionCreateAPIView.as_view(), name='create_upload_session'),
+    path('uploads/<uuid:upload_id>/', views.UploadSessionDetailAPIView.as_view(), name='upload_session_detail'),
+    path('uploads/<uuid:upload_id>/chunks/<int:index>/', views.UploadChunkAPIView.as_view(), name='upload_chunk'),
+    path('uploads/<uuid:upload_id>/complete/', views.UploadSessionCompleteAPIView.as_view(), name='complete_upload_session'),
     path('materials/<uuid:material_id>/', views.MaterialDestroyUpdateAPIView.as_view(), name='update_delete_material'),
+    path('materials/<uuid:material_id>/download/', views.MaterialDownloadAPIView.as_view(), name='download_material'),
     path('groups/<uuid:group_id>/labels/', views.ListCreateLabelAPIView.as_view(), name='list_create_labels'),
     path('materials/<uuid:material_id>/labels/', views.MaterialLabelsAPIView.as_view(), name='material_labels'),
     path('course/<course_id>/materials/labels/<label_id>/', views.MaterialLabelListAPIView.as_view(), name='materials_by_label'),
@@ -28,9 +28,11 @@ class VideoURLValidator:
         )
 
 
+MAX_FILE_SIZE = 100 * 1024 * 1024
+
+
 def validate_file_size(value):
-    max_size = 100 * 1024 * 1024
-    if value.size > max_size:
+    if value.size > MAX_FILE_SIZE:
         raise ValidationError(
             f"File size must be under 100 MB. Current file size: {value.size} bytes."
         )
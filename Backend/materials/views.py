@@ -1,15 +1,31 @@
-from django.db import IntegrityError
+import io
+import json
+import uuid
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.http import Http404
 from django.shortcuts import get_object_or_404
 
 from rest_framework import generics, status
-from rest_framework.exceptions import PermissionDenied, ValidationError
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.exceptions import NotFound, PermissionDenied, ValidationError
+from rest_framework.permissions import SAFE_METHODS, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from groups_courses.models import GroupMember
-from groups_courses.permissions import can_post, check_group_admin
-from . import models, serializers
+from Backend.async_views import AsyncListAPIView
+from Backend.pagination import KeysetPagination
+from Backend.serializers import DynamicFieldsViewMixin, ValuesListMixin, wants_compact
+from Backend.streaming import StreamingListMixin
+from groups_courses.permissions import (
+    aensure_group_member, aget_group_policy_or_404, check_group_admin, ensure_group_member,
+    is_group_member, get_group_policy_or_404,
+)
+from . import models, serializers, uploads
+from .downloads import serve_material_file
+from .permissions import can_delete_material, ensure_can_post_material
+
+TITLE_TAKEN = "A material with this title already exists in this course."
 
 
 # Create your views here.
@@ -30,50 +46,340 @@ class CreateMaterialAPIView(generics.CreateAPIView):
     permission_classes = [IsAuthenticated,]
 
     def perform_create(self, serializer):
-        course = get_object_or_404(
-            models.Course.objects.select_related('group'),
-            id=self.kwargs.get('course_id')
+        course = get_object_or_404(models.Course, id=self.kwargs.get('course_id'))
+        ensure_can_post_material(self.request, course)
+        try:
+            serializer.save(owner=self.request.user, course=course)
+        except IntegrityError:
+            raise ValidationError(
+                {"detail": "Either a file or a URL is required."},
+                code=status.HTTP_400_BAD_REQUEST
             )
-        if can_post(self.request.user, course.group):
+
+
+class BulkCreateMaterialAPIView(APIView):
+    """
+    API view for creating many materials in one request.
+
+    Permissions are checked once, then every item is validated on its own
+    and the valid ones are inserted with `bulk_create` in one transaction.
+    Invalid items are reported by index without failing the batch.
+
+    Endpoint: `/api/course/<course_id>/materials/bulk/`
+    Method: POST
+    Permissions: IsAuthenticated (User must be allowed to post in the course group)
+
+    Data is sent as JSON, or as multipart with `materials` holding the JSON
+    list and every file in its own field, referenced by name from the item:
+    ```
+    {
+        "materials": [
+            {"title": "Intro", "type": "url", "url": "https://youtu.be/xxxxxx", "labels": [{"label": label_id, "number": 1}]},
+            {"title": "Slides", "type": "document", "file": "<name of the multipart file field>"}
+        ]
+    }
+    ```
+    Returns 201 when every item was created, 207 when only some were and 400 when none were:
+    ```
+    {
+        "created": [{material}, ...],
+        "errors": [{"index": 1, "errors": {...}}]
+    }
+    ```
+    Returns 409 when a material with one of the titles was created
+    concurrently, nothing is created then.
+    """
+    permission_classes = [IsAuthenticated,]
+    max_items = 200
+
+    def _get_items(self, request):
+        items = request.data.get('materials')
+        if isinstance(items, str):
             try:
-                serializer.save(owner=self.request.user, course=course)
-            except IntegrityError:
-                raise ValidationError(
-                    {"detail": "Either a file or a URL is required."},
-                    code=status.HTTP_400_BAD_REQUEST
-                )
+                items = json.loads(items)
+            except ValueError:
+                items = None
+        if not isinstance(items, list) or not items:
+            raise ValidationError(
+                {"detail": "materials must be a non empty list."},
+                code=status.HTTP_400_BAD_REQUEST
+            )
+        if len(items) > self.max_items:
+            raise ValidationError(
+                {"detail": f"At most {self.max_items} materials can be created at once."},
+                code=status.HTTP_400_BAD_REQUEST
+            )
+        return items
+
+    def _resolve_files(self, request, item):
+        """
+        Replace the name of the file field in `item` with the uploaded file
+        """
+        item = dict(item) if isinstance(item, dict) else {}
+        name = item.get('file')
+        if isinstance(name, str) and name:
+            item['file'] = request.FILES.get(name)
+            if item['file'] is None:
+                return item, {"file": [f"No file was uploaded as {name}."]}
+        return item, None
+
+    def _get_labels(self, items, group_id):
+        label_ids = set()
+        for item in items:
+            labels = item.get('labels') if isinstance(item, dict) else None
+            if not isinstance(labels, list):
+                continue
+            for label in labels:
+                try:
+                    label_ids.add(uuid.UUID(str(label.get('label'))))
+                except (AttributeError, ValueError):
+                    # reported by the item serializer
+                    continue
+        if not label_ids:
+            return {}
+        return {label.id: label for label in models.Label.objects.filter(group_id=group_id, id__in=label_ids)}
+
+    def _taken_titles(self, course, titles):
+        # titles are unique per course, check them with one query
+        return set(models.Material.objects.filter(course=course, title__in=titles).values_list('title', flat=True))
+
+    def post(self, request, course_id):
+        course = get_object_or_404(models.Course, id=course_id)
+        ensure_can_post_material(request, course)
+
+        items = self._get_items(request)
+        context = {'request': request, 'labels': self._get_labels(items, course.group_id)}
+
+        errors = []
+        valid = []
+        for index, item in enumerate(items):
+            item, error = self._resolve_files(request, item)
+            serializer = serializers.BulkMaterialItemSerializer(data=item, context=context)
+            if error is None and serializer.is_valid():
+                valid.append((index, serializer.validated_data))
+            else:
+                errors.append({"index": index, "errors": error or serializer.errors})
+
+        taken = self._taken_titles(course, [data['title'] for _, data in valid])
+        indexes = []
+        materials = []
+        material_labels = []
+        for index, data in valid:
+            if data['title'] in taken:
+                errors.append({"index": index, "errors": {"title": [TITLE_TAKEN]}})
+                continue
+            taken.add(data['title'])
+            labels = data.pop('labels', [])
+            material = models.Material(owner=request.user, course=course, **data)
+            indexes.append(index)
+            materials.append(material)
+            material_labels.extend(
+                models.MaterialLabel(material=material, label_id=label['label'], number=label['number'])
+                for label in labels
+            )
+
+        try:
+            with transaction.atomic():
+                if models.content_addressed_storage():
+                    for material in materials:
+                        if material.file:
+                            material.attach_blob(models.Blob.objects.acquire(material.file))
+                models.Material.objects.bulk_create(materials)
+                models.MaterialLabel.objects.bulk_create(material_labels)
+        except IntegrityError:
+            # a material with one of the titles was created since they were checked
+            models.Blob.objects.delete_orphan_files(material.file.name for material in materials if material.blob_id)
+            # in path mode the files were written by bulk_create before the insert failed
+            for material in materials:
+                if not material.blob_id and material.file and material.file._committed:
+                    material.file.storage.delete(material.file.name)
+            taken = self._taken_titles(course, [material.title for material in materials])
+            errors.extend(
+                {"index": index, "errors": {"title": [TITLE_TAKEN]}}
+                for index, material in zip(indexes, materials) if material.title in taken
+            )
+            errors.sort(key=lambda error: error['index'])
+            return Response({"created": [], "errors": errors}, status=status.HTTP_409_CONFLICT)
+
+        errors.sort(key=lambda error: error['index'])
+        if not materials:
+            response_status = status.HTTP_400_BAD_REQUEST
+        elif errors:
+            response_status = status.HTTP_207_MULTI_STATUS
         else:
-            raise PermissionDenied(
-                {"detail": "You do not have permission to post materials in this course."},
-                code=status.HTTP_403_FORBIDDEN
+            response_status = status.HTTP_201_CREATED
+        return Response({
+            "created": serializers.MaterialSerializer(materials, many=True, context={'request': request}).data,
+            "errors": errors,
+        }, status=response_status)
+
+
+class UploadSessionCreateAPIView(APIView):
+    """
+    API view for starting a resumable chunked upload of a material file.
+
+    The file is then sent in chunks of `chunk_size` bytes with
+    `PUT /api/uploads/<upload_id>/chunks/<index>/` and attached to a new
+    material with `POST /api/uploads/<upload_id>/complete/`.
+
+    A user has at most `MATERIAL_UPLOAD_MAX_SESSIONS` uploads in progress,
+    their expired sessions are deleted here.
+
+    Endpoint: `/api/course/<course_id>/materials/uploads/`
+    Method: POST
+    Permissions: IsAuthenticated (User must be allowed to post in the course group)
+    """
+    permission_classes = [IsAuthenticated,]
+
+    def post(self, request, course_id):
+        course = get_object_or_404(models.Course, id=course_id)
+        ensure_can_post_material(request, course)
+
+        serializer = serializers.CreateUploadSessionSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        if models.Material.objects.filter(course=course, title=serializer.validated_data['title']).exists():
+            raise ValidationError(
+                {"detail": TITLE_TAKEN},
+                code=status.HTTP_400_BAD_REQUEST
             )
+        uploads.check_session_quota(request.user)
+
+        session = serializer.save(owner=request.user, course=course, chunk_size=uploads.get_chunk_size())
+        uploads.start_upload(session)
+        return Response(serializers.UploadSessionSerializer(session).data, status=status.HTTP_201_CREATED)
+
 
-class MaterialListAPIView(generics.ListAPIView):  
+class UploadSessionMixin:
+    def get_session(self, request, upload_id):
+        return get_object_or_404(
+            models.UploadSession.objects.select_related('course'),
+            id=upload_id, owner=request.user, created_at__gt=uploads.expired_before()
+        )
+
+
+class UploadSessionDetailAPIView(UploadSessionMixin, APIView):
+    """
+    API view for resuming or aborting a chunked upload.
+
+    GET returns the session with the indexes of the chunks received so far,
+    so the client only resends the missing ones.
+
+    Endpoint: `/api/uploads/<upload_id>/`
+    Method: GET, DELETE
+    Permissions: IsAuthenticated (User must own the upload)
     """
-    API view for listing materials.
+    permission_classes = [IsAuthenticated,]
+
+    def get(self, request, upload_id):
+        session = self.get_session(request, upload_id)
+        return Response(serializers.UploadSessionSerializer(session).data)
+
+    def delete(self, request, upload_id):
+        uploads.abort_upload(self.get_session(request, upload_id))
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class UploadChunkAPIView(UploadSessionMixin, APIView):
+    """
+    API view for uploading one chunk of a file.
+
+    The request body is the raw chunk, every chunk but the last one must be
+    exactly `chunk_size` bytes. The optional `X-Chunk-SHA256` header is
+    checked against the received bytes. Sending a chunk again replaces it.
+
+    Endpoint: `/api/uploads/<upload_id>/chunks/<index>/`
+    Method: PUT
+    Permissions: IsAuthenticated (User must own the upload)
+    """
+    permission_classes = [IsAuthenticated,]
+
+    def put(self, request, upload_id, index):
+        session = self.get_session(request, upload_id)
+        chunk = uploads.write_chunk(
+            session, index, request.stream or io.BytesIO(),
+            expected_sha256=request.headers.get('X-Chunk-SHA256'),
+        )
+        return Response({"index": chunk.index, "size": chunk.size, "sha256": chunk.sha256})
+
+
+class UploadSessionCompleteAPIView(UploadSessionMixin, APIView):
+    """
+    API view for finishing a chunked upload.
+
+    Creates the material with the uploaded file and returns it along with
+    the checksum of the upload.
+
+    Endpoint: `/api/uploads/<upload_id>/complete/`
+    Method: POST
+    Permissions: IsAuthenticated (User must own the upload and be allowed to post in the course group)
+    """
+    permission_classes = [IsAuthenticated,]
+
+    def post(self, request, upload_id):
+        session = self.get_session(request, upload_id)
+        ensure_can_post_material(request, session.course)
+        material, checksum = uploads.complete_upload(session)
+        data = serializers.MaterialSerializer(material, context={'request': request}).data
+        data['checksum'] = checksum
+        return Response(data, status=status.HTTP_201_CREATED)
+
+
+class MaterialListAPIView(ValuesListMixin, StreamingListMixin, AsyncListAPIView):
+    """
+    API view for listing materials, served with the async ORM.
 
     Endpoint: `/api/course/<course_id>/materials/`
     Method: GET
     Permissions: IsAuthenticated (User must be authenticated)
     """
-    serializer_class = serializers.MaterialSerializer
+    serializer_class = serializers.MaterialValuesSerializer
     permission_classes = [IsAuthenticated,]
+    pagination_class = KeysetPagination
+    permission_message = {"detail": "You do not have permission to view materials in this course."}
 
     def get_queryset(self):
         course_id = self.kwargs.get('course_id')
         # Retrieve the course, or 404 if not found.
-        course = get_object_or_404(models.Course.objects.select_related('group'), id=course_id)
-        # Assume the Course model has a related `group` field.
-        # If course.group is a queryset, you may need to adjust accordingly.
-        if course.group.owner == self.request.user or GroupMember.objects.filter(user=self.request.user, group=course.group).exists():
-            return models.Material.objects.filter(course=course)
-        else:  
-            raise PermissionDenied(
-                {"detail": "You do not have permission to view materials in this course."},
-                code=status.HTTP_403_FORBIDDEN
-            )
-        
-class MaterialDestroyUpdateAPIView(generics.RetrieveUpdateDestroyAPIView):
+        course = get_object_or_404(models.Course.objects.only('id', 'group_id'), id=course_id)
+        ensure_group_member(self.request, get_group_policy_or_404(course.group_id), message=self.permission_message)
+        return models.Material.objects.filter(course=course)
+
+    async def aget_queryset(self):
+        course = await models.Course.objects.only('id', 'group_id').filter(id=self.kwargs.get('course_id')).afirst()
+        if course is None:
+            raise Http404("No Course matches the given query.")
+        await aensure_group_member(
+            self.request, await aget_group_policy_or_404(course.group_id), message=self.permission_message
+        )
+        return models.Material.objects.filter(course=course)
+
+class MaterialDownloadAPIView(APIView):
+    """
+    API view for downloading the file of a material.
+
+    Access is checked once against the course group, then the file is
+    handed to the front server (`MATERIAL_DOWNLOAD_ACCEL`) or streamed.
+    Supports `Range`/`If-Range`, `ETag`/`If-None-Match` and
+    `Last-Modified`/`If-Modified-Since`.
+
+    Endpoint: `/api/materials/<material_id>/download/`
+    Method: GET
+    Permissions: IsAuthenticated (User must be a member of the course group)
+    """
+    permission_classes = [IsAuthenticated,]
+
+    def get(self, request, material_id):
+        material = get_object_or_404(models.Material.objects.select_related('course'), id=material_id)
+        ensure_group_member(
+            request, get_group_policy_or_404(material.course.group_id),
+            message={"detail": "You do not have permission to view materials in this course."}
+        )
+        if not material.file:
+            raise NotFound({"detail": "This material has no file."})
+        return serve_material_file(request, material)
+
+
+class MaterialDestroyUpdateAPIView(DynamicFieldsViewMixin, generics.RetrieveUpdateDestroyAPIView):
     """
     API view for updating and deleting materials.
 
@@ -93,12 +399,15 @@ class MaterialDestroyUpdateAPIView(generics.RetrieveUpdateDestroyAPIView):
 
     def get_queryset(self):
         material_id = self.kwargs.get('material_id')
+        if self.request.method in SAFE_METHODS:
+            # the serializer loads what the requested fields need
+            return models.Material.objects.filter(id=material_id)
         return models.Material.objects.filter(id=material_id).select_related('owner', 'course__group').all()
         
     
 
     def perform_destroy(self, instance):
-        if instance.owner == self.request.user or can_delete_material(self.request.user, instance.course.group):
+        if can_delete_material(self.request, instance):
             instance.delete()
         else:
             raise PermissionDenied(
@@ -115,7 +424,7 @@ class MaterialDestroyUpdateAPIView(generics.RetrieveUpdateDestroyAPIView):
                 code=status.HTTP_403_FORBIDDEN
             )
     
-class ListCreateLabelAPIView(generics.ListCreateAPIView):
+class ListCreateLabelAPIView(DynamicFieldsViewMixin, generics.ListCreateAPIView):
     """
     API view for creating labels.
 
@@ -135,9 +444,9 @@ class ListCreateLabelAPIView(generics.ListCreateAPIView):
     
     def perform_create(self, serializer):
         group_id = self.kwargs.get('group_id')
-        group = get_object_or_404(models.Group, id=group_id)
-        if check_group_admin(self.request.user, group):
-            serializer.save(group=group)
+        group = get_group_policy_or_404(group_id)
+        if check_group_admin(self.request, group):
+            serializer.save(group_id=group.id)
         else:
             raise PermissionDenied(
                 {"detail": "You do not have permission to create labels in this group."},
@@ -152,7 +461,7 @@ class MaterialLabelsAPIView(APIView):
     The user must be authenticated to create a label.
 
     Endpoint: `/api/materials/<material_id>/labels/`
-    Method: GET, POST
+    Method: GET, PUT
     Permissions: IsAuthenticated (User must be authenticated)
 
     GET: Data is returned in the following format:  
@@ -168,7 +477,8 @@ class MaterialLabelsAPIView(APIView):
         }
     ]
     ```
-    POST: Data should be sent in the following format:
+    PUT: Replaces the labels of the material, labels left out are removed.
+    Data should be sent in the following format:
     ```
     {
         "labels": [
@@ -184,7 +494,7 @@ class MaterialLabelsAPIView(APIView):
     permission_classes = [IsAuthenticated,]
 
     def _user_material_permission(self, material):
-        if self.request.user != material.owner:
+        if self.request.user.pk != material.owner_id:
             raise PermissionDenied(
                 {"detail": "You do not have permission to add labels to this material."},
                 code=status.HTTP_403_FORBIDDEN
@@ -193,13 +503,56 @@ class MaterialLabelsAPIView(APIView):
     def get(self, request, material_id):
         material = get_object_or_404(models.Material, id=material_id)
         self._user_material_permission(material)
-        material_labels = models.MaterialLabel.objects.filter(material=material).prefetch_related('label').all()
-        
-        return Response(serializers.ViewMaterialLabelsSerializer(material_labels, many=True).data)
+        context = {'request': request}
+        material_labels = serializers.ViewMaterialLabelsSerializer(context=context).prepare_queryset(
+            models.MaterialLabel.objects.filter(material=material)
+        )
+        return Response(serializers.ViewMaterialLabelsSerializer(material_labels, many=True, context=context).data)
         
     
+    def _get_group_labels(self, material, items):
+        """
+        Fetch every label of the payload with one query, labels of other groups are left out
+        """
+        label_ids = {item['label'] for item in items}
+        if not label_ids:
+            return {}
+        labels = models.Label.objects.filter(id__in=label_ids, group_id=material.course.group_id)
+        return {label.id: label for label in labels}
+
+    def _replace_labels(self, material, items):
+        """
+        Apply the difference between the current labels and `items` with at
+        most one insert, one update and one delete
+        """
+        current = {
+            material_label.label_id: material_label
+            for material_label in models.MaterialLabel.objects.filter(material=material)
+        }
+        to_create = []
+        to_update = []
+        result = []
+        for item in items:
+            material_label = current.pop(item['label'], None)
+            if material_label is None:
+                material_label = models.MaterialLabel(material=material, label_id=item['label'], number=item['number'])
+                to_create.append(material_label)
+            elif material_label.number != item['number']:
+                material_label.number = item['number']
+                to_update.append(material_label)
+            result.append(material_label)
+
+        with transaction.atomic():
+            if to_create:
+                models.MaterialLabel.objects.bulk_create(to_create)
+            if to_update:
+                models.MaterialLabel.objects.bulk_update(to_update, ['number'])
+            if current:
+                models.MaterialLabel.objects.filter(id__in=[label.id for label in current.values()]).delete()
+        return result
+
     def put(self, request, material_id):
-        material = get_object_or_404(models.Material, id=material_id)
+        material = get_object_or_404(models.Material.objects.select_related('course'), id=material_id)
         self._user_material_permission(material)
 
         labels_data = request.data.get('labels', [])
@@ -207,21 +560,31 @@ class MaterialLabelsAPIView(APIView):
             material.labels.all().delete()
             return Response(status=status.HTTP_204_NO_CONTENT)
 
-        serializer = serializers.MaterialLabelSerializer(data=labels_data, many=True)
+        serializer = serializers.BulkMaterialLabelSerializer(data=labels_data, many=True)
         serializer.is_valid(raise_exception=True)
-        serializer.save(material=material)
+        items = serializers.check_material_labels(
+            serializer.validated_data, self._get_group_labels(material, serializer.validated_data)
+        )
+        material_labels = self._replace_labels(material, items)
 
-        return Response(serializer.data, status=status.HTTP_201_CREATED)
+        return Response(
+            serializers.MaterialLabelSerializer(material_labels, many=True).data,
+            status=status.HTTP_201_CREATED
+        )
 
 class MaterialLabelListAPIView(APIView):
     """
-    list materials by a given Label
+    list materials by a given Label, grouped by label number in ascending order
 
     Endpoint: `/api/course/<course_id>/materials/labels/<label_id>/`
 
     Method: GET
     Permissions: IsAuthenticated (User must be authenticated)
 
+    Query parameters (optional):
+        - number_min: only numbers greater than or equal to this value
+        - number_max: only numbers less than or equal to this value
+
     returns 
     ```
     {
@@ -246,29 +609,42 @@ class MaterialLabelListAPIView(APIView):
     """
     permission_classes = [IsAuthenticated,]
 
+    def get_queryset(self, course, label_id, filters):
+        # one row per material, the annotations reuse the join of the label filter
+        queryset = models.Material.objects.filter(course_id=course.id, labels__label_id=label_id).annotate(
+            label_number=F('labels__number'), label_name=F('labels__label__name'),
+        )
+        if 'number_min' in filters:
+            queryset = queryset.filter(label_number__gte=filters['number_min'])
+        if 'number_max' in filters:
+            queryset = queryset.filter(label_number__lte=filters['number_max'])
+        # served by the (label, number) index
+        queryset = queryset.order_by('label_number', 'created_at', 'id')
+        return serializers.MaterialListValuesSerializer.values(queryset, 'label_number', 'label_name')
+
     def get(self, request, course_id, label_id):
-        course = get_object_or_404(models.Course, id=course_id)
-        if course.group.owner == self.request.user or GroupMember.objects.filter(user=self.request.user, group=course.group).exists():
-            materials = models.MaterialLabel.objects.filter(label=label_id, material__course=course).select_related('material', 'label').all()
-            grouped_data = {}
-            label_name = materials[0].label.name if materials else ""
-            for material_label in materials:
-                label_index = material_label.number
-                if label_index not in grouped_data:
-                    grouped_data[label_index] = []
-                grouped_data[label_index].append({
-                    "material": serializers.MaterialListSerializer(material_label.material).data
-                })
-            return Response({
-                "label_name": label_name,
-                "materials": grouped_data
-            })
-        else:
+        course = get_object_or_404(models.Course.objects.only('id', 'group_id'), id=course_id)
+        if not is_group_member(request, get_group_policy_or_404(course.group_id)):
             raise PermissionDenied(
                 {"detail": "You do not have permission to view materials in this course."},
                 code=status.HTTP_403_FORBIDDEN
             )
 
+        filters = serializers.MaterialLabelFilterSerializer(data=request.query_params)
+        filters.is_valid(raise_exception=True)
+
+        rows = list(self.get_queryset(course, label_id, filters.validated_data))
+        materials = serializers.MaterialListValuesSerializer(rows, many=True).data
+
+        # rows arrive ordered by number, so each group is a contiguous run
+        grouped_data = {}
+        for row, material in zip(rows, materials):
+            grouped_data.setdefault(row['label_number'], []).append({"material": material})
+        return Response({
+            "label_name": rows[0]['label_name'] if rows else "",
+            "materials": grouped_data
+        })
+
 class CreateMaterialCommentsAPIView(generics.CreateAPIView):
     """
     API view for creating comments on material.
@@ -288,9 +664,9 @@ class CreateMaterialCommentsAPIView(generics.CreateAPIView):
     def perform_create(self, serializer):
         serializer.save(User=self.request.user)
 
-class MaterialCommentsListAPIView(generics.ListAPIView):
+class MaterialCommentsListAPIView(DynamicFieldsViewMixin, StreamingListMixin, AsyncListAPIView):
     """
-    API view for listing material comments.
+    API view for listing material comments, served with the async ORM.
 
     This view is used to list material comments.
     The user must be authenticated to view comments.
@@ -302,6 +678,8 @@ class MaterialCommentsListAPIView(generics.ListAPIView):
     serializer_class = serializers.MaterialCommentSerializer
     queryset = models.MaterialComment.objects.order_by('-CreatedAt')
     permission_classes = [IsAuthenticated,]
+    pagination_class = KeysetPagination
+    keyset_ordering = ('-CreatedAt', '-id')
 
     def get_queryset(self):
         material_id = self.kwargs.get('material_id')
@@ -326,7 +704,7 @@ class MaterialCommentsDestroyUpdateAPIView(generics.RetrieveUpdateDestroyAPIView
     lookup_field = 'id'
 
     def perform_destroy(self, instance):
-        if instance.User == self.request.user or instance.material.Owner == self.request.user:
+        if instance.User_id == self.request.user.pk or instance.material.owner_id == self.request.user.pk:
             instance.delete()
         else:
             raise PermissionDenied(
@@ -1,6 +1,45 @@
+from django.conf import settings
+from django.utils.translation import gettext_lazy as _
 from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .blacklist import blacklist_filter
+from .cache import AUTH_USER_FIELDS, build_user, user_cache
+
+# user fields copied into the tokens, used instead of the database in trusted claims mode
+USER_CLAIMS = ('email', 'username', 'is_staff', 'is_superuser')
+
+
+class UserRefreshToken(RefreshToken):
+    """
+    Refresh token carrying the `USER_CLAIMS` of the user, the access
+    tokens made from it get them too. The blacklist is only queried when
+    `users.blacklist.blacklist_filter` reports a possible match
+    """
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        for claim in USER_CLAIMS:
+            token[claim] = getattr(user, claim)
+        return token
+
+    def check_blacklist(self):
+        if blacklist_filter.might_contain(self.payload[api_settings.JTI_CLAIM]):
+            super().check_blacklist()
+
 
 class CookieJWTAuthentication(JWTAuthentication):
+    """
+    JWT authentication reading the access token from the `Authorization`
+    header or the `access_token` cookie.
+
+    Users are resolved through `users.cache.user_cache` instead of a query
+    per request. With `JWT_TRUST_CLAIMS` the user is built from the signed
+    claims of the token alone, so changes to the user (deactivation
+    included) only apply once the access token expires.
+    """
     def authenticate(self, request):
         # Try the standard header method first
         header = self.get_header(request)
@@ -15,5 +54,24 @@ class CookieJWTAuthentication(JWTAuthentication):
 
         validated_token = self.get_validated_token(raw_token)
         return self.get_user(validated_token), validated_token
-    
-    
+
+    def get_user(self, validated_token):
+        if api_settings.CHECK_REVOKE_TOKEN:
+            # the password hash is needed, it is never cached
+            return super().get_user(validated_token)
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        if getattr(settings, 'JWT_TRUST_CLAIMS', False) and all(claim in validated_token for claim in USER_CLAIMS):
+            claims = {claim: validated_token[claim] for claim in USER_CLAIMS}
+            claims.update(id=user_id, is_active=True)
+            return build_user(tuple(claims[field] for field in AUTH_USER_FIELDS))
+
+        user = user_cache.get_user(user_id)
+        if user is None:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        return user
@@ -0,0 +1,210 @@
+import hashlib
+import math
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+from django.db import close_old_connections
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+
+
+class BloomFilter:
+    """
+    Set membership with no false negatives and a false positive rate of
+    about `error_rate` while it holds at most `capacity` items
+    """
+    def __init__(self, capacity, error_rate):
+        capacity = max(capacity, 1)
+        self.capacity = capacity
+        self.size = max(int(-capacity * math.log(error_rate) / math.log(2) ** 2), 8)
+        self.hash_count = max(round(self.size / capacity * math.log(2)), 1)
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item):
+        # double hashing, the k positions come from the two halves of one digest
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:], 'little') | 1
+        return [(first + i * second) % self.size for i in range(self.hash_count)]
+
+    def add(self, item):
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+class BlacklistFilter:
+    """
+    Per-process Bloom filter of the blacklisted `jti` values.
+
+    The filter is filled from `BlacklistedToken` and kept in sync
+    incrementally: at most every `BLACKLIST_FILTER_SYNC_INTERVAL` seconds the
+    rows after the highest id seen are read. Ids are given at insert, not at
+    commit, so a slow transaction can commit a row below that id: every sync
+    reads the last `BLACKLIST_FILTER_SYNC_OVERLAP` ids again, skipping the
+    rows already added. Tokens blacklisted by this process are added right
+    away (see `users.signals`). A miss means the token is not blacklisted,
+    only a possible match needs the database to be checked.
+
+    Pruned rows cannot be removed from a Bloom filter, the filter is rebuilt
+    from the table every `BLACKLIST_FILTER_REBUILD_INTERVAL` seconds and as
+    soon as it holds more than its capacity, which is then doubled. Rebuilds
+    run in a background thread while the current filter keeps answering. The
+    first build runs in the request that needs it, outside the lock: the
+    requests arriving meanwhile check the database.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._filter = None
+        self._last_id = 0
+        # ids of the overlap window already added
+        self._recent_ids = set()
+        self._synced_at = 0.0
+        self._built_at = 0.0
+        # jti values added while a rebuild reads the table, None when not rebuilding
+        self._added_during_build = None
+
+    @property
+    def capacity(self):
+        return getattr(settings, 'BLACKLIST_FILTER_CAPACITY', 100_000)
+
+    @property
+    def error_rate(self):
+        return getattr(settings, 'BLACKLIST_FILTER_ERROR_RATE', 0.001)
+
+    @property
+    def sync_interval(self):
+        return getattr(settings, 'BLACKLIST_FILTER_SYNC_INTERVAL', 5)
+
+    @property
+    def sync_overlap(self):
+        return getattr(settings, 'BLACKLIST_FILTER_SYNC_OVERLAP', 1000)
+
+    @property
+    def rebuild_interval(self):
+        return getattr(settings, 'BLACKLIST_FILTER_REBUILD_INTERVAL', 3600)
+
+    def _rows(self, after=0):
+        return (
+            BlacklistedToken.objects.filter(id__gt=after)
+            .order_by('id').values_list('id', 'token__jti').iterator()
+        )
+
+    def _load(self):
+        """
+        Read the whole table into a new filter, without holding the lock
+        """
+        capacity = self.capacity
+        total = BlacklistedToken.objects.count()
+        while total > capacity:
+            capacity *= 2
+        bloom = BloomFilter(capacity, self.error_rate)
+        last_ids = deque(maxlen=self.sync_overlap)
+        for row_id, jti in self._rows():
+            bloom.add(jti)
+            last_ids.append(row_id)
+        return bloom, last_ids
+
+    def _build(self):
+        """
+        Replace the filter with one read from the table. The caller has set
+        `_added_during_build`, so that no other build starts meanwhile.
+        """
+        try:
+            bloom, last_ids = self._load()
+            now = time.monotonic()
+            with self._lock:
+                for jti in self._added_during_build:
+                    bloom.add(jti)
+                self._filter = bloom
+                self._last_id = last_ids[-1] if last_ids else 0
+                self._recent_ids = set(last_ids)
+                self._built_at = self._synced_at = now
+        finally:
+            with self._lock:
+                self._added_during_build = None
+
+    def _rebuild_in_background(self):
+        try:
+            self._build()
+        finally:
+            # the thread serves no request, nothing else closes its connection
+            close_old_connections()
+
+    def _start_rebuild(self):
+        # called with the lock held
+        if self._added_during_build is None:
+            self._added_during_build = []
+            threading.Thread(target=self._rebuild_in_background, name='blacklist-filter', daemon=True).start()
+
+    def _sync(self, now):
+        # called with the lock held
+        for row_id, jti in self._rows(self._last_id - self.sync_overlap):
+            if row_id in self._recent_ids:
+                continue
+            self._filter.add(jti)
+            self._recent_ids.add(row_id)
+            self._last_id = max(self._last_id, row_id)
+        low = self._last_id - self.sync_overlap
+        self._recent_ids = {row_id for row_id in self._recent_ids if row_id > low}
+        self._synced_at = now
+        if self._filter.count > self._filter.capacity:
+            self._start_rebuild()
+
+    def _current(self):
+        """
+        The filter, brought up to date when it is due, or None while the
+        first one is being built
+        """
+        now = time.monotonic()
+        with self._lock:
+            if self._filter is None:
+                if self._added_during_build is not None:
+                    return None
+                self._added_during_build = []
+            else:
+                if now - self._built_at >= self.rebuild_interval:
+                    self._start_rebuild()
+                if now - self._synced_at >= self.sync_interval:
+                    self._sync(now)
+                return self._filter
+        self._build()
+        return self._filter
+
+    def refresh(self):
+        """
+        Build the filter, or bring it up to date when it is due
+        """
+        self._current()
+
+    def add(self, jti):
+        with self._lock:
+            if self._filter is not None:
+                self._filter.add(jti)
+            if self._added_during_build is not None:
+                self._added_during_build.append(jti)
+
+    def might_contain(self, jti):
+        """
+        Return False if the token is surely not blacklisted
+        """
+        bloom = self._current()
+        if bloom is None:
+            return True
+        with self._lock:
+            return jti in bloom
+
+    def clear(self):
+        with self._lock:
+            self._filter = None
+            self._last_id = 0
+            self._recent_ids = set()
+            self._added_during_build = None
+
+
+blacklist_filter = BlacklistFilter()
@@ -0,0 +1,143 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS
+
+from .models import User
+
+# the fields loaded for an authenticated user, the others are deferred
+AUTH_USER_FIELDS = ('id', 'email', 'username', 'is_active', 'is_staff', 'is_superuser')
+
+# stored for ids without a user, so lookups of deleted users are cached too
+MISSING = ()
+
+
+def build_user(values):
+    """
+    Build a User from the `AUTH_USER_FIELDS` values without a query, the
+    other fields are loaded on first access like with `.only()`
+    """
+    values = dict(zip(AUTH_USER_FIELDS, values))
+    values['id'] = User._meta.pk.to_python(values['id'])
+    # from_db takes the loaded values in the order of the model fields
+    fields = [field.attname for field in User._meta.concrete_fields if field.attname in values]
+    return User.from_db(DEFAULT_DB_ALIAS, fields, [values[name] for name in fields])
+
+
+class UserCache:
+    """
+    Cache of the users resolved by `CookieJWTAuthentication`, keyed by id.
+
+    Entries are kept in an in-process LRU of `USER_CACHE_SIZE` entries for
+    `USER_CACHE_TIMEOUT` seconds. When `USER_CACHE_ALIAS` names a Django
+    cache, it is checked on a local miss, so processes share their lookups.
+    The `post_save`/`post_delete` receivers in `users.signals` invalidate an
+    entry locally and in the shared cache; other processes keep their local
+    copy until it expires, so the timeout bounds how long a deactivated user
+    can still be seen as active there.
+    """
+    KEY_PREFIX = 'auth_user'
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def size(self):
+        return getattr(settings, 'USER_CACHE_SIZE', 1024)
+
+    @property
+    def timeout(self):
+        return getattr(settings, 'USER_CACHE_TIMEOUT', 60)
+
+    @property
+    def shared_cache(self):
+        alias = getattr(settings, 'USER_CACHE_ALIAS', None)
+        return caches[alias] if alias else None
+
+    def key(self, user_id):
+        return f'{self.KEY_PREFIX}:{user_id}'
+
+    def _get_local(self, user_id):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            values, expires = entry
+            if expires <= time.monotonic():
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            return values
+
+    def _set_local(self, user_id, values):
+        with self._lock:
+            self._entries[user_id] = (values, time.monotonic() + self.timeout)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def _load(self, user_id):
+        shared = self.shared_cache
+        if shared is not None:
+            values = shared.get(self.key(user_id))
+            if values is not None:
+                return values
+        row = User.objects.filter(id=user_id).values_list(*AUTH_USER_FIELDS).first()
+        values = tuple(row) if row is not None else MISSING
+        if shared is not None:
+            shared.set(self.key(user_id), values, self.timeout)
+        return values
+
+    def get_user(self, user_id):
+        """
+        Return the User with the given id, or None if there is none
+        """
+        # token claims hold the id as a string, signals as a UUID
+        user_id = str(user_id)
+        values = self._get_local(user_id)
+        if values is None:
+            with self._lock:
+                self.misses += 1
+            values = self._load(user_id)
+            self._set_local(user_id, values)
+        return build_user(values) if values else None
+
+    def invalidate(self, user_id):
+        user_id = str(user_id)
+        with self._lock:
+            self._entries.pop(user_id, None)
+        shared = self.shared_cache
+        if shared is not None:
+            shared.delete(self.key(user_id))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """
+        Return the hit and miss counters of the local cache of this process
+        """
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        total = hits + misses
+        return {
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': hits / total if total else 0.0,
+        }
+
+    def reset_stats(self):
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+
+
+user_cache = UserCache()
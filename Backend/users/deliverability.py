@@ -0,0 +1,155 @@
+import asyncio
+import threading
+from concurrent.futures import Future
+from types import SimpleNamespace
+
+import dns.resolver
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.module_loading import import_string
+from email_validator import EmailUndeliverableError
+from email_validator.deliverability import validate_email_deliverability
+
+# cached for deliverable domains, undeliverable ones cache their error message
+DELIVERABLE = ''
+
+
+class StubResolver:
+    """
+    Local resolver answering from `EMAIL_DNS_STUB_RECORDS`, a mapping of
+    domain names to their MX hosts, for tests and offline development.
+    Other domains do not exist.
+    """
+    def __init__(self, records=None):
+        self.records = records if records is not None else getattr(settings, 'EMAIL_DNS_STUB_RECORDS', {})
+
+    def resolve(self, domain, rdtype):
+        if domain not in self.records:
+            raise dns.resolver.NXDOMAIN
+        if rdtype != 'MX' or not self.records[domain]:
+            raise dns.resolver.NoAnswer
+        return [
+            SimpleNamespace(preference=(i + 1) * 10, exchange=f'{host}.')
+            for i, host in enumerate(self.records[domain])
+        ]
+
+
+class DeliverabilityChecker:
+    """
+    Cached DNS deliverability checks of the email domains (`email_validator`
+    MX lookups, with the A/AAAA fallback).
+
+    Results are cached per domain in the `EMAIL_DELIVERABILITY_CACHE_ALIAS`
+    cache, deliverable domains for `EMAIL_DELIVERABILITY_CACHE_TIMEOUT`
+    seconds and undeliverable ones for
+    `EMAIL_DELIVERABILITY_NEGATIVE_CACHE_TIMEOUT` seconds, so registrations
+    from the usual university domains skip DNS altogether. Concurrent checks
+    of one domain share a single lookup, at most `EMAIL_DNS_CONCURRENCY`
+    lookups run at a time, and a check takes at most `EMAIL_DNS_TIMEOUT`
+    seconds. Like `email_validator`, a domain that cannot be checked in time
+    is let through, and that outcome is not cached.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self._slots = None
+        self._resolver = None
+
+    @property
+    def cache(self):
+        return caches[getattr(settings, 'EMAIL_DELIVERABILITY_CACHE_ALIAS', 'default')]
+
+    @property
+    def timeout(self):
+        return getattr(settings, 'EMAIL_DNS_TIMEOUT', 3)
+
+    def key(self, domain):
+        return f'email_domain:{domain}'
+
+    def get_resolver(self):
+        if self._resolver is None:
+            path = getattr(settings, 'EMAIL_DNS_RESOLVER', None)
+            if path:
+                self._resolver = import_string(path)()
+            else:
+                self._resolver = dns.resolver.Resolver()
+                self._resolver.lifetime = self.timeout
+        return self._resolver
+
+    def _get_slots(self):
+        with self._lock:
+            if self._slots is None:
+                self._slots = threading.BoundedSemaphore(getattr(settings, 'EMAIL_DNS_CONCURRENCY', 8))
+            return self._slots
+
+    def _resolve(self, domain, domain_i18n):
+        slots = self._get_slots()
+        if not slots.acquire(timeout=self.timeout):
+            return None
+        try:
+            info = validate_email_deliverability(domain, domain_i18n, dns_resolver=self.get_resolver())
+        except EmailUndeliverableError as e:
+            self.cache.set(self.key(domain), str(e), getattr(settings, 'EMAIL_DELIVERABILITY_NEGATIVE_CACHE_TIMEOUT', 3600))
+            return str(e)
+        finally:
+            slots.release()
+        if 'unknown-deliverability' in info:
+            return None
+        self.cache.set(self.key(domain), DELIVERABLE, getattr(settings, 'EMAIL_DELIVERABILITY_CACHE_TIMEOUT', 86400))
+        return DELIVERABLE
+
+    def _lookup(self, domain, domain_i18n):
+        # one lookup per domain at a time, the other threads wait for its result
+        with self._lock:
+            future = self._inflight.get(domain)
+            owner = future is None
+            if owner:
+                future = self._inflight[domain] = Future()
+        if not owner:
+            try:
+                return future.result(timeout=self.timeout)
+            except TimeoutError:
+                return None
+        try:
+            result = self._resolve(domain, domain_i18n)
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[domain]
+
+    def _raise_for(self, result):
+        if result:
+            raise EmailUndeliverableError(result)
+
+    def check(self, domain, domain_i18n=None):
+        """
+        Raise `EmailUndeliverableError` if the domain does not accept email
+        """
+        result = self.cache.get(self.key(domain))
+        if result is None:
+            result = self._lookup(domain, domain_i18n or domain)
+        self._raise_for(result)
+
+    async def acheck(self, domain, domain_i18n=None):
+        result = await self.cache.aget(self.key(domain))
+        if result is None:
+            # the lookup blocks, it runs in a thread of its own
+            lookup = sync_to_async(self._lookup, thread_sensitive=False)
+            try:
+                result = await asyncio.wait_for(lookup(domain, domain_i18n or domain), self.timeout)
+            except TimeoutError:
+                result = None
+        self._raise_for(result)
+
+    def clear(self):
+        with self._lock:
+            self._resolver = None
+            self._slots = None
+
+
+deliverability_checker = DeliverabilityChecker()
@@ -0,0 +1,77 @@
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import authenticate
+from django.db import close_old_connections
+from django.utils.translation import gettext as _
+from rest_framework.exceptions import Throttled
+
+
+class PasswordHashingPool:
+    """
+    Bounded thread pool running the password hashing of the async login and
+    registration views.
+
+    PBKDF2 holds a thread for a few hundred ms. At most
+    `PASSWORD_HASHING_WORKERS` hashes run at a time and
+    `PASSWORD_HASHING_QUEUE_SIZE` more can wait for a worker, past that
+    `run()` raises `Throttled` (429) right away instead of queueing, so a
+    login storm cannot take the threads and connections of the rest of the API.
+    With `PASSWORD_HASHING_WORKERS = 0` the work runs in the thread of the
+    sync views (`sync_to_async`), as `django.contrib.auth.aauthenticate` does.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._executor = None
+        self.pending = 0
+
+    @property
+    def workers(self):
+        return getattr(settings, 'PASSWORD_HASHING_WORKERS', 4)
+
+    @property
+    def queue_size(self):
+        return getattr(settings, 'PASSWORD_HASHING_QUEUE_SIZE', 16)
+
+    def _get_executor(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='password-hashing')
+        return self._executor
+
+    async def run(self, func, *args):
+        with self._lock:
+            if self.pending >= self.workers + self.queue_size:
+                raise Throttled(wait=1, detail=_('Too many sign-in attempts in progress, try again shortly.'))
+            self.pending += 1
+            executor = self._get_executor() if self.workers else None
+        try:
+            if executor is None:
+                return await sync_to_async(func)(*args)
+            return await asyncio.get_running_loop().run_in_executor(executor, functools.partial(func, *args))
+        finally:
+            with self._lock:
+                self.pending -= 1
+
+
+password_pool = PasswordHashingPool()
+
+
+def _authenticate(request, credentials):
+    try:
+        return authenticate(request, **credentials)
+    finally:
+        # the workers serve no request, nothing else closes their connections
+        close_old_connections()
+
+
+async def aauthenticate(request=None, **credentials):
+    """
+    `authenticate()` run in `password_pool`: the `AUTHENTICATION_BACKENDS`
+    and `user_login_failed` behave as usual, only the hashing done by the
+    backends is moved off the event loop
+    """
+    return await password_pool.run(_authenticate, request, credentials)
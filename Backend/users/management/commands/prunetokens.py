@@ -0,0 +1,44 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.utils import aware_utcnow
+
+
+class Command(BaseCommand):
+    help = (
+        'Delete the expired outstanding tokens and their blacklist entries in batches, '
+        'meant to be scheduled (cron, systemd timer)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=settings.TOKEN_PRUNE_BATCH_SIZE,
+            help='tokens deleted per statement',
+        )
+        parser.add_argument(
+            '--sleep', type=float, default=0,
+            help='seconds to wait between batches, to leave room for other queries',
+        )
+
+    def handle(self, *args, **options):
+        batch_size, pause = options['batch_size'], options['sleep']
+        # tokens expiring during the run are left for the next one
+        now = aware_utcnow()
+        expired = OutstandingToken.objects.filter(expires_at__lte=now).order_by('id')
+        outstanding = blacklisted = 0
+        last_id = 0
+        while True:
+            ids = list(expired.filter(id__gt=last_id).values_list('id', flat=True)[:batch_size])
+            if not ids:
+                break
+            last_id = ids[-1]
+            # short transactions, so the tables are never locked for long
+            with transaction.atomic():
+                blacklisted += BlacklistedToken.objects.filter(token_id__in=ids).delete()[0]
+                outstanding += OutstandingToken.objects.filter(id__in=ids).delete()[0]
+            if pause:
+                time.sleep(pause)
+        self.stdout.write(f'Deleted {outstanding} expired tokens and {blacklisted} blacklist entries')
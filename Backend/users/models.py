@@ -7,12 +7,16 @@ class CustomUserManager(BaseUserManager):
     """
     The create_user method is used to create a regular user with basic authentication functionality.
     """
-    def create_user(self, email, username, password, **extra_fields):
+    def create_user(self, email, username, password, password_hash=None, **extra_fields):
         if not email:
             raise ValueError('The Email field must be set')
         email = self.normalize_email(email)
         user = self.model(username=username, email=email, **extra_fields)
-        user.set_password(password)
+        if password_hash is not None:
+            # already made with make_password(password)
+            user.password = password_hash
+        else:
+            user.set_password(password)
         user.save(using=self._db)
 
         
@@ -1,8 +1,8 @@
 from django.contrib.auth.password_validation import validate_password
 import email_validator
 from rest_framework import serializers
+from .deliverability import deliverability_checker
 from .models import User, Profile 
-from django.contrib.auth import authenticate
 
 
 class UserRegisterSerializer(serializers.ModelSerializer):
@@ -22,15 +22,31 @@ class UserRegisterSerializer(serializers.ModelSerializer):
           raise serializers.ValidationError({'password': 'Passwords must match.'})
         
         try:
-            email_validator.validate_email(data['email'], check_deliverability=True) 
+            email = email_validator.validate_email(data['email'], check_deliverability=False)
+            # async views check it afterwards with `avalidate_deliverability`
+            if self.context.get('check_deliverability', True):
+                deliverability_checker.check(email.ascii_domain, email.domain)
         except email_validator.EmailNotValidError as e:
             raise serializers.ValidationError({"email": str(e)})
         return data
 
+    async def avalidate_deliverability(self):
+        """
+        Check that the domain of the validated email accepts email, without
+        blocking the event loop
+        """
+        email = email_validator.validate_email(self.validated_data['email'], check_deliverability=False)
+        try:
+            await deliverability_checker.acheck(email.ascii_domain, email.domain)
+        except email_validator.EmailNotValidError as e:
+            raise serializers.ValidationError({"email": str(e)})
+
     def create(self, validated_data):
         validated_data.pop('confirm_password')
+        # hashed beforehand by the view, off the request thread
+        password_hash = validated_data.pop('password_hash', None)
         try:
-            user = User.objects.create_user(**validated_data)
+            user = User.objects.create_user(**validated_data, password_hash=password_hash)
             Profile.objects.create(user=user)
         except Exception as e:
             raise serializers.ValidationError({"error": str(e)})
@@ -47,13 +63,8 @@ class UserLoginSerializer(serializers.Serializer):
         if email is None or password is None:
             raise serializers.ValidationError("Must include 'email' and 'password'.")
 
-        # Authenticate the user using email and password
-        user = authenticate(email=email, password=password)
-
-        if user is None:
-            raise serializers.ValidationError("Invalid email and password combination.")
-
-        return user
+        # the credentials are checked by the view, see `users.hashing.aauthenticate`
+        return data
 
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
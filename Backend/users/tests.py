@@ -1,3 +1,286 @@
-from django.test import TestCase
+import io
+import time
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.signals import user_logged_in, user_login_failed
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase, APITransactionTestCase
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+
+from .authentication import UserRefreshToken
+from .blacklist import BloomFilter, blacklist_filter
+from .cache import user_cache
+from .deliverability import StubResolver, deliverability_checker
+from .hashing import password_pool
+from .models import User
+from .serializers import UserRegisterSerializer
+
+
+class CachedUserAuthenticationTests(APITestCase):
+    def setUp(self):
+        user_cache.clear()
+        self.addCleanup(user_cache.clear)
+        self.user = User.objects.create_user(email='testuser@example.com', username='testuser', password='password')
+        token = UserRefreshToken.for_user(self.user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.url = reverse('user_group_list')
+
+    def _user_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [query['sql'] for query in queries if 'FROM "users_user"' in query['sql']]
+
+    def test_user_is_queried_once(self):
+        self.assertEqual(len(self._user_queries()), 1)
+        self.assertEqual(self._user_queries(), [])
+
+    def test_deactivated_user_is_rejected(self):
+        self._user_queries()
+        self.user.is_active = False
+        self.user.save()
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deleted_user_is_rejected(self):
+        self._user_queries()
+        self.user.delete()
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    @override_settings(USER_CACHE_SIZE=1)
+    def test_least_recently_used_entry_is_evicted(self):
+        other = User.objects.create_user(email='otheruser@example.com', username='otheruser', password='password')
+        user_cache.get_user(self.user.pk)
+        user_cache.get_user(other.pk)
+        user_cache.reset_stats()
+        user_cache.get_user(other.pk)
+        user_cache.get_user(self.user.pk)
+        self.assertEqual(user_cache.stats()['hits'], 1)
+        self.assertEqual(user_cache.stats()['misses'], 1)
+
+    @override_settings(USER_CACHE_TIMEOUT=0)
+    def test_expired_entry_is_reloaded(self):
+        self.assertEqual(len(self._user_queries()), 1)
+        self.assertEqual(len(self._user_queries()), 1)
+
+    @override_settings(USER_CACHE_ALIAS='default')
+    def test_shared_cache(self):
+        self._user_queries()
+        user_cache.clear()
+        self.assertEqual(self._user_queries(), [])
+
+    @override_settings(JWT_TRUST_CLAIMS=True)
+    def test_trusted_claims_skip_the_database(self):
+        self.assertEqual(self._user_queries(), [])
+        with CaptureQueriesContext(connection):
+            response = self.client.get(self.url)
+        self.assertEqual(response.wsgi_request.user.pk, self.user.pk)
+        self.assertEqual(response.wsgi_request.user.username, 'testuser')
+
+
+class BlacklistFilterTests(APITestCase):
+    def setUp(self):
+        blacklist_filter.clear()
+        self.addCleanup(blacklist_filter.clear)
+        self.user = User.objects.create_user(email='testuser@example.com', username='testuser', password='password')
+        self.refresh = UserRefreshToken.for_user(self.user)
+        self.client.cookies['refresh_token'] = str(self.refresh)
+
+    def _verify(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse('token_verify'))
+        blacklist_queries = [query for query in queries if 'token_blacklist_blacklistedtoken' in query['sql']]
+        return response, blacklist_queries
+
+    def test_bloom_filter_has_no_false_negatives(self):
+        bloom = BloomFilter(1000, 0.01)
+        items = [f'jti-{i}' for i in range(1000)]
+        for item in items:
+            bloom.add(item)
+        self.assertTrue(all(item in bloom for item in items))
+        false_positives = sum(f'other-{i}' in bloom for i in range(10000))
+        self.assertLess(false_positives, 300)
+
+    def test_valid_token_skips_the_blacklist(self):
+        blacklist_filter.refresh()
+        response, queries = self._verify()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(queries, [])
+
+    def test_logged_out_token_is_rejected(self):
+        blacklist_filter.refresh()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.refresh.access_token}')
+        response = self.client.post(reverse('logout'))
+        self.assertEqual(response.status_code, status.HTTP_205_RESET_CONTENT)
+
+        self.client.cookies['refresh_token'] = str(self.refresh)
+        response, queries = self._verify()
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(len(queries), 1)
+
+    def test_tokens_blacklisted_elsewhere_are_synced(self):
+        blacklist_filter.refresh()
+        # bulk_create sends no signal, like a blacklist written by another process
+        outstanding = OutstandingToken.objects.get(jti=self.refresh['jti'])
+        BlacklistedToken.objects.bulk_create([BlacklistedToken(token=outstanding)])
+        with self.settings(BLACKLIST_FILTER_SYNC_INTERVAL=0):
+            response, _ = self._verify()
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_rows_committed_below_the_last_id_are_synced(self):
+        other = UserRefreshToken.for_user(self.user)
+        blacklist_filter.refresh()
+        BlacklistedToken.objects.bulk_create([BlacklistedToken(id=10, token=OutstandingToken.objects.get(jti=other['jti']))])
+        with self.settings(BLACKLIST_FILTER_SYNC_INTERVAL=0):
+            blacklist_filter.refresh()
+            # inserted before the row above by a slower transaction, committed after the sync
+            outstanding = OutstandingToken.objects.get(jti=self.refresh['jti'])
+            BlacklistedToken.objects.bulk_create([BlacklistedToken(id=5, token=outstanding)])
+            response, _ = self._verify()
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            blacklist_filter.refresh()
+        # the rows read again are not counted twice
+        self.assertEqual(blacklist_filter._filter.count, 2)
+
+    def test_rebuild_runs_in_the_background(self):
+        blacklist_filter.refresh()
+        with mock.patch('users.blacklist.threading.Thread') as thread, self.settings(BLACKLIST_FILTER_REBUILD_INTERVAL=0):
+            response, queries = self._verify()
+            self._verify()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(queries, [])
+        thread.assert_called_once()
+        thread.return_value.start.assert_called_once()
+
+        # tokens blacklisted while the table is read are kept by the new filter
+        blacklist_filter.add(self.refresh['jti'])
+        blacklist_filter._build()
+        self.assertTrue(blacklist_filter.might_contain(self.refresh['jti']))
+
+    def test_prune_expired_tokens(self):
+        expired = UserRefreshToken.for_user(self.user)
+        expired.blacklist()
+        OutstandingToken.objects.filter(jti=expired['jti']).update(expires_at=timezone.now() - timedelta(minutes=1))
+        call_command('prunetokens', batch_size=1, stdout=io.StringIO())
+        self.assertEqual(list(OutstandingToken.objects.values_list('jti', flat=True)), [self.refresh['jti']])
+        self.assertFalse(BlacklistedToken.objects.exists())
+
+
+class AsyncLoginRegisterTests(APITransactionTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='testuser@example.com', username='testuser', password='password')
+
+    def test_login(self):
+        response = self.client.post(reverse('login'), {'email': 'testuser@example.com', 'password': 'password'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['user'], self.user.id)
+        self.assertIn('access_token', response.cookies)
+
+    async def test_login_under_asgi(self):
+        response = await self.async_client.post(
+            reverse('login'), {'email': 'testuser@example.com', 'password': 'password'},
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_login_with_wrong_password(self):
+        response = self.client.post(reverse('login'), {'email': 'testuser@example.com', 'password': 'wrong'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('non_field_errors', response.data)
+
+    def test_login_with_unknown_email(self):
+        response = self.client.post(reverse('login'), {'email': 'nobody@example.com', 'password': 'password'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_login_sends_the_auth_signals(self):
+        failed, logged_in = [], []
+        user_login_failed.connect(lambda sender, credentials, **kwargs: failed.append(credentials['email']), weak=False, dispatch_uid='test_failed')
+        user_logged_in.connect(lambda sender, user, **kwargs: logged_in.append(user), weak=False, dispatch_uid='test_logged_in')
+        self.addCleanup(user_login_failed.disconnect, dispatch_uid='test_failed')
+        self.addCleanup(user_logged_in.disconnect, dispatch_uid='test_logged_in')
+
+        self.client.post(reverse('login'), {'email': 'testuser@example.com', 'password': 'wrong'})
+        self.client.post(reverse('login'), {'email': 'testuser@example.com', 'password': 'password'})
+        self.assertEqual(failed, ['testuser@example.com'])
+        self.assertEqual(logged_in, [self.user])
+        self.user.refresh_from_db()
+        self.assertIsNotNone(self.user.last_login)
+
+    def test_register_stores_a_usable_hash(self):
+        data = {
+            'email': 'newuser@example.com', 'username': 'newuser',
+            'password': 'a-long-passphrase', 'confirm_password': 'a-long-passphrase',
+        }
+        with override_settings(EMAIL_DNS_RESOLVER='users.deliverability.StubResolver',
+                               EMAIL_DNS_STUB_RECORDS={'example.com': ['mx.example.com']}):
+            deliverability_checker.clear()
+            response = self.client.post(reverse('register'), data)
+        deliverability_checker.clear()
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertTrue(User.objects.get(email='newuser@example.com').check_password('a-long-passphrase'))
+
+    @override_settings(PASSWORD_HASHING_WORKERS=1, PASSWORD_HASHING_QUEUE_SIZE=0)
+    def test_full_pool_is_throttled(self):
+        password_pool.pending = 1
+        self.addCleanup(setattr, password_pool, 'pending', 0)
+        response = self.client.post(reverse('login'), {'email': 'testuser@example.com', 'password': 'password'})
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertIn('Retry-After', response)
+
+
+class SlowResolver(StubResolver):
+    def resolve(self, domain, rdtype):
+        time.sleep(0.5)
+        return super().resolve(domain, rdtype)
+
+
+@override_settings(
+    EMAIL_DNS_RESOLVER='users.deliverability.StubResolver',
+    EMAIL_DNS_STUB_RECORDS={'uni.edu': ['mx1.uni.edu', 'mx2.uni.edu'], 'nomail.edu': []},
+)
+class EmailDeliverabilityTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        deliverability_checker.clear()
+        self.addCleanup(deliverability_checker.clear)
+
+    def _register(self, email, username):
+        data = {'email': email, 'username': username, 'password': 'a-long-passphrase', 'confirm_password': 'a-long-passphrase'}
+        return self.client.post(reverse('register'), data)
+
+    def test_domain_is_resolved_once(self):
+        with mock.patch.object(StubResolver, 'resolve', autospec=True, side_effect=StubResolver.resolve) as resolve:
+            self.assertEqual(self._register('first@uni.edu', 'first').status_code, status.HTTP_201_CREATED)
+            self.assertEqual(self._register('second@uni.edu', 'second').status_code, status.HTTP_201_CREATED)
+        self.assertEqual(resolve.call_count, 1)
+
+    def test_undeliverable_domains_are_rejected_and_cached(self):
+        with mock.patch.object(StubResolver, 'resolve', autospec=True, side_effect=StubResolver.resolve) as resolve:
+            for i in range(2):
+                response = self._register(f'student{i}@missing.edu', f'student{i}')
+                self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+                self.assertIn('email', response.data)
+        self.assertEqual(resolve.call_count, 1)
+        self.assertFalse(User.objects.exists())
+
+    def test_domain_without_mail_records_is_rejected(self):
+        self.assertEqual(self._register('student@nomail.edu', 'student').status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_serializer_checks_deliverability_without_a_view(self):
+        data = {'email': 'student@missing.edu', 'username': 'student', 'password': 'a-long-passphrase', 'confirm_password': 'a-long-passphrase'}
+        serializer = UserRegisterSerializer(data=data)
+        self.assertFalse(serializer.is_valid())
+        self.assertIn('email', serializer.errors)
+
+    @override_settings(EMAIL_DNS_RESOLVER='users.tests.SlowResolver', EMAIL_DNS_TIMEOUT=0.05)
+    def test_slow_lookup_is_let_through(self):
+        self.assertEqual(self._register('student@missing.edu', 'student').status_code, status.HTTP_201_CREATED)
@@ -1,27 +1,44 @@
+from asgiref.sync import sync_to_async
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.signals import user_logged_in
 from rest_framework import generics, status
 from rest_framework.response import Response
-from rest_framework_simplejwt.tokens import RefreshToken, TokenError
+from rest_framework_simplejwt.tokens import TokenError
+from Backend.async_views import AsyncAPIView, AsyncViewMixin
+from .authentication import UserRefreshToken
+from .hashing import aauthenticate, password_pool
 from . import serializers
+from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.settings import api_settings
 from rest_framework.views import APIView
 import logging 
 
 
 # Create your views here.
 
-class RegisterView(generics.CreateAPIView):
+class RegisterView(AsyncViewMixin, generics.GenericAPIView):
+    """
+    Async, the password is hashed in `password_pool` (429 when it is full)
+    """
     serializer_class = serializers.UserRegisterSerializer
     permission_classes = (AllowAny,)
     authentication_classes = []
 
-    def create(self, request, *args, **kwargs):
+    def get_serializer_context(self):
+        # checked by `post` without holding a thread
+        return {**super().get_serializer_context(), 'check_deliverability': False}
+
+    async def post(self, request, *args, **kwargs):
         # Validate and create the new user
         serializer = self.get_serializer(data=request.data)
-        serializer.is_valid(raise_exception=True)
-        user = serializer.save()
+        await sync_to_async(serializer.is_valid)(raise_exception=True)
+        await serializer.avalidate_deliverability()
+        password_hash = await password_pool.run(make_password, serializer.validated_data['password'])
+        user = await sync_to_async(serializer.save)(password_hash=password_hash)
 
         # Generate token pair for the newly created user
-        refresh = RefreshToken.for_user(user)
+        refresh = await sync_to_async(UserRefreshToken.for_user)(user)
         access_token = str(refresh.access_token)
         refresh_token = str(refresh)
 
@@ -47,15 +64,23 @@ class RegisterView(generics.CreateAPIView):
         )
         return response
 
-class LoginView(APIView):
+class LoginView(AsyncAPIView):
+    """
+    Async, the password is checked in `password_pool` (429 when it is full)
+    """
     permission_classes = (AllowAny,)
     authentication_classes = []
 
-    def post(self, request):
+    async def post(self, request):
         serializer = serializers.UserLoginSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        user = serializer.validated_data
-        refresh = RefreshToken.for_user(user)
+        user = await aauthenticate(request, **serializer.validated_data)
+        if user is None:
+            raise ValidationError(
+                {api_settings.NON_FIELD_ERRORS_KEY: ["Invalid email and password combination."]}
+            )
+        await user_logged_in.asend(sender=user.__class__, request=request, user=user)
+        refresh = await sync_to_async(UserRefreshToken.for_user)(user)
         access_token = str(refresh.access_token)
         refresh_token = str(refresh)
 
@@ -95,7 +120,7 @@ class LogoutView(APIView):
             )
 
         try:
-            token = RefreshToken(refresh_token)
+            token = UserRefreshToken(refresh_token)
             token.blacklist()
         except TokenError:
             response = Response(
@@ -136,8 +161,8 @@ class VerifyTokenView(APIView):
             )
 
         try:
-            token = RefreshToken(refresh_token)
-            token.check_blacklist()
+            # the blacklist is checked when the token is verified on creation
+            UserRefreshToken(refresh_token)
         except TokenError:
             response = Response(
                 {"error": "Invalid or expired token"},
@@ -174,7 +199,7 @@ class RefreshTokenView(APIView):
             )
 
         try:
-            token = RefreshToken(refresh_token)
+            token = UserRefreshToken(refresh_token)
             access_token = str(token.access_token)
         except TokenError:
             response = Response(